@@ -0,0 +1,720 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+# Rendering runs offscreen on Mesa's software rasterizer: EGL surfaceless by default,
+# or OSMesa with PYOPENGL_PLATFORM=osmesa. Must be set before OpenGL is imported.
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import ctypes
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from simulation import generate_maze, generate_maze_backtracker, CollisionGrid, ExitField, CorridorGraph
+from main_opengl import (build_level, build_level_mesh, build_seeded_level, write_level_pack, LevelPack,
+                         create_mesh_pool, CHUNK_SIZE, QUALITY_LEVELS, GL_RELEASE)
+
+RENDER_GL_BUDGET = 200 # GL calls one render_scene frame may make (about 100 today)
+
+# Usage:
+#   python benchmarks.py                       all benchmarks, table output
+#   python benchmarks.py --only render --json out.json
+#   python -m pytest -q benchmarks.py          quick versions of the same runs
+
+def time_call(fn, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def time_calls(fn, *args, repeat=3):
+    # Like time_call, but keeps every sample
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return times, result
+
+def summarize(times):
+    ms = np.asarray(times) * 1000.0
+    return {"n": len(ms), "min_ms": float(ms.min()), "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+def grid_bytes(maze):
+    # Python lists: one pointer per cell plus the row list objects
+    if isinstance(maze, np.ndarray):
+        return maze.nbytes
+    return sys.getsizeof(maze) + sum(sys.getsizeof(row) for row in maze)
+
+# --- Maze Generation ---
+def bench_generate_maze(sizes, repeat=3, reference_max=1001, seed=1234):
+    results = []
+    for size in sizes:
+        random.seed(seed)
+        times, maze = time_calls(generate_maze, size, size, np.random.default_rng(seed), repeat=repeat)
+        row = {"size": size, "generate_maze_s": min(times), "grid_bytes": grid_bytes(maze), **summarize(times)}
+        if size <= reference_max:
+            t_ref, ref = time_call(generate_maze_backtracker, size, size, repeat=repeat)
+            row["reference_s"] = t_ref
+            row["reference_bytes"] = grid_bytes(ref)
+            row["speedup"] = t_ref / row["generate_maze_s"] if row["generate_maze_s"] > 0 else None
+        results.append(row)
+    return results
+
+def print_table(results):
+    print(f"{'size':>6} {'new (s)':>10} {'ref (s)':>10} {'speedup':>8} {'new MB':>8} {'ref MB':>8}")
+    for r in results:
+        ref_s = f"{r['reference_s']:.4f}" if "reference_s" in r else "-"
+        speedup = f"{r['speedup']:.1f}x" if "reference_s" in r else "-"
+        ref_mb = f"{r['reference_bytes'] / 1e6:.2f}" if "reference_s" in r else "-"
+        print(f"{r['size']:>6} {r['generate_maze_s']:>10.4f} {ref_s:>10} {speedup:>8} "
+              f"{r['grid_bytes'] / 1e6:>8.2f} {ref_mb:>8}")
+
+def print_stats(title, rows, key):
+    print(f"{title:>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'min ms':>10}")
+    for r in rows:
+        print(f"{r[key]:>10} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['min_ms']:>10.3f}")
+
+# --- Level Meshing ---
+def bench_mesh(sizes, repeat=3, seed=1234):
+    results = []
+    for size in sizes:
+        maze = generate_maze(size, size, np.random.default_rng(seed))
+        times, mesh = time_calls(build_level_mesh, maze, repeat=repeat)
+        results.append({"size": size, "chunks": mesh.stats["chunks"], "triangles": mesh.stats["triangles"],
+                        "vertices": mesh.stats["vertices"], **summarize(times)})
+    return results
+
+def bench_parallel_mesh(sizes, workers, repeat=3, seed=1234):
+    # build_level_mesh in the calling thread (0 workers) and on process pools of each size;
+    # pools are started and warmed up before timing, as the game does after the first frame
+    results = []
+    pools = {0: None}
+    try:
+        for count in workers:
+            if count:
+                pools[count] = create_mesh_pool(count)
+                list(pools[count].map(int, range(count)))
+        for size in sizes:
+            maze = generate_maze(size, size, np.random.default_rng(seed))
+            base = None
+            for count in [0] + [c for c in workers if c]:
+                times, _ = time_calls(build_level_mesh, maze, CHUNK_SIZE, pools[count], repeat=repeat)
+                stats = summarize(times)
+                base = base or stats["p50_ms"]
+                results.append({"size": size, "workers": count, "speedup": base / stats["p50_ms"], **stats})
+    finally:
+        for pool in pools.values():
+            if pool is not None:
+                pool.shutdown()
+    return results
+
+# --- Collision ---
+def bench_collision(size=201, queries=20000, repeat=5, seed=1234):
+    # Swept moves from random valid positions (near floor cell centres), up to one
+    # substep long; times are per batch, queries_per_s is from the median batch
+    rng = np.random.default_rng(seed)
+    maze = generate_maze(size, size, rng)
+    build_s, grid = time_call(CollisionGrid, maze, repeat=1)
+    floor = np.argwhere(maze == 0)[rng.integers(0, int((maze == 0).sum()), queries)]
+    zs, xs = (floor + rng.uniform(-0.2, 0.2, (queries, 2))).T.tolist()
+    dxs, dzs = rng.uniform(-0.15, 0.15, (2, queries)).tolist()
+
+    def run():
+        for x, z, dx, dz in zip(xs, zs, dxs, dzs):
+            grid.move(x, z, dx, dz)
+
+    times, _ = time_calls(run, repeat=repeat)
+    stats = summarize(times)
+    return {"size": size, "queries": queries, "build_s": build_s,
+            "queries_per_s": queries / (stats["p50_ms"] / 1000.0), **stats}
+
+# --- Solution ---
+def bench_solution(sizes, repeat=3, queries=20000, seed=1234):
+    # Distance field build per size, plus hint lookups from random floor cells
+    results = []
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        maze = generate_maze(size, size, rng)
+        times, field = time_calls(ExitField, maze, repeat=repeat)
+        floor = np.argwhere(maze == 0)[rng.integers(0, int((maze == 0).sum()), queries)]
+        zs, xs = floor.T.tolist()
+        start = time.perf_counter()
+        for x, z in zip(xs, zs):
+            field.hint(x, z)
+        hint_s = time.perf_counter() - start
+        results.append({"size": size, "solution_length": field.solution_length,
+                        "hints_per_s": queries / hint_s, **summarize(times)})
+    return results
+
+def bench_graph(sizes, repeat=3, queries=20, seed=1234):
+    # CorridorGraph build per size next to ExitField's, how much smaller than the floor it
+    # is, and routes between random floor cells searched on it
+    results = []
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        maze = generate_maze(size, size, rng)
+        times, graph = time_calls(CorridorGraph, maze, repeat=repeat)
+        field_times, _ = time_calls(ExitField, maze, repeat=repeat)
+        floor_cells = int((maze == 0).sum())
+        cells = np.argwhere(maze == 0)[rng.integers(0, floor_cells, 2 * queries)].tolist()
+        start = time.perf_counter()
+        for (z0, x0), (z1, x1) in zip(cells[::2], cells[1::2]):
+            graph.route(x0, z0, x1, z1)
+        route_s = time.perf_counter() - start
+        results.append({"size": size, "floor_cells": floor_cells, "nodes": graph.node_count,
+                        "edges": graph.edge_count, "node_share": graph.node_count / floor_cells,
+                        "field_p50_ms": summarize(field_times)["p50_ms"],
+                        "routes_per_s": queries / route_s, **graph.metrics(), **summarize(times)})
+    return results
+
+# --- Level Packs ---
+def bench_level_pack(count=20, repeat=3, seed=1234):
+    # Building level N from the seed vs loading it from a baked pack
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.lzp")
+        start = time.perf_counter()
+        write_level_pack(path, seed, count, log=lambda line: None)
+        bake_s = time.perf_counter() - start
+        results = []
+        with LevelPack(path) as pack:
+            for number in sorted({1, count // 2, count} - {0}):
+                build, level = time_calls(build_seeded_level, seed, number, repeat=repeat)
+                load = time_calls(pack.load, number, repeat=repeat)[0] # no loaded level outlives the pack
+                results.append({"number": number, "size": level.size, "build_p50_ms": summarize(build)["p50_ms"],
+                                **summarize(load)})
+        size = os.path.getsize(path)
+    return {"levels": count, "bake_s": bake_s, "bytes": size, "loads": results}
+
+# --- Rendering ---
+def create_headless_context(width, height):
+    # Current GL context plus a framebuffer object to render into; returns what must be
+    # kept alive. Without a window there is no default framebuffer (EGL surfaceless).
+    from OpenGL import GL
+    if os.environ["PYOPENGL_PLATFORM"] == "osmesa":
+        from OpenGL import osmesa, arrays
+        ctx = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        buf = arrays.GLubyteArray.zeros((height, width, 4))
+        if not osmesa.OSMesaMakeCurrent(ctx, buf, GL.GL_UNSIGNED_BYTE, width, height):
+            raise RuntimeError("OSMesaMakeCurrent failed")
+        keep = [ctx, buf]
+    else:
+        from OpenGL import EGL
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(display, EGL.EGLint(), EGL.EGLint()):
+            raise RuntimeError("eglInitialize failed")
+        attrs = (EGL.EGLint * 7)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                 EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_DEPTH_SIZE, 24,
+                                 EGL.EGL_NONE)
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        EGL.eglChooseConfig(display, attrs, ctypes.pointer(config), 1, ctypes.pointer(count))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        ctx = EGL.eglCreateContext(display, config if count.value else None, EGL.EGL_NO_CONTEXT, None)
+        if not ctx or not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, ctx):
+            raise RuntimeError("could not create an EGL OpenGL context")
+        keep = [display, ctx]
+    fbo = GL.glGenFramebuffers(1)
+    GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, fbo)
+    color, depth = GL.glGenRenderbuffers(2)
+    for rb, fmt, attachment in ((color, GL.GL_RGBA8, GL.GL_COLOR_ATTACHMENT0),
+                                (depth, GL.GL_DEPTH_COMPONENT24, GL.GL_DEPTH_ATTACHMENT)):
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, rb)
+        GL.glRenderbufferStorage(GL.GL_RENDERBUFFER, fmt, width, height)
+        GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER, attachment, GL.GL_RENDERBUFFER, rb)
+    if GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER) != GL.GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError("offscreen framebuffer incomplete")
+    return keep + [fbo, color, depth]
+
+def stop_game(game):
+    # A headless Game owns a level builder thread and, once presented, a mesh process pool
+    game.level_builder.shutdown()
+    if game.mesh_pool is not None:
+        game.mesh_pool.shutdown()
+        game.mesh_pool = None
+
+def camera_path(maze, frames):
+    # Walk the solution at even speed, looking a few cells ahead, with a slow pitch sway
+    cells = ExitField(maze).path(1, 1).astype(np.float64) # (x, z)
+    along = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(cells, axis=0), axis=1))))
+    s = np.linspace(0, along[-1], frames)
+    x, z = np.interp(s, along, cells[:, 0]), np.interp(s, along, cells[:, 1])
+    ahead = np.minimum(s + 3.0, along[-1])
+    ax, az = np.interp(ahead, along, cells[:, 0]), np.interp(ahead, along, cells[:, 1])
+    path = []
+    for i in range(frames):
+        yaw = math.degrees(math.atan2(ax[i] - x[i], -(az[i] - z[i]))) if (ax[i], az[i]) != (x[i], z[i]) else 0.0
+        pitch = 10.0 * math.sin(2 * math.pi * i / frames)
+        path.append(([float(x[i]), 0.5, float(z[i])], [yaw, pitch]))
+    return path
+
+def bench_render(size=101, frames=300, warmup=30, seed=1234, star_count=None, shaders=False, quality=0):
+    from OpenGL import GL
+    import main_opengl
+    keep = create_headless_context(main_opengl.SCREEN_WIDTH, main_opengl.SCREEN_HEIGHT)
+    random.seed(seed)
+    game = main_opengl.Game(headless=True, shaders=shaders, quality=quality)
+    if star_count is not None:
+        game.star_count = star_count
+        game.init_sky()
+    level = build_level(size, np.random.default_rng(seed))
+    buffers = main_opengl.LevelBuffers(level.mesh, game.wall_shader is not None)
+    buffers.upload()
+    game.set_level(level, buffers)
+    if game.next_level is not None:
+        game.next_level.result() # don't time the background build
+    path = camera_path(level.maze, frames)
+
+    times, draws = [], []
+    for i in range(warmup + frames):
+        pos, rot = path[(i - warmup) % frames]
+        game.camera_pos, game.camera_rot = list(pos), list(rot)
+        game.previous_pos = list(pos)
+        start = time.perf_counter()
+        game.render_scene()
+        GL.glFinish()
+        if i >= warmup:
+            times.append(time.perf_counter() - start)
+            if game.wall_shader is not None:
+                draws.append(game.wall_shader.stats)
+    # GL calls of one frame, counted by the profiler (which slows the calls, so not timed)
+    game.profiler.set_enabled(True)
+    for pos, rot in path[:2]:
+        game.camera_pos, game.camera_rot = list(pos), list(rot)
+        game.render_scene()
+        game.profiler.end_frame()
+    gl_calls, skipped = game.profiler.history["gl calls"][-1], game.profiler.history["skipped calls"][-1]
+    game.profiler.set_enabled(False)
+    renderer = GL.glGetString(GL.GL_RENDERER).decode()
+    stop_game(game)
+    del keep
+    return {"size": size, "frames": frames, "seed": seed, "renderer": renderer, "quality": quality,
+            "width": main_opengl.SCREEN_WIDTH, "height": main_opengl.SCREEN_HEIGHT,
+            "triangles": level.mesh.stats["triangles"], "walls": "instanced" if draws else "fixed",
+            "instances": len(level.mesh.wall_instances), "gl_calls": gl_calls, "skipped_calls": skipped,
+            "wall_draws_mean": float(np.mean(draws)) if draws else None, **summarize(times)}
+
+def bench_endless(chunks=100, repeat=3, seed=1234):
+    # Walk `chunks` chunks east through an EndlessWorld, waiting for each new column of
+    # chunks to be built and uploaded; the caches must stay at their bounds throughout
+    from concurrent.futures import ThreadPoolExecutor
+    import main_opengl
+    size = main_opengl.CHUNK_SIZE
+    generate, _ = time_calls(main_opengl.endless_chunk_cells, seed, 7, -3, repeat=max(repeat, 20))
+    block = np.block([[main_opengl.endless_chunk_cells(seed, x, z) for x in range(3)] for z in range(3)])
+    build, _ = time_calls(main_opengl.build_endless_chunk, block, 1, 1, repeat=max(repeat, 20))
+    keep = create_headless_context(64, 64)
+    builder = ThreadPoolExecutor(max_workers=1)
+    world = main_opengl.EndlessWorld(seed, builder)
+    steps, peak_chunks, peak_cells = [], 0, 0
+    start = time.perf_counter()
+    for i in range(chunks):
+        step = time.perf_counter()
+        x = 1.0 + i * size
+        world.update(x, 1.0)
+        while len(world.drawn) < len(world.wanted):
+            time.sleep(0.0005)
+            world.update(x, 1.0)
+        steps.append(time.perf_counter() - step)
+        peak_chunks, peak_cells = max(peak_chunks, len(world.chunks)), max(peak_cells, len(world.cells))
+    walk_s = time.perf_counter() - start
+    world.delete()
+    builder.shutdown()
+    del keep
+    return {"chunks": chunks, "radius": world.radius, "capacity": world.capacity,
+            "generate_p50_ms": summarize(generate)["p50_ms"], "build_p50_ms": summarize(build)["p50_ms"],
+            "walk_s": walk_s, "peak_chunks": peak_chunks, "peak_grids": peak_cells, **world.stats,
+            **summarize(steps)}
+
+def bench_quality(size=101, frames=100, seed=1234, shaders=False):
+    # render_scene at every quality level, the numbers the governor's ladder is tuned on
+    return [bench_render(size, frames, warmup=10, seed=seed, shaders=shaders, quality=level)
+            for level in range(len(QUALITY_LEVELS))]
+
+def record_bot_session(game, path, frames, frame_ms=16):
+    # Play `frames` frames as a bot that holds W and steers along the solution with mouse
+    # deltas, recording them like a player's; crosses into the next levels on the way
+    import main_opengl
+    recorder = game.start_recording(path)
+    recorder.write(main_opengl.RECORD_RESUME, False, game.sensitivity)
+    keys = main_opengl.RecordedKeys(1) # K_w
+    for i in range(frames):
+        x, z = game.camera_pos[0], game.camera_pos[2]
+        cells = game.level.solution.path(int(round(x)), int(round(z)), limit=2)
+        tx, tz = cells[-1] if len(cells) > 1 else (game.maze_size - 1, game.maze_size - 2)
+        yaw = math.degrees(math.atan2(tx - x, -(tz - z)))
+        turn = (yaw - game.camera_rot[0] + 180.0) % 360.0 - 180.0
+        mx = int(max(-200, min(200, round(turn / game.sensitivity))))
+        jump = main_opengl.EVENT_JUMP if i % 97 == 0 else 0
+        recorder.frame(jump, frame_ms, mx, 0, keys)
+        game.game_frame(frame_ms, jump, mx, 0, keys)
+    game.stop_recording()
+
+def bench_bots(size=101, bots=2000, repeat=3, seed=1234):
+    # BotSwarm throughput: a mix of wall followers and walkers in one maze, bot steps per second
+    import simulation
+    maze = generate_maze(size, size, np.random.default_rng(seed))
+    kinds = np.arange(bots) % 3 # both wall followers and walkers
+    steps = []
+    def run():
+        swarm = simulation.BotSwarm(maze, kinds, np.random.default_rng(seed))
+        swarm.run(1000)
+        steps.append(int(np.where(swarm.steps >= 0, swarm.steps, swarm.step_count).sum()))
+    times, _ = time_calls(run, repeat=repeat)
+    stats = summarize(times)
+    return {"size": size, "bots": bots, "bot_steps": steps[0],
+            "bot_steps_per_s": steps[0] / (stats["p50_ms"] / 1000.0), **stats}
+
+def bench_playtest(levels=8, mazes=4, bots=500, workers=None, seed=1234):
+    # playtest() serially and on a process pool; the rows must come out the same
+    import simulation
+    start = time.perf_counter()
+    serial = simulation.playtest(seed, levels, mazes, bots)
+    serial_s = time.perf_counter() - start
+    pool = create_mesh_pool(workers if workers is not None else max(2, os.cpu_count() or 1))
+    start = time.perf_counter()
+    pooled = simulation.playtest(seed, levels, mazes, bots, pool)
+    pool_s = time.perf_counter() - start
+    pool.shutdown()
+    return {"levels": levels, "mazes": mazes, "bots": bots, "serial_s": serial_s, "pool_s": pool_s,
+            "same": serial == pooled, "rows": serial}
+
+def bench_replay(path=None, frames=600, seed=1234, realtime=False):
+    # Replay a recording (or a bot session recorded here) into a fresh headless Game and
+    # time its frames; the end state must match the recording's
+    import tempfile
+    import main_opengl
+    keep = create_headless_context(main_opengl.SCREEN_WIDTH, main_opengl.SCREEN_HEIGHT)
+    recorded_live = None
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "bot.lazerec")
+        game = main_opengl.Game(headless=True, seed=seed)
+        try:
+            start = time.perf_counter()
+            record_bot_session(game, path, frames)
+            recorded_live = time.perf_counter() - start
+        finally:
+            stop_game(game)
+    header, records = main_opengl.read_recording(path)
+    game = main_opengl.Game(headless=True, seed=header["seed"])
+    try:
+        start = time.perf_counter()
+        times, matches = game.replay(records, realtime)
+        replay_s = time.perf_counter() - start
+    finally:
+        stop_game(game)
+    result = {"path": path, "seed": header["seed"], "frames": len(times), "bytes": os.path.getsize(path),
+              "level": game.level_number, "matches": matches, "replay_s": replay_s,
+              "recorded_s": sum(v[1] for k, v in records if k == main_opengl.RECORD_FRAME) / 1000.0,
+              "record_live_s": recorded_live, **summarize(times)}
+    del keep
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Laze benchmarks")
+    parser.add_argument("--only", nargs="+", choices=["generate", "mesh", "parallel", "collision", "solution", "graph", "pack", "endless",
+                                          "render", "replay", "quality", "bots"],
+                        default=["generate", "mesh", "parallel", "collision", "solution", "graph", "pack", "endless",
+                                 "render"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[11, 51, 101, 251, 501, 1001, 2001, 4001])
+    parser.add_argument("--mesh-sizes", type=int, nargs="+", default=[51, 101, 251, 501, 1001])
+    parser.add_argument("--parallel-sizes", type=int, nargs="+", default=[501, 1001, 2001])
+    parser.add_argument("--mesh-workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help="process pool sizes for the parallel meshing benchmark")
+    parser.add_argument("--solution-sizes", type=int, nargs="+", default=[101, 501, 1001, 2001])
+    parser.add_argument("--pack-levels", type=int, default=20)
+    parser.add_argument("--endless-chunks", type=int, default=100, help="chunks to walk in the endless benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reference-max", type=int, default=1001,
+                        help="largest size to also run through the old list-based generator")
+    parser.add_argument("--render-size", type=int, default=101)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--stars", type=int, help="star count for the render benchmark")
+    parser.add_argument("--shaders", action="store_true", help="render the walls with the instanced shader")
+    parser.add_argument("--replay-log", metavar="PATH",
+                        help="recording for the replay benchmark (default: record a bot session)")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded pace")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = {"meta": {"seed": args.seed, "python": platform.python_version(), "machine": platform.machine(),
+                        "numpy": np.__version__, "gl_platform": os.environ["PYOPENGL_PLATFORM"],
+                        "gl_error_checking": not GL_RELEASE}}
+    if "generate" in args.only:
+        results["generate_maze"] = bench_generate_maze(args.sizes, args.repeat, args.reference_max, args.seed)
+        print_table(results["generate_maze"])
+    if "mesh" in args.only:
+        results["mesh"] = bench_mesh(args.mesh_sizes, args.repeat, args.seed)
+        print_stats("mesh size", results["mesh"], "size")
+    if "parallel" in args.only:
+        results["parallel_mesh"] = bench_parallel_mesh(args.parallel_sizes, args.mesh_workers, args.repeat, args.seed)
+        print(f"parallel meshing ({os.cpu_count()} cores), p50 ms by workers (0 = builder thread only):")
+        print(f"{'size':>10} {'workers':>10} {'p50 ms':>10} {'speedup':>10}")
+        for r in results["parallel_mesh"]:
+            print(f"{r['size']:>10} {r['workers']:>10} {r['p50_ms']:>10.1f} {r['speedup']:>9.2f}x")
+    if "collision" in args.only:
+        r = results["collision"] = bench_collision(seed=args.seed)
+        print(f"collision: {r['queries_per_s']:,.0f} queries/s (p50 {r['p50_ms']:.2f} ms per {r['queries']})")
+    if "solution" in args.only:
+        results["solution"] = bench_solution(args.solution_sizes, args.repeat, seed=args.seed)
+        print_stats("size", results["solution"], "size")
+    if "graph" in args.only:
+        results["graph"] = bench_graph(args.solution_sizes, args.repeat, seed=args.seed)
+        print(f"{'size':>10} {'floor':>10} {'nodes':>10} {'share':>7} {'build ms':>10} {'field ms':>10} "
+              f"{'routes/s':>10} {'dead ends':>10} {'branching':>10}")
+        for r in results["graph"]:
+            print(f"{r['size']:>10} {r['floor_cells']:>10} {r['nodes']:>10} {r['node_share']:>7.1%} "
+                  f"{r['p50_ms']:>10.1f} {r['field_p50_ms']:>10.1f} {r['routes_per_s']:>10.1f} "
+                  f"{r['dead_ends']:>10} {r['branching']:>10.2f}")
+    if "pack" in args.only:
+        r = results["pack"] = bench_level_pack(args.pack_levels, args.repeat, args.seed)
+        print(f"level pack: {r['levels']} levels, {r['bytes'] / 1e6:.1f} MB, baked in {r['bake_s']:.2f}s")
+        for row in r["loads"]:
+            print(f"  level {row['number']} ({row['size']}x{row['size']}): load {row['p50_ms']:.2f} ms, "
+                  f"build {row['build_p50_ms']:.2f} ms")
+    if "endless" in args.only:
+        r = results["endless"] = bench_endless(args.endless_chunks, args.repeat, args.seed)
+        print(f"endless: chunk walls {r['generate_p50_ms']:.2f} ms, mesh {r['build_p50_ms']:.2f} ms; "
+              f"{r['chunks']} chunks walked in {r['walk_s']:.1f} s, peak {r['peak_chunks']}/{r['capacity']} "
+              f"meshed, {r['peak_grids']} grids, {r['evicted']} evicted")
+        print_stats("new column", [r], "chunks")
+    if "replay" in args.only:
+        r = results["replay"] = bench_replay(args.replay_log, args.frames, args.seed, args.realtime)
+        print(f"replay {r['path']}: {r['frames']} frames ({r['bytes']} bytes, {r['recorded_s']:.1f} s recorded) "
+              f"in {r['replay_s']:.1f} s, reached level {r['level']}, end state "
+              f"{'matches' if r['matches'] else 'unchecked' if r['matches'] is None else 'differs'}")
+        print_stats("frames", [r], "frames")
+    if "bots" in args.only:
+        r = results["bots"] = bench_bots(args.render_size, repeat=args.repeat, seed=args.seed)
+        print(f"bots: {r['bots']} in a {r['size']}x{r['size']} maze, {r['bot_steps_per_s']:,.0f} bot steps/s")
+        r = results["playtest"] = bench_playtest(seed=args.seed)
+        print(f"playtest of {r['levels']} levels x {r['mazes']} mazes x {r['bots']} walkers: "
+              f"{r['serial_s']:.1f} s serial, {r['pool_s']:.1f} s on a pool ({os.cpu_count()} cores), "
+              f"{'same' if r['same'] else 'DIFFERENT'} results")
+        for row in r["rows"]:
+            print(f"  {row['size']:>4}: walker p50 {row['walker'].get('p50_s', float('nan')):.1f} s, "
+                  f"right hand {row['right hand']['p50_s']:.1f} s, shortest {row['shortest_s']:.1f} s")
+    if "quality" in args.only:
+        results["quality"] = bench_quality(args.render_size, args.frames, args.seed, args.shaders)
+        print(f"render {args.render_size}x{args.render_size} by quality level (scale, far, stars, edges):")
+        for r in results["quality"]:
+            print(f"  {r['quality']}: {QUALITY_LEVELS[r['quality']]}  p50 {r['p50_ms']:.2f} ms, p95 {r['p95_ms']:.2f} ms")
+    if "render" in args.only:
+        r = results["render"] = bench_render(args.render_size, args.frames, seed=args.seed, star_count=args.stars,
+                                             shaders=args.shaders)
+        print(f"render {r['size']}x{r['size']} on {r['renderer']} ({r['walls']} walls, {r['gl_calls']} GL calls "
+              f"a frame, {r['skipped_calls']} skipped):")
+        print_stats("frames", [r], "frames")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+# --- pytest entry points (python -m pytest benchmarks.py) ---
+def require_headless_gl():
+    # Skip GL tests where no offscreen context can be made; anything failing after that
+    # is a real failure
+    import pytest
+    try:
+        create_headless_context(16, 16)
+    except Exception as e:
+        pytest.skip(f"no offscreen OpenGL: {e}")
+
+def test_generate_maze_is_seeded():
+    a = generate_maze(101, 101, np.random.default_rng(7))
+    b = generate_maze(101, 101, np.random.default_rng(7))
+    assert np.array_equal(a, b)
+    rows = bench_generate_maze([51, 301], repeat=2, reference_max=51)
+    assert all(r["p50_ms"] > 0 for r in rows)
+
+def test_mesh_benchmark():
+    rows = bench_mesh([51, 101], repeat=2)
+    assert all(r["triangles"] > 0 and r["p99_ms"] >= r["p50_ms"] for r in rows)
+
+def test_parallel_mesh_benchmark():
+    rows = bench_parallel_mesh([257], [1], repeat=1)
+    assert [r["workers"] for r in rows] == [0, 1] and all(r["p50_ms"] > 0 for r in rows)
+
+def test_collision_benchmark():
+    r = bench_collision(size=51, queries=2000, repeat=2)
+    assert r["queries_per_s"] > 0
+
+def test_collision_never_tunnels():
+    # Seeded fuzz of swept moves, from a few hundredths of a cell up to a whole frame of
+    # running at the lowest frame rate the game catches up on (over two cells)
+    import main_opengl
+    import simulation
+    longest = simulation.RUN_SPEED * simulation.TUNING_RATE * main_opengl.MAX_FRAME_TIME
+    for seed in range(3):
+        rng = np.random.default_rng(seed)
+        maze = generate_maze(25, 25, rng)
+        # Some open areas too, for corners that aren't next to a wall on both sides
+        walls = np.argwhere(maze[1:-1, 1:-1] == 1) + 1
+        for z, x in walls[rng.choice(len(walls), 40, replace=False)]:
+            maze[z, x] = 0
+        grid = CollisionGrid(maze)
+        solid = np.pad(maze, 1, constant_values=1) # outside the grid is wall, as for the grid
+        r = grid.radius
+        floor = np.argwhere(maze == 0)
+        reach = {}
+        for _ in range(2000):
+            cz, cx = floor[rng.integers(len(floor))]
+            x, z = cx + rng.uniform(-0.5 + r, 0.5 - r), cz + rng.uniform(-0.5 + r, 0.5 - r)
+            length, angle = rng.uniform(0.01, longest), rng.uniform(0, 2 * math.pi)
+            dx, dz = length * math.cos(angle), length * math.sin(angle)
+            nx, nz = grid.move(x, z, dx, dz)
+            ex, ez = math.floor(nx + 0.5), math.floor(nz + 0.5)
+            assert maze[ez, ex] == 0, (seed, x, z, dx, dz)
+            # No wall square comes closer to the centre than the radius
+            for wz in range(ez - 1, ez + 2):
+                for wx in range(ex - 1, ex + 2):
+                    if solid[wz + 1, wx + 1]:
+                        px, pz = min(max(nx, wx - 0.5), wx + 0.5), min(max(nz, wz - 0.5), wz + 0.5)
+                        assert math.hypot(nx - px, nz - pz) >= r - 1e-9, (seed, x, z, dx, dz)
+            # The end cell is reached through floor within the move's length (plus the
+            # cells a slide around corners can add): nothing went through a wall
+            if (cx, cz) not in reach:
+                reach[cx, cz] = reference_distances(maze, (cx, cz))
+            assert 0 <= reach[cx, cz][ez, ex] <= math.ceil(abs(dx)) + math.ceil(abs(dz)) + 1, (seed, x, z, dx, dz)
+
+def test_solution_benchmark():
+    rows = bench_solution([21, 101], repeat=2, queries=500)
+    assert all(r["solution_length"] > 0 and r["hints_per_s"] > 0 for r in rows)
+
+def reference_distances(maze, goal):
+    # Plain BFS over floor cells, to check ExitField against
+    from collections import deque
+    h, w = maze.shape
+    distance = np.full((h, w), -1, dtype=np.int32)
+    gx, gz = goal
+    distance[gz, gx] = 0
+    queue = deque([(gx, gz)])
+    while queue:
+        x, z = queue.popleft()
+        for nx, nz in ((x + 1, z), (x - 1, z), (x, z + 1), (x, z - 1)):
+            if 0 <= nx < w and 0 <= nz < h and maze[nz, nx] == 0 and distance[nz, nx] < 0:
+                distance[nz, nx] = distance[z, x] + 1
+                queue.append((nx, nz))
+    return distance
+
+def test_exit_field_matches_bfs():
+    # Backtracker mazes, a tiled one (over BACKTRACKER_MAX_CELLS cells) and mazes with loops
+    import simulation
+    cells = 2 * int(simulation.BACKTRACKER_MAX_CELLS ** 0.5) + 11
+    for seed, size, loops in ((1, 11, 0), (2, 51, 0), (3, 101, 0), (4, cells, 0), (5, 51, 40), (6, 101, 200)):
+        rng = np.random.default_rng(seed)
+        maze = generate_maze(size, size, rng)
+        if loops: # knock out inner walls between two floor cells
+            walls = np.argwhere(maze[1:-1, 1:-1] == 1) + 1
+            walls = walls[(maze[walls[:, 0] - 1, walls[:, 1]] == 0) & (maze[walls[:, 0] + 1, walls[:, 1]] == 0) |
+                          (maze[walls[:, 0], walls[:, 1] - 1] == 0) & (maze[walls[:, 0], walls[:, 1] + 1] == 0)]
+            for z, x in walls[rng.choice(len(walls), loops, replace=False)]:
+                maze[z, x] = 0
+        goal = (size - 1, size - 2)
+        assert (ExitField(maze).distance == reference_distances(maze, goal)).all(), (seed, size)
+
+def test_graph_benchmark():
+    rows = bench_graph([21, 101], repeat=2, queries=20)
+    assert all(r["edges"] == r["nodes"] - 1 and r["routes_per_s"] > 0 for r in rows) # perfect mazes are trees
+    # Steps on the graph agree with the grid's distance field, and corridors cover every floor cell once
+    maze = generate_maze(51, 51, np.random.default_rng(7))
+    graph, field = CorridorGraph(maze), ExitField(maze)
+    for z, x in np.argwhere(maze == 0).tolist():
+        assert graph.distance(x, z, *field.exit) == field.steps(x, z)
+    assert int(graph.edge_length.sum()) == int((maze == 0).sum()) - 1
+    for edge in range(graph.edge_count):
+        cells = graph.corridor(edge)
+        assert len(cells) == graph.edge_length[edge] + 1 and (maze[cells[:, 1], cells[:, 0]] == 0).all()
+    assert set(graph.nearby(1, 1, 10).values()) <= set(range(11))
+
+def test_level_pack_benchmark():
+    import tempfile
+    r = bench_level_pack(count=4, repeat=2)
+    assert r["bytes"] > 0 and all(row["p50_ms"] > 0 for row in r["loads"])
+    # Every baked level comes back exactly as it is built from the seed
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.lzp")
+        write_level_pack(path, 77, 6, log=lambda line: None)
+        with LevelPack(path) as pack:
+            assert pack.seed == 77 and sorted(pack.entries) == list(range(1, 7))
+            for number in range(1, 7):
+                loaded, built = pack.load(number), build_seeded_level(77, number)
+                assert (loaded.size, loaded.number) == (built.size, built.number)
+                assert loaded.maze.dtype == built.maze.dtype and np.array_equal(loaded.maze, built.maze)
+                del loaded
+
+def test_endless_benchmark():
+    import main_opengl
+    # Borders agree: the same chunk comes out the same from any generation order
+    assert (main_opengl.endless_chunk_cells(5, -3, 2) == main_opengl.endless_chunk_cells(5, -3, 2)).all()
+    require_headless_gl()
+    r = bench_endless(chunks=12, repeat=1)
+    assert r["peak_chunks"] <= r["capacity"] and r["evicted"] > 0
+
+def test_replay_benchmark():
+    require_headless_gl()
+    r = bench_replay(frames=300)
+    assert r["frames"] == 300 and r["matches"]
+
+def test_bots_benchmark():
+    import subprocess
+    import simulation
+    # The simulation core runs without pygame or OpenGL (pool workers import only it)
+    code = "import sys, simulation; sys.exit(bool({'pygame', 'OpenGL'} & set(sys.modules)))"
+    here = os.path.dirname(os.path.abspath(__file__))
+    assert subprocess.run([sys.executable, "-c", code], cwd=here).returncode == 0
+    r = bench_bots(size=31, bots=300, repeat=1)
+    assert r["bot_steps"] > 0
+    # Wall followers always get out of a perfect maze, and nobody beats the shortest path
+    level = simulation.playtest_level(5, 3, 200)
+    assert (level["steps"][:2] > 0).all() and (level["steps"] >= level["shortest"]).all()
+    r = bench_playtest(levels=3, mazes=2, bots=50, workers=2)
+    assert r["same"]
+
+def test_quality_governor():
+    from main_opengl import QualityGovernor, QUALITY_WINDOW, QUALITY_CALM_WINDOWS
+    governor = QualityGovernor(16.0)
+    for _ in range(2 * QUALITY_WINDOW):
+        governor.update(30.0)
+    assert governor.level == 2
+    # Headroom has to last a few windows before quality comes back
+    for _ in range(QUALITY_CALM_WINDOWS * QUALITY_WINDOW):
+        governor.update(5.0)
+    assert governor.level == 1
+    # Stepping up and straight back down makes the next step up wait twice as long
+    for _ in range(QUALITY_WINDOW):
+        governor.update(30.0)
+    assert governor.level == 2 and governor.calm_needed == 2 * QUALITY_CALM_WINDOWS
+    assert [d[1:3] for d in governor.decisions] == [(0, 1), (1, 2), (2, 1), (1, 2)]
+    pinned = QualityGovernor(16.0, level=3, adaptive=False)
+    for _ in range(2 * QUALITY_WINDOW):
+        pinned.update(100.0)
+    assert pinned.level == 3
+
+def test_render_benchmark():
+    require_headless_gl()
+    for shaders in (False, True):
+        r = bench_render(size=21, frames=20, warmup=2, shaders=shaders)
+        assert r["frames"] == 20 and r["p50_ms"] > 0
+        # render_scene's GL call budget; the state cache has to be skipping the repeats
+        assert r["gl_calls"] <= RENDER_GL_BUDGET and r["skipped_calls"] > 0
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,40 @@
+import time
+IMPORT_START = time.perf_counter() # --measure-startup counts the imports below from here
+import sys
+import os
+import OpenGL
+# Release mode (--release or LAZE_RELEASE=1) drops PyOpenGL's glGetError check and call
+# logging around every GL call; it has to be decided before OpenGL.GL is imported
+GL_RELEASE = "--release" in sys.argv[1:] or os.environ.get("LAZE_RELEASE") == "1"
+if GL_RELEASE:
+    OpenGL.ERROR_CHECKING = False
+    OpenGL.ERROR_LOGGING = False
 import pygame
 from pygame.locals import *
 from OpenGL.GL import *
-from OpenGL.GLU import *
+import numpy as np
+import ctypes
+import io
+import itertools
 import math
 import random
-import sys
-import os
 import json
+import mmap
+import struct
+import csv
+import atexit
+import multiprocessing
+import argparse
+from collections import OrderedDict, deque
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from simulation import * # maze generation, collision, the exit field and PlayerBody/BotSwarm
 
 # --- Settings ---
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
-NORMAL_SPEED = 0.07
-RUN_SPEED = 0.15
-
-# --- Maze Generation (Procedural/Random) ---
-def generate_maze(width, height):
-    if width % 2 == 0: width += 1
-    if height % 2 == 0: height += 1
-    maze = [[1 for _ in range(width)] for _ in range(height)]
-    stack = [(1, 1)]
-    maze[1][1] = 0
-    while stack:
-        x, y = stack[-1]
-        dirs = [(0, 2), (0, -2), (2, 0), (-2, 0)]
-        random.shuffle(dirs)
-        found = False
-        for dx, dy in dirs:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < width and 0 <= ny < height and maze[ny][nx] == 1:
-                maze[y + dy // 2][x + dx // 2] = 0
-                maze[ny][nx] = 0
-                stack.append((nx, ny))
-                found = True
-                break
-        if not found: stack.pop()
-    maze[1][0] = 0 
-    maze[height-2][width-1] = 0 
-    return maze
+MAX_FRAME_TIME = 0.25 # longest frame the simulation catches up on (e.g. after a stall)
 
 # --- OpenGL Drawing Helpers ---
 def draw_cube(x, y, z, size=1.0, wall_color=(0, 0.4, 0.4), edge_color=(0, 1, 1)):
@@ -52,7 +49,7 @@ def draw_cube(x, y, z, size=1.0, wall_color=(0, 0.4, 0.4), edge_color=(0, 1, 1))
     glVertex3f(x-v, y-v, z-v); glVertex3f(x-v, y-v, z+v); glVertex3f(x-v, y+v, z+v); glVertex3f(x-v, y+v, z-v)
     glEnd()
 
-    glLineWidth(2)
+    gl_state.line_width(2)
     glBegin(GL_LINES)
     glColor3fv(edge_color)
     glVertex3f(x-v, y-v, z-v); glVertex3f(x+v, y-v, z-v)
@@ -69,18 +66,2316 @@ def draw_cube(x, y, z, size=1.0, wall_color=(0, 0.4, 0.4), edge_color=(0, 1, 1))
     glVertex3f(x-v, y-v, z+v); glVertex3f(x-v, y+v, z+v)
     glEnd()
 
-class Game:
+# --- Render State ---
+# Shadow of the fixed-function state the frame keeps setting: every setter skips the GL
+# call when the value is already current. Draw code states what it needs instead of
+# undoing what the previous pass did, so a frame's worth of toggles collapses to the
+# real changes. Anything that changes this state without going through gl_state (or a
+# new GL context) must call invalidate().
+def ortho_matrix(left, right, bottom, top, near=-1.0, far=1.0):
+    # Same matrix as glOrtho
+    return np.array([[2 / (right - left), 0, 0, -(right + left) / (right - left)],
+                     [0, 2 / (top - bottom), 0, -(top + bottom) / (top - bottom)],
+                     [0, 0, -2 / (far - near), -(far + near) / (far - near)],
+                     [0, 0, 0, 1]], dtype=np.float64)
+
+class GLState:
+    def __init__(self):
+        self.skipped = 0 # calls saved, read (and reset) by the Profiler once per frame
+        self.invalidate()
+
+    def invalidate(self):
+        self.caps = {}
+        self.values = {}
+        self.projection_key = None
+
+    def enable(self, cap):
+        if self.caps.get(cap) is True:
+            self.skipped += 1
+            return
+        glEnable(cap)
+        self.caps[cap] = True
+
+    def disable(self, cap):
+        if self.caps.get(cap) is False:
+            self.skipped += 1
+            return
+        glDisable(cap)
+        self.caps[cap] = False
+
+    def changed(self, key, value):
+        # True (and remembers value) if key isn't already set to value
+        if self.values.get(key) == value:
+            self.skipped += 1
+            return False
+        self.values[key] = value
+        return True
+
+    def viewport(self, x, y, width, height):
+        if self.changed("viewport", (x, y, width, height)):
+            glViewport(x, y, width, height)
+
+    def clear_color(self, r, g, b, a):
+        if self.changed("clear_color", (r, g, b, a)):
+            glClearColor(r, g, b, a)
+
+    def blend_func(self, src, dst):
+        if self.changed("blend_func", (src, dst)):
+            glBlendFunc(src, dst)
+
+    def line_width(self, width):
+        if self.changed("line_width", width):
+            glLineWidth(width)
+
+    def point_size(self, size):
+        if self.changed("point_size", size):
+            glPointSize(size)
+
+    def fog_color(self, color):
+        if self.changed("fog_color", tuple(color)):
+            glFogfv(GL_FOG_COLOR, color)
+
+    def fog_density(self, density):
+        if self.changed("fog_density", density):
+            glFogf(GL_FOG_DENSITY, density)
+
+    def hint(self, target, mode):
+        if self.changed(("hint", target), mode):
+            glHint(target, mode)
+
+    def projection(self, key, build):
+        # Load build() (a row-major 4x4) as the projection matrix unless key is already
+        # loaded; leaves GL_MODELVIEW current like the rest of the code expects
+        if key == self.projection_key:
+            self.skipped += 3
+            return
+        glMatrixMode(GL_PROJECTION)
+        glLoadMatrixd(np.ascontiguousarray(build().T)) # GL wants column-major
+        glMatrixMode(GL_MODELVIEW)
+        self.projection_key = key
+
+gl_state = GLState()
+
+# --- Level Geometry ---
+# Level meshes are built on the CPU (possibly in a worker thread) as interleaved
+# float32 [x, y, z, r, g, b] vertices and uploaded to VBOs on the main thread.
+WALL_COLOR = (0, 0.05, 0.15)
+WALL_EDGE_COLOR = (0, 0.8, 1)
+PERIMETER_COLOR = (0.1, 0.1, 0.2)
+PERIMETER_EDGE_COLOR = (0.4, 0.4, 0.8)
+FLOOR_COLOR = (0.05, 0.05, 0.1)
+GRID_COLOR = (0, 0.3, 0.5)
+VERTEX_STRIDE = 6 * 4
+WALL_INSTANCE_DTYPE = np.dtype([("x", "<f4"), ("z", "<f4"), ("material", "<u4"), ("bits", "<u4")])
+UPLOAD_BYTES_PER_FRAME = 1 << 20 # GPU upload budget while streaming in the next level
+CHUNK_SIZE = 16 # cells per chunk side; each chunk has its own buffers and bounding box
+
+WALL_BOTTOM = 0.0
+WALL_TOP = 1.0
+FLOOR_Y = -0.5
+GRID_Y = -0.49
+
+# Materials in the padded grid used for meshing
+EMPTY, WALL, PERIMETER = 0, 1, 2
+
+def _vertices(positions, color):
+    out = np.empty(positions.shape[:-1] + (6,), dtype=np.float32)
+    out[..., :3] = positions
+    out[..., 3:] = color
+    return out.reshape(-1, 6)
+
+def _runs(mask, chunk=None):
+    # Horizontal runs of True along axis 1: (row, start, end) with end exclusive.
+    # With `chunk`, runs are also cut every `chunk` columns.
+    rows, cols = mask.shape
+    if chunk is not None and cols > chunk:
+        n = -(-cols // chunk)
+        split = np.zeros((rows, n * chunk), dtype=bool)
+        split[:, :cols] = mask
+        r, s, e = _runs(split.reshape(rows * n, chunk))
+        offset = (r % n) * chunk
+        return r // n, s + offset, e + offset
+    edges = np.diff(np.pad(mask.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+def _merge_rows(rows, starts, ends, chunk):
+    # Greedy 2D merge: stack identical runs from consecutive rows of the same chunk into rectangles
+    if rows.size == 0:
+        return rows, rows, starts, ends
+    order = np.lexsort((rows, ends, starts))
+    rows, starts, ends = rows[order], starts[order], ends[order]
+    new = np.ones(rows.size, dtype=bool)
+    new[1:] = ((starts[1:] != starts[:-1]) | (ends[1:] != ends[:-1]) | (rows[1:] != rows[:-1] + 1)
+               | (rows[1:] // chunk != rows[:-1] // chunk))
+    first = np.flatnonzero(new)
+    last = np.append(first[1:], rows.size) - 1
+    return rows[first], rows[last] + 1, starts[first], ends[first]
+
+def material_grid(maze):
+    # Maze walls plus the perimeter ring, offset by one: index [z + 1, x + 1]
+    h, w = maze.shape
+    mat = np.full((h + 2, w + 2), PERIMETER, dtype=np.uint8)
+    mat[1:-1, 1:-1] = maze * WALL
+    return mat
+
+class MeshData:
+    # CPU side of a static mesh: shared vertices, triangle indices and GL_LINES indices.
+    # Both index lists live in one `elements` array (triangles first), the layout of the
+    # IBO, so uploading needs no copy; pass it in if the caller already has it that way.
+    def __init__(self, vertices, indices, line_indices, elements=None):
+        if elements is None:
+            elements = np.concatenate((indices, line_indices))
+        self.vertices = vertices         # (N, 6) float32
+        self.elements = elements         # (T*3 + L*2,) uint32
+        self.indices = elements[:len(indices)]
+        self.line_indices = elements[len(indices):]
+
+    @property
+    def triangle_count(self):
+        return len(self.indices) // 3
+
+    @property
+    def vertex_count(self):
+        return len(self.vertices)
+
+# Wall corners all sit on (k - 0.5, WALL_BOTTOM/WALL_TOP, k' - 0.5) for integers k, k'.
+# Each corner packs into an int64 key: chunk id, corner position inside the chunk,
+# top/bottom and colour slot. Sorting the keys groups the vertices by chunk and gives
+# each distinct corner of a chunk exactly one vertex, shared by all faces and edges.
+_SLOT_BITS = 3
+_CORNER_BITS = 6 # per axis, corners 0..chunk inside a chunk
+_CHUNK_SHIFT = _SLOT_BITS + 1 + 2 * _CORNER_BITS
+# Colour slot per (material, face/edge): slot 2*material is the face, 2*material+1 the edge
+_SLOT_COLORS = np.array([(0, 0, 0), (0, 0, 0), WALL_COLOR, WALL_EDGE_COLOR,
+                         PERIMETER_COLOR, PERIMETER_EDGE_COLOR], dtype=np.float32)
+
+def _corner_keys(chunk_id, kx, kz, top, slot):
+    key = np.asarray(chunk_id, dtype=np.int64) << _CORNER_BITS | kx
+    return ((key << _CORNER_BITS | kz) << 1 | top) << _SLOT_BITS | slot
+
+def build_chunk_meshes(region, origin_x, origin_z, chunk=CHUNK_SIZE):
+    # Greedy mesh of the walls in region[1:-1, 1:-1], a material grid slice with one cell of
+    # context on each side, split into chunk x chunk cell blocks. Faces between two solid
+    # cells and the never-seen bottoms are dropped, coplanar faces of the same material
+    # are merged (within a chunk), and only the outline edges of the merged faces get
+    # neon lines. origin_x/z is the world position of the first inner cell.
+    # Returns [(chunk_row, chunk_col, MeshData)] for every chunk with walls in it.
+    rows, cols = region.shape[0] - 2, region.shape[1] - 2
+    ncx = -(-cols // chunk)
+    quads, lines, posts = [], [], []
+
+    def keys(cells_x, cells_z, owner_x, owner_z, top, slot):
+        # Corner (cells_x, cells_z) in region cell units, in the chunk owning (owner_x, owner_z)
+        cx, cz = owner_x // chunk, owner_z // chunk
+        return _corner_keys(cz * ncx + cx, cells_x - cx * chunk, cells_z - cz * chunk, top, slot)
+
+    for material in (WALL, PERIMETER):
+        solid = region == material
+        if not solid[1:-1, 1:-1].any():
+            continue
+        face, edge = 2 * material, 2 * material + 1
+        # Tops: merged into rectangles
+        r0, r1, c0, c1 = _merge_rows(*_runs(solid[1:-1, 1:-1], chunk), chunk)
+        quads.append(np.stack((keys(c0, r0, c0, r0, 1, face), keys(c0, r1, c0, r0, 1, face),
+                               keys(c1, r1, c0, r0, 1, face), keys(c1, r0, c0, r0, 1, face)), axis=1))
+        # Sides: strips along the wall, skipped where the neighbour is solid. `visible`
+        # keeps one context cell along the strip so the ends can tell whether the strip
+        # really stops there or just continues into the next chunk.
+        for axis, step in ((0, 1), (0, -1), (1, 1), (1, -1)):
+            if axis == 0: # faces along x, neighbour across z
+                neighbour = region[2:, :] if step > 0 else region[:-2, :]
+                visible = solid[1:-1, :] & (neighbour == EMPTY)
+            else:         # faces along z, neighbour across x
+                neighbour = region[:, 2:] if step > 0 else region[:, :-2]
+                visible = (solid[:, 1:-1] & (neighbour == EMPTY)).T
+            line, a, b = _runs(visible[:, 1:-1], chunk)
+            if len(a) == 0:
+                continue
+            plane = line + (1 if step > 0 else 0)
+            if axis == 0:
+                x_start, z_start, x_end, z_end = (a, plane, b, plane) if step > 0 else (b, plane, a, plane)
+                owner_x, owner_z = a, line
+            else:
+                x_start, z_start, x_end, z_end = (plane, b, plane, a) if step > 0 else (plane, a, plane, b)
+                owner_x, owner_z = line, a
+            quads.append(np.stack((keys(x_start, z_start, owner_x, owner_z, 0, face),
+                                   keys(x_end, z_end, owner_x, owner_z, 0, face),
+                                   keys(x_end, z_end, owner_x, owner_z, 1, face),
+                                   keys(x_start, z_start, owner_x, owner_z, 1, face)), axis=1))
+            # Outline of the strip: bottom and top edges plus the vertical ends where it stops
+            b0 = keys(x_start, z_start, owner_x, owner_z, 0, edge)
+            b1 = keys(x_end, z_end, owner_x, owner_z, 0, edge)
+            lines.extend((np.stack((b0, b1), axis=1), np.stack((b0, b1), axis=1) | (1 << _SLOT_BITS)))
+            stops_a = ~visible[line, a]     # context index a is the cell before the strip
+            stops_b = ~visible[line, b + 1] # and b + 1 the cell after it
+            if (axis == 0) == (step > 0): # strip corners run a -> b
+                posts.extend((b0[stops_a], b1[stops_b]))
+            else:
+                posts.extend((b0[stops_b], b1[stops_a]))
+    if not quads:
+        return []
+
+    quad_keys, line_keys, post_keys = np.concatenate(quads), np.concatenate(lines), np.concatenate(posts)
+    post_keys = np.sort(post_keys)
+    post_keys = post_keys[np.append(True, post_keys[1:] != post_keys[:-1])] # shared corners
+    line_keys = np.concatenate((line_keys, np.column_stack((post_keys, post_keys | (1 << _SLOT_BITS)))))
+
+    vertex_keys, inverse = np.unique(np.concatenate((quad_keys.ravel(), line_keys.ravel())), return_inverse=True)
+    vertex_chunk = vertex_keys >> _CHUNK_SHIFT
+    top = (vertex_keys >> _SLOT_BITS) & 1
+    kz = (vertex_keys >> (_SLOT_BITS + 1)) & ((1 << _CORNER_BITS) - 1)
+    kx = (vertex_keys >> (_SLOT_BITS + 1 + _CORNER_BITS)) & ((1 << _CORNER_BITS) - 1)
+    vertices = np.empty((len(vertex_keys), 6), dtype=np.float32)
+    vertices[:, 0] = origin_x - 0.5 + (vertex_chunk % ncx) * chunk + kx
+    vertices[:, 1] = np.where(top == 1, WALL_TOP, WALL_BOTTOM)
+    vertices[:, 2] = origin_z - 0.5 + (vertex_chunk // ncx) * chunk + kz
+    vertices[:, 3:] = _SLOT_COLORS[vertex_keys & ((1 << _SLOT_BITS) - 1)]
+
+    # Everything sorted by chunk, indices rebased to the chunk's first vertex
+    chunk_ids = np.unique(vertex_chunk)
+    vertex_start = np.searchsorted(vertex_chunk, chunk_ids)
+    vertex_end = np.append(vertex_start[1:], len(vertex_keys))
+    base = np.zeros(chunk_ids[-1] + 1, dtype=np.int64)
+    base[chunk_ids] = vertex_start
+    quad_chunk = quad_keys[:, 0] >> _CHUNK_SHIFT
+    line_chunk = line_keys[:, 0] >> _CHUNK_SHIFT
+    quad_order, line_order = np.argsort(quad_chunk, kind="stable"), np.argsort(line_chunk, kind="stable")
+    quad_idx = (inverse[:quad_keys.size].reshape(-1, 4) - base[quad_chunk, None])[quad_order]
+    line_idx = (inverse[quad_keys.size:].reshape(-1, 2) - base[line_chunk, None])[line_order]
+    tris = quad_idx[:, [0, 1, 2, 0, 2, 3]].astype(np.uint32)
+    line_idx = line_idx.astype(np.uint32)
+    quad_bounds = np.searchsorted(quad_chunk[quad_order], chunk_ids, side="right")
+    line_bounds = np.searchsorted(line_chunk[line_order], chunk_ids, side="right")
+
+    meshes = []
+    q0 = l0 = 0
+    for cid, v0, v1, q1, l1 in zip(chunk_ids.tolist(), vertex_start.tolist(), vertex_end.tolist(),
+                                   quad_bounds.tolist(), line_bounds.tolist()):
+        meshes.append((cid // ncx, cid % ncx,
+                       MeshData(vertices[v0:v1], tris[q0:q1].ravel(), line_idx[l0:l1].ravel())))
+        q0, l0 = q1, l1
+    return meshes
+
+def build_floor_mesh(w, h):
+    corners = np.array([(-1, FLOOR_Y, -1), (-1, FLOOR_Y, h), (w, FLOOR_Y, h), (w, FLOOR_Y, -1)], dtype=np.float32)
+    i = np.arange(-1, max(w, h) + 1, dtype=np.float32)
+    n = i.size
+    grid = np.concatenate((
+        np.stack((np.column_stack((i, np.full(n, GRID_Y), np.full(n, -1))),
+                  np.column_stack((i, np.full(n, GRID_Y), np.full(n, h)))), axis=1),
+        np.stack((np.column_stack((np.full(n, -1), np.full(n, GRID_Y), i)),
+                  np.column_stack((np.full(n, w), np.full(n, GRID_Y), i))), axis=1))).reshape(-1, 3)
+    vertices = np.concatenate((_vertices(corners, FLOOR_COLOR), _vertices(grid, GRID_COLOR)))
+    return MeshData(vertices, np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32),
+                    np.arange(4, len(vertices), dtype=np.uint32))
+
+# Per-cell wall instances for the shader path (see WallShader). Faces of the unit cube:
+# 0 top, 1 +x, 2 -x, 3 +z, 4 -z, each with a (u, v) over it; u runs along +x or +z.
+# Each face has 4 edge bits (u = 0, u = 1, v = 0, v = 1 glow), at bit 4 * face; bit
+# 19 + face is set for side faces against another wall, which are never drawn.
+_FACE_DIRS = ((1, 0, 1), (2, 0, -1), (3, 1, 0), (4, -1, 0)) # (face, dz, dx) of the neighbour it faces
+
+def build_wall_instances(mat, chunk_index, chunk=CHUNK_SIZE):
+    # mat: padded material grid. Returns (N,) instance records sorted by chunk and the
+    # (K, 2) [start, end) instance range of each chunk, in chunk_index order.
+    rows, cols = np.nonzero(mat)
+    ids = chunk_index[rows // chunk, cols // chunk]
+    order = np.argsort(ids, kind="stable")
+    rows, cols, ids = rows[order], cols[order], ids[order]
+    # Outside the perimeter is open
+    instances = wall_instances(np.pad(mat, 1), rows, cols, cols - 1, rows - 1)
+    count = int(chunk_index.max()) + 1 if chunk_index.size else 0
+    bounds = np.searchsorted(ids, np.arange(count + 1))
+    return instances, np.column_stack((bounds[:-1], bounds[1:]))
+
+def wall_instances(region, rows, cols, x, z):
+    # Records of the wall cells region[rows + 1, cols + 1], a material grid with one cell
+    # of context on each side, placed at world (x, z)
+    own = region[rows + 1, cols + 1]
+
+    def at(dz, dx):
+        return region[rows + 1 + dz, cols + 1 + dx]
+
+    bits = np.zeros(rows.size, dtype=np.uint32)
+    # Top: an edge wherever the neighbour isn't the same material (the greedy mesh outline)
+    for bit, (dz, dx) in enumerate(((0, -1), (0, 1), (-1, 0), (1, 0))):
+        bits |= (at(dz, dx) != own).astype(np.uint32) << bit
+    for face, dz, dx in _FACE_DIRS:
+        front = at(dz, dx)
+        bits |= (front != EMPTY).astype(np.uint32) << (19 + face)
+        # Vertical edges where the face's strip ends: the next cell along isn't the same
+        # material, or it is but has a wall in front of it
+        along = ((-1, 0), (1, 0)) if dx else ((0, -1), (0, 1))
+        for end, (az, ax) in enumerate(along):
+            stops = (at(az, ax) != own) | (at(az + dz, ax + dx) != EMPTY)
+            bits |= stops.astype(np.uint32) << (4 * face + end)
+        bits |= np.uint32(0b1100 << (4 * face)) # top and bottom always
+    instances = np.empty(rows.size, dtype=WALL_INSTANCE_DTYPE)
+    instances["x"] = x
+    instances["z"] = z
+    instances["material"] = own
+    instances["bits"] = bits
+    return instances
+
+class LevelMesh:
+    def __init__(self, floor, chunks, bounds, chunk_index, cell_counts, stats, walls):
+        self.floor = floor             # MeshData, always drawn
+        self.chunks = chunks           # [MeshData] per non-empty chunk
+        self.bounds = bounds           # (K, 2, 3) float32 world-space box of each chunk
+        self.chunk_index = chunk_index # (rows, cols) int32 chunk grid -> index into chunks, -1 if empty
+        self.cell_counts = cell_counts # (K,) wall cells in each chunk
+        self.stats = stats
+        self.wall_instances, self.wall_ranges = walls # for the shader path, see build_wall_instances
+
+def build_level_mesh(maze, chunk=CHUNK_SIZE, pool=None):
+    # pool: optional create_mesh_pool() executor, used for big levels
+    h, w = maze.shape
+    mat = material_grid(maze)
+    # Chunks start at the perimeter (world -1) and get one EMPTY cell of context around
+    region = np.pad(mat, 1)
+    if pool is not None and region.size >= PARALLEL_MESH_MIN_CELLS:
+        chunk_meshes, instances = build_chunk_meshes_parallel(region, pool, chunk)
+    else:
+        chunk_meshes, instances = build_chunk_meshes(region, -1, -1, chunk), None
+    floor = build_floor_mesh(w, h)
+    bounds = np.array([((-1.5 + cx * chunk, WALL_BOTTOM, -1.5 + cz * chunk),
+                        (-1.5 + min((cx + 1) * chunk, w + 2), WALL_TOP, -1.5 + min((cz + 1) * chunk, h + 2)))
+                       for cz, cx, _ in chunk_meshes], dtype=np.float32).reshape(-1, 2, 3)
+    chunks = [m for _, _, m in chunk_meshes]
+    chunk_index = np.full((-(-(h + 2) // chunk), -(-(w + 2) // chunk)), -1, dtype=np.int32)
+    cell_counts = np.zeros(len(chunks), dtype=np.int64)
+    for i, (cz, cx, _) in enumerate(chunk_meshes):
+        chunk_index[cz, cx] = i
+        cell_counts[i] = np.count_nonzero(mat[cz * chunk:(cz + 1) * chunk, cx * chunk:(cx + 1) * chunk])
+    # What the old one-cube-per-cell display list cost: 24 quad + 24 line vertices, 12 triangles
+    cubes = int(np.count_nonzero(mat))
+    stats = {"chunks": len(chunks),
+             "triangles": floor.triangle_count + sum(m.triangle_count for m in chunks),
+             "vertices": floor.vertex_count + sum(m.vertex_count for m in chunks),
+             "lines": (len(floor.line_indices) + sum(len(m.line_indices) for m in chunks)) // 2,
+             "cube_triangles": cubes * 12, "cube_vertices": cubes * 48}
+    if instances is None:
+        walls = build_wall_instances(mat, chunk_index, chunk)
+    else: # one instance per wall cell, already in chunk order
+        ends = np.cumsum(cell_counts)
+        walls = instances, np.column_stack((ends - cell_counts, ends))
+    return LevelMesh(floor, chunks, bounds, chunk_index, cell_counts, stats, walls)
+
+class Level:
+    def __init__(self, size, maze, mesh, number=None):
+        self.size = size
+        self.number = number # position in a seeded session (see build_seeded_level)
+        self.maze = maze
+        self.mesh = mesh
+        # Walls plus the perimeter ring, in the chunk grid's indexing, for the visibility rays
+        self.occluders = np.pad(maze != 0, 1, constant_values=True)
+        self.collision = CollisionGrid(maze)
+
+    # Built on first use: playing needs neither, so builds and pack loads don't pay for them
+    @cached_property
+    def graph(self):
+        return CorridorGraph(self.maze)
+
+    @cached_property
+    def solution(self):
+        return ExitField(self.maze, self.graph)
+
+# Pure CPU work, safe to run on the level builder thread
+def build_level(size, rng=None, number=None, pool=None):
+    maze = generate_maze(size, size, rng)
+    return Level(size, maze, build_level_mesh(maze, pool=pool), number)
+
+# --- Parallel Meshing ---
+# Big levels are meshed on a process pool: the padded grid goes into shared memory once,
+# each task meshes a band of MESH_BAND_ROWS chunk rows out of it, wall instances
+# included, and sends back packed arrays (no pickled objects, so it works whatever
+# module the game runs as). Smaller levels aren't worth the round trip and are meshed
+# in the calling thread.
+MESH_BAND_ROWS = 4
+PARALLEL_MESH_MIN_CELLS = 256 * 256
+
+def create_mesh_pool(workers=None):
+    # workers: None for one per core, 0 for no pool. Without a pool (also the default on a
+    # single core) everything is meshed on the builder thread. Workers are spawned, not
+    # forked, so they don't inherit the window, the GL context or the running threads.
+    if workers is None:
+        workers = os.cpu_count() or 1
+        if workers == 1:
+            return None
+    if workers == 0:
+        return None
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1") # workers re-import this module
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def pack_meshes(chunk_meshes):
+    # [(row, col, MeshData)] -> (table, vertices, elements), one array each for all chunks;
+    # table rows are (row, col, vertex count, element count, triangle index count)
+    table = np.array([(r, c, m.vertex_count, len(m.elements), len(m.indices)) for r, c, m in chunk_meshes],
+                     dtype=np.int64).reshape(-1, 5)
+    if not chunk_meshes:
+        return table, np.zeros((0, 6), dtype=np.float32), np.zeros(0, dtype=np.uint32)
+    return (table, np.concatenate([m.vertices for _, _, m in chunk_meshes]),
+            np.concatenate([m.elements for _, _, m in chunk_meshes]))
+
+def unpack_meshes(table, vertices, elements):
+    # Inverse of pack_meshes; the meshes are views into the packed arrays
+    meshes = []
+    v0 = e0 = 0
+    for r, c, vertex_count, element_count, index_count in table.tolist():
+        part = elements[e0:e0 + element_count]
+        meshes.append((r, c, MeshData(vertices[v0:v0 + vertex_count], part[:index_count], part[index_count:], part)))
+        v0 += vertex_count
+        e0 += element_count
+    return meshes
+
+def _mesh_band(name, shape, row0, row1, chunk):
+    # Pool task: chunk rows [row0, row1) of the shared padded grid. Returns the packed
+    # meshes and the band's wall instances, sorted by chunk like build_wall_instances.
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        grid = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        region = np.array(grid[row0 * chunk:min(row1 * chunk, shape[0] - 2) + 2])
+        del grid # no views may outlive close()
+    finally:
+        shm.close()
+    rows, cols = np.nonzero(region[1:-1, 1:-1])
+    order = np.argsort(rows // chunk * shape[1] + cols // chunk, kind="stable")
+    rows, cols = rows[order], cols[order]
+    z0 = row0 * chunk - 1
+    return (pack_meshes(build_chunk_meshes(region, -1, z0, chunk)),
+            wall_instances(region, rows, cols, cols - 1, rows + z0))
+
+def build_chunk_meshes_parallel(region, pool, chunk=CHUNK_SIZE):
+    # build_chunk_meshes(region, -1, -1, chunk) split across the pool by bands of chunk
+    # rows; also returns the wall instances of all chunks, in the same order
+    rows = -(-(region.shape[0] - 2) // chunk)
+    bands = [(r, min(r + MESH_BAND_ROWS, rows)) for r in range(0, rows, MESH_BAND_ROWS)]
+    shm = shared_memory.SharedMemory(create=True, size=region.nbytes)
+    try:
+        grid = np.ndarray(region.shape, dtype=np.uint8, buffer=shm.buf)
+        grid[:] = region
+        del grid
+        futures = [pool.submit(_mesh_band, shm.name, region.shape, r0, r1, chunk) for r0, r1 in bands]
+        chunk_meshes, instances = [], []
+        for future, (r0, _) in zip(futures, bands):
+            packed, band_instances = future.result()
+            chunk_meshes.extend((r0 + r, c, m) for r, c, m in unpack_meshes(*packed))
+            instances.append(band_instances)
+    finally:
+        shm.close()
+        shm.unlink()
+    return chunk_meshes, np.concatenate(instances)
+
+# --- Seeded Levels ---
+# Level N of a session is fully determined by the session seed, so it can be rebuilt
+# or baked ahead of time into a level pack.
+LEVEL_PACK_DIR = "levels"
+
+def level_pack_path(seed):
+    return os.path.join(LEVEL_PACK_DIR, f"seed_{seed}.lzp")
+
+def build_seeded_level(seed, number, pack=None, pool=None):
+    # From the pack if it has the level (no generation or meshing), otherwise built
+    if pack is not None and number in pack:
+        return pack.load(number)
+    return build_level(level_size(number), level_rng(seed, number), number, pool)
+
+# Level pack file layout (little-endian):
+#   header     magic, version, seed, level count
+#   directory  per level: number, size, offset and length of its record
+#   records    per level: JSON length + JSON metadata (shapes, stats, array table),
+#              then the arrays it lists, each PACK_ALIGN aligned
+# Arrays are read straight out of the mmap with np.frombuffer, so the mesh data is
+# never copied before the GPU upload. The grid is stored bit-packed.
+PACK_MAGIC = b"LAZEPACK"
+PACK_VERSION = 1
+PACK_ALIGN = 16
+_PACK_HEADER = struct.Struct("<8sIQI")
+_PACK_ENTRY = struct.Struct("<IIQQ")
+
+def _level_arrays(level):
+    # The arrays a pack record stores for a level, by name
+    mesh = level.mesh
+    chunks = mesh.chunks
+    return {
+        "maze": np.packbits(level.maze.reshape(-1)),
+        "floor_vertices": mesh.floor.vertices,
+        "floor_elements": mesh.floor.elements,
+        "chunk_vertices": np.concatenate([c.vertices for c in chunks]) if chunks else np.zeros((0, 6), np.float32),
+        "chunk_elements": np.concatenate([c.elements for c in chunks]) if chunks else np.zeros(0, np.uint32),
+        # per chunk: vertex, triangle index and line index counts
+        "chunk_counts": np.array([(len(c.vertices), len(c.indices), len(c.line_indices)) for c in chunks],
+                                 dtype=np.int64).reshape(-1, 3),
+        "bounds": mesh.bounds,
+        "chunk_index": mesh.chunk_index,
+        "cell_counts": mesh.cell_counts,
+    }
+
+def _align(n):
+    return n + -n % PACK_ALIGN
+
+def _pack_record(level):
+    # One level's record; records start PACK_ALIGN aligned. Array offsets in the JSON
+    # count from the first aligned byte after it.
+    meta = {"number": level.number, "size": level.size, "shape": level.maze.shape,
+            "floor_indices": len(level.mesh.floor.indices), "stats": level.mesh.stats, "arrays": {}}
+    data = bytearray()
+    for name, a in _level_arrays(level).items():
+        a = np.ascontiguousarray(a)
+        data += bytes(_align(len(data)) - len(data))
+        meta["arrays"][name] = (len(data), a.dtype.str, a.shape)
+        data += a.tobytes()
+    head = json.dumps(meta).encode()
+    head += b" " * (_align(4 + len(head)) - 4 - len(head))
+    return struct.pack("<I", len(head)) + head + bytes(data)
+
+def write_level_pack(path, seed, count, log=print, pool=None):
+    # Build levels 1..count of `seed` and write them as one pack, a record at a time;
+    # pool: optional create_mesh_pool() executor to mesh the big ones on
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    directory = []
+    with open(path + ".tmp", "wb") as f:
+        f.write(bytes(_align(_PACK_HEADER.size + _PACK_ENTRY.size * count))) # filled in below
+        for number in range(1, count + 1):
+            start = time.perf_counter()
+            record = _pack_record(build_seeded_level(seed, number, pool=pool))
+            f.write(bytes(_align(f.tell()) - f.tell()))
+            directory.append(_PACK_ENTRY.pack(number, level_size(number), f.tell(), len(record)))
+            f.write(record)
+            log(f"Level {number} ({level_size(number)}x{level_size(number)}): {len(record) // 1024} KB, "
+                f"{time.perf_counter() - start:.2f}s")
+        f.seek(0)
+        f.write(_PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, seed, count) + b"".join(directory))
+    os.replace(path + ".tmp", path) # never leave a half-written pack behind
+
+class LevelPack:
+    # Read side of a level pack. The file is mapped once; load() only parses a record's
+    # JSON and wraps its arrays, so a level costs no generation, meshing or copying.
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.seed, count = _PACK_HEADER.unpack_from(self.map, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"{path}: not a version {PACK_VERSION} level pack")
+        self.path = path
+        self.entries = {}
+        for i in range(count):
+            number, size, offset, length = _PACK_ENTRY.unpack_from(self.map, _PACK_HEADER.size + i * _PACK_ENTRY.size)
+            self.entries[number] = (size, offset, length)
+
+    def close(self):
+        # Unmaps the file. Levels loaded from it alias the mapping, and mmap won't close
+        # under them; if any are still alive it goes when the last of them does.
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __contains__(self, number):
+        return number in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, number):
+        _, offset, _ = self.entries[number]
+        (head_len,) = struct.unpack_from("<I", self.map, offset)
+        meta = json.loads(bytes(self.map[offset + 4:offset + 4 + head_len]))
+        base = offset + 4 + head_len
+        arrays = {}
+        for name, (position, dtype, shape) in meta["arrays"].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(self.map, dtype, count, base + position).reshape(shape)
+        h, w = meta["shape"]
+        maze = np.unpackbits(arrays["maze"], count=h * w).reshape(h, w)
+        n = meta["floor_indices"]
+        floor = arrays["floor_elements"]
+        floor = MeshData(arrays["floor_vertices"], floor[:n], floor[n:], floor)
+        chunks = []
+        v0 = e0 = 0
+        for vertex_count, index_count, line_count in arrays["chunk_counts"].tolist():
+            elements = arrays["chunk_elements"][e0:e0 + index_count + line_count]
+            chunks.append(MeshData(arrays["chunk_vertices"][v0:v0 + vertex_count], elements[:index_count],
+                                   elements[index_count:], elements))
+            v0 += vertex_count
+            e0 += index_count + line_count
+        # Wall instances are cheap to derive, so they aren't stored
+        walls = build_wall_instances(material_grid(maze), arrays["chunk_index"])
+        mesh = LevelMesh(floor, chunks, arrays["bounds"], arrays["chunk_index"], arrays["cell_counts"], meta["stats"],
+                         walls)
+        return Level(meta["size"], maze, mesh, meta["number"])
+
+class MeshBuffers:
+    # VBO + IBO for one MeshData; the IBO holds the triangle indices followed by the
+    # line indices. upload() can be spread over several frames; draw() once complete.
+    def __init__(self, mesh):
+        self.vbos = None # allocated on the first upload
+        self.targets = (GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER)
+        self.arrays = [mesh.vertices, mesh.elements]
+        self.index_count = len(mesh.indices)
+        self.line_index_count = len(mesh.line_indices)
+        self.current = 0 # index of the array being uploaded
+        self.offset = 0  # bytes of it already uploaded
+
+    @property
+    def complete(self):
+        return self.current >= len(self.targets)
+
+    def upload(self, budget=None):
+        # Upload up to `budget` bytes (everything if None). Returns the bytes uploaded.
+        if self.vbos is None:
+            self.vbos = glGenBuffers(2)
+            for vbo, target, data in zip(self.vbos, self.targets, self.arrays):
+                glBindBuffer(target, vbo)
+                glBufferData(target, data.nbytes, None, GL_STATIC_DRAW)
+                glBindBuffer(target, 0)
+        uploaded = 0
+        while not self.complete and (budget is None or uploaded < budget):
+            target = self.targets[self.current]
+            data = self.arrays[self.current].reshape(-1).view(np.uint8)
+            end = data.size if budget is None else min(data.size, self.offset + budget - uploaded)
+            if end > self.offset:
+                glBindBuffer(target, self.vbos[self.current])
+                glBufferSubData(target, self.offset, end - self.offset, data[self.offset:end])
+                glBindBuffer(target, 0)
+                uploaded += end - self.offset
+            self.offset = end
+            if self.offset >= data.size:
+                self.current += 1
+                self.offset = 0
+        if self.complete:
+            self.arrays = None # drop the CPU copies
+        return uploaded
+
+    def draw(self, lines=True):
+        # Client arrays must already be enabled (see LevelBuffers.draw)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbos[0])
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.vbos[1])
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(12))
+        glDrawElements(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, None)
+        if lines:
+            glDrawElements(GL_LINES, self.line_index_count, GL_UNSIGNED_INT, ctypes.c_void_p(self.index_count * 4))
+
+    def delete(self):
+        if self.vbos is not None:
+            glDeleteBuffers(2, self.vbos)
+
+class WallBuffers:
+    # Instance VBO of the shader path: one WALL_INSTANCE_DTYPE record per wall cell
+    def __init__(self, instances, ranges):
+        self.vbo = None
+        self.data = instances.view(np.uint8)
+        self.ranges = ranges # (K, 2) instance range of each chunk
+        self.offset = 0
+
+    @property
+    def complete(self):
+        return self.data is None
+
+    def upload(self, budget=None):
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, max(self.data.size, 1), None, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        end = self.data.size if budget is None else min(self.data.size, self.offset + budget)
+        uploaded = end - self.offset
+        if uploaded > 0:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferSubData(GL_ARRAY_BUFFER, self.offset, uploaded, self.data[self.offset:end])
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.offset = end
+        if self.offset >= self.data.size:
+            self.data = None # drop the CPU copy
+        return uploaded
+
+    def delete(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+
+class LevelBuffers:
+    # GPU side of a LevelMesh: the floor plus one MeshBuffers per chunk, or with
+    # instanced=True the wall instances for WallShader instead of the chunk meshes
+    def __init__(self, mesh, instanced=False):
+        self.floor = MeshBuffers(mesh.floor)
+        self.chunks = [] if instanced else [MeshBuffers(c) for c in mesh.chunks]
+        self.walls = WallBuffers(mesh.wall_instances, mesh.wall_ranges) if instanced else None
+        self.bounds = mesh.bounds
+        self.pending = [self.floor] + self.chunks + ([self.walls] if instanced else [])
+        self.pending.reverse() # popped from the end
+
+    @property
+    def complete(self):
+        return not self.pending
+
+    def upload(self, budget=None):
+        # Upload up to `budget` bytes (everything if None). Returns True once complete.
+        while self.pending and (budget is None or budget > 0):
+            uploaded = self.pending[-1].upload(budget)
+            if budget is not None: budget -= uploaded
+            if self.pending[-1].complete:
+                self.pending.pop()
+        return self.complete
+
+    def draw(self, visible, shader=None, edges=True):
+        # visible: bool mask over the chunks; shader: the WallShader, for instanced buffers;
+        # edges: draw the neon wall edges (the floor grid is always drawn)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        gl_state.line_width(2)
+        self.floor.draw()
+        if self.walls is None:
+            for i in np.flatnonzero(visible).tolist():
+                self.chunks[i].draw(edges)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        if self.walls is not None:
+            shader.draw(self.walls, visible, edges)
+
+    def delete(self):
+        self.floor.delete()
+        for c in self.chunks:
+            c.delete()
+        if self.walls is not None:
+            self.walls.delete()
+
+# --- Wall Shader ---
+# Optional GLSL path: every wall cell is an instance of one unit cube, drawn with
+# glDrawArraysInstanced over runs of visible chunks. The neon edges come from the
+# fragment shader (distance in pixels to the face's glowing borders), so there is no
+# separate line pass; fog is computed per fragment from the fixed-function fog state.
+WALL_VERTEX_SHADER = """
+#version 130
+in vec3 corner;  // unit cube corner, relative to the cell
+in vec3 face_uv; // u, v over the face, face index
+in vec2 cell;    // per instance: x, z
+in uvec2 wall;   // per instance: material, edge/hidden bits
+out vec2 uv;
+flat out uint edges;
+flat out uint material;
+out float fog_depth;
+
+void main() {
+    uint face = uint(face_uv.z);
+    uv = face_uv.xy;
+    edges = (wall.y >> (4u * face)) & 15u;
+    material = wall.x;
+    vec4 eye = gl_ModelViewMatrix * vec4(corner + vec3(cell.x, 0.0, cell.y), 1.0);
+    fog_depth = abs(eye.z);
+    gl_Position = gl_ProjectionMatrix * eye;
+    if (((wall.y >> (19u + face)) & 1u) != 0u && face > 0u)
+        gl_Position = vec4(0.0, 0.0, 2.0, 1.0); // against another wall: clipped away
+}
+"""
+WALL_FRAGMENT_SHADER = """
+#version 130
+uniform vec3 face_colors[3];
+uniform vec3 edge_colors[3];
+uniform float edge_scale; // 0 turns the edges off
+in vec2 uv;
+flat in uint edges;
+flat in uint material;
+in float fog_depth;
+
+void main() {
+    vec2 pixel = max(fwidth(uv), vec2(1e-6));
+    vec2 low = uv / pixel, high = (1.0 - uv) / pixel; // pixels to each border
+    float d = 1e6;
+    if ((edges & 1u) != 0u) d = min(d, low.x);
+    if ((edges & 2u) != 0u) d = min(d, high.x);
+    if ((edges & 4u) != 0u) d = min(d, low.y);
+    if ((edges & 8u) != 0u) d = min(d, high.y);
+    // About as wide as the old glLineWidth(2) lines, plus a soft glow around them
+    float edge = 1.0 - smoothstep(0.5, 1.5, d) + 0.35 * exp(-d / 3.0);
+    vec3 color = mix(face_colors[material], edge_colors[material], clamp(edge * edge_scale, 0.0, 1.0));
+    float fog = clamp(exp(-gl_Fog.density * fog_depth), 0.0, 1.0); // GL_EXP, like glFog
+    gl_FragColor = vec4(mix(gl_Fog.color.rgb, color, fog), 1.0);
+}
+"""
+
+def _wall_cube():
+    # Top and the four sides (the bottom is never seen): (x, y, z, u, v, face) x 30
+    corners = ((0, 0), (1, 0), (1, 1), (0, 0), (1, 1), (0, 1))
+    faces = [lambda u, v: (u - 0.5, WALL_TOP, v - 0.5),
+             lambda u, v: (0.5, WALL_BOTTOM + v, u - 0.5), lambda u, v: (-0.5, WALL_BOTTOM + v, u - 0.5),
+             lambda u, v: (u - 0.5, WALL_BOTTOM + v, 0.5), lambda u, v: (u - 0.5, WALL_BOTTOM + v, -0.5)]
+    return np.array([position(u, v) + (u, v, face) for face, position in enumerate(faces) for u, v in corners],
+                    dtype=np.float32)
+
+def _compile_program(vertex_source, fragment_source, attributes=()):
+    program = glCreateProgram()
+    for kind, source in ((GL_VERTEX_SHADER, vertex_source), (GL_FRAGMENT_SHADER, fragment_source)):
+        shader = glCreateShader(kind)
+        glShaderSource(shader, source)
+        glCompileShader(shader)
+        if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+            raise RuntimeError(glGetShaderInfoLog(shader).decode(errors="replace"))
+        glAttachShader(program, shader)
+        glDeleteShader(shader)
+    for location, name in enumerate(attributes):
+        glBindAttribLocation(program, location, name)
+    glLinkProgram(program)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        raise RuntimeError(glGetProgramInfoLog(program).decode(errors="replace"))
+    return program
+
+class WallShader:
+    # Raises if the driver lacks GLSL 1.30 or instancing; see create_wall_shader
+    def __init__(self):
+        for function in (glDrawArraysInstanced, glVertexAttribDivisor, glVertexAttribIPointer):
+            if not bool(function):
+                raise RuntimeError(f"{function.__name__} not available")
+        # corner must be attribute 0: in a compatibility context that one is always enabled
+        self.program = _compile_program(WALL_VERTEX_SHADER, WALL_FRAGMENT_SHADER,
+                                        ("corner", "face_uv", "cell", "wall"))
+        cube = _wall_cube()
+        self.vertex_count = len(cube)
+        self.cube = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.cube)
+        glBufferData(GL_ARRAY_BUFFER, cube.nbytes, cube, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(self.program)
+        # Indexed by material: EMPTY, WALL, PERIMETER
+        glUniform3fv(glGetUniformLocation(self.program, "face_colors"), 3,
+                     np.array([(0, 0, 0), WALL_COLOR, PERIMETER_COLOR], dtype=np.float32))
+        glUniform3fv(glGetUniformLocation(self.program, "edge_colors"), 3,
+                     np.array([(0, 0, 0), WALL_EDGE_COLOR, PERIMETER_EDGE_COLOR], dtype=np.float32))
+        self.edge_scale = glGetUniformLocation(self.program, "edge_scale")
+        glUniform1f(self.edge_scale, 1.0)
+        self.edges = True
+        glUseProgram(0)
+        self.stats = 0 # draw calls last frame
+
+    def draw(self, walls, visible, edges=True):
+        # One instanced draw per run of consecutive visible chunks
+        _, starts, ends = _runs(visible[None, :])
+        first, last = walls.ranges[starts, 0], walls.ranges[ends - 1, 1]
+        glUseProgram(self.program)
+        if edges != self.edges:
+            glUniform1f(self.edge_scale, 1.0 if edges else 0.0)
+            self.edges = edges
+        glBindBuffer(GL_ARRAY_BUFFER, self.cube)
+        for location in range(4):
+            glEnableVertexAttribArray(location)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
+        glBindBuffer(GL_ARRAY_BUFFER, walls.vbo)
+        glVertexAttribDivisor(2, 1)
+        glVertexAttribDivisor(3, 1)
+        stride = WALL_INSTANCE_DTYPE.itemsize
+        for a, b in zip(first.tolist(), last.tolist()):
+            glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(a * stride))
+            glVertexAttribIPointer(3, 2, GL_UNSIGNED_INT, stride, ctypes.c_void_p(a * stride + 8))
+            glDrawArraysInstanced(GL_TRIANGLES, 0, self.vertex_count, b - a)
+        # Leave the attribute state as the fixed-function path expects it
+        glVertexAttribDivisor(2, 0)
+        glVertexAttribDivisor(3, 0)
+        for location in range(4):
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+        self.stats = len(first)
+
+def create_wall_shader():
+    try:
+        return WallShader()
+    except Exception as e:
+        print(f"Wall shader unavailable, using the fixed-function path: {e}")
+        return None
+
+# --- Sky ---
+STAR_COUNT = 200
+SKY_STRIDE = 28 # x, y, z, r, g, b, a as float32
+
+def build_sky(star_count=STAR_COUNT, rng=None):
+    # Gradient box, star points and sun fan in one camera-relative vertex array.
+    # Returns (vertices, [(primitive, first, count, additive_blend)]).
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    size = 80.0
+    height = 60.0 # Higher Sky
+    # Colors - Deep Space (Almost Black) to Retro Purple/Pink at Horizon
+    top_color = (0.02, 0.0, 0.05, 1.0)    # Deep Void
+    horizon_color = (0.6, 0.1, 0.4, 1.0) # Magenta Horizon
+    box = []
+    # Front, back, left, right sides with a vertical gradient
+    for (x0, z0), (x1, z1) in (((-size, -size), (size, -size)), ((size, size), (-size, size)),
+                               ((-size, size), (-size, -size)), ((size, -size), (size, size))):
+        box += [(x0, -20, z0) + horizon_color, (x1, -20, z1) + horizon_color,
+                (x1, height, z1) + top_color, (x0, height, z0) + top_color]
+    # Top lid
+    box += [(-size, height, -size) + top_color, (size, height, -size) + top_color,
+            (size, height, size) + top_color, (-size, height, size) + top_color]
+
+    # Stars in the upper hemisphere, closer to the horizon
+    theta = rng.uniform(0, 2 * math.pi, star_count)
+    phi = rng.uniform(0, math.pi / 2.2, star_count)
+    r = 100.0 # Further away
+    stars = np.ones((star_count, 7), dtype=np.float32)
+    stars[:, 0] = r * np.sin(phi) * np.cos(theta)
+    stars[:, 1] = r * np.cos(phi)
+    stars[:, 2] = r * np.sin(phi) * np.sin(theta)
+
+    # Retro sun on the horizon (North / -Z direction): bright centre, pink rim
+    segments = 32
+    radius = 8.0
+    angles = 2.0 * np.pi * np.arange(segments + 1) / segments
+    sun = np.empty((segments + 2, 7), dtype=np.float32)
+    sun[0] = (0, 3, -30, 1.0, 0.9, 0.2, 0.9)
+    sun[1:, 0] = radius * np.cos(angles)
+    sun[1:, 1] = radius * np.sin(angles) + 3 # Shift up slightly
+    sun[1:, 2] = -30 # Distance
+    sun[1:, 3:] = (1.0, 0.1, 0.6, 0.4)
+
+    vertices = np.concatenate((np.array(box, dtype=np.float32), stars, sun))
+    parts = [(GL_QUADS, 0, len(box), False),
+             (GL_POINTS, len(box), star_count, False),
+             (GL_TRIANGLE_FAN, len(box) + star_count, len(sun), True)]
+    return vertices, parts
+
+class SkyBuffers:
+    # The whole sky in one static VBO: three glDrawArrays per frame whatever the star count
+    def __init__(self, star_count=STAR_COUNT, rng=None):
+        vertices, self.parts = build_sky(star_count, rng)
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.stats = (0, 0) # (draw calls, vertices) of the last draw
+
+    def draw(self, star_fraction=1.0):
+        # Camera-relative: the caller translates to the eye and disables depth test and fog.
+        # star_fraction draws just the first share of the (randomly placed) stars.
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, SKY_STRIDE, ctypes.c_void_p(0))
+        glColorPointer(4, GL_FLOAT, SKY_STRIDE, ctypes.c_void_p(12))
+        gl_state.point_size(2)
+        draws = vertices = 0
+        for primitive, first, count, additive in self.parts:
+            if primitive == GL_POINTS:
+                count = int(count * star_fraction)
+                if count == 0:
+                    continue
+            if additive:
+                gl_state.enable(GL_BLEND)
+                gl_state.blend_func(GL_SRC_ALPHA, GL_ONE)
+            glDrawArrays(primitive, first, count)
+            draws, vertices = draws + 1, vertices + count
+        gl_state.disable(GL_BLEND)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.stats = (draws, vertices)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.vbo])
+
+# --- Text ---
+ATLAS_WIDTH = 512
+ATLAS_CHARS = "".join(chr(c) for c in range(32, 127))
+TEXT_STRIDE = 32 # x, y, u, v, r, g, b, a as float32
+LAYOUT_CACHE_SIZE = 256
+
+FONT_CACHE_FILE = "font_cache.json"
+
+def load_font(name, size):
+    # Like pygame.font.SysFont, but the name -> file lookup is cached across runs:
+    # match_font scans every installed font (fc-list on Linux), which dominates startup
+    cache = {}
+    try:
+        if os.path.exists(FONT_CACHE_FILE):
+            with open(FONT_CACHE_FILE, 'r') as f:
+                cache = json.load(f)
+    except Exception as e:
+        print(f"Failed to load font cache: {e}")
+    path = cache.get(name, "")
+    if path == "" or (path is not None and not os.path.exists(path)):
+        path = pygame.font.match_font(name) # None falls back to pygame's bundled font
+        cache[name] = path
+        try:
+            with open(FONT_CACHE_FILE, 'w') as f:
+                json.dump(cache, f)
+        except Exception as e:
+            print(f"Failed to save font cache: {e}")
+    return pygame.font.Font(path, size)
+
+class TextRenderer:
+    # Each font's glyphs are rasterised once into a shared atlas texture and each string
+    # is laid out once into cached quads. draw() only queues; flush() sends everything
+    # queued this frame to the GPU as one vertex batch and one draw call. A font first
+    # used mid-frame rebuilds the atlas, so queued text is laid out again at flush time.
+    def __init__(self, fonts):
+        self.fonts = list(fonts)
+        self.glyphs = {}  # (font, char) -> (u0, v0, u1, v1, width, height, advance)
+        self.layouts = {} # (font, text) -> ((N*4, 4) float32 x, y, u, v quad corners, width)
+        self.queue = []
+        self.atlas = None # (RGBA bytes, width, height) waiting for upload
+        self.texture = None
+        self.vbo = None
+        self.build_atlas()
+
+    def build_atlas(self):
+        # Shelf-pack every glyph with a pixel of padding so linear filtering can't bleed
+        rendered = []
+        x = y = shelf = 0
+        for font in self.fonts:
+            for ch in ATLAS_CHARS:
+                surface = font.render(ch, True, (255, 255, 255))
+                w, h = surface.get_size()
+                if x + w + 1 > ATLAS_WIDTH:
+                    x, y, shelf = 0, y + shelf + 1, 0
+                metrics = font.metrics(ch)[0]
+                advance = metrics[4] if metrics else w
+                rendered.append((font, ch, surface, x, y, w, h, advance))
+                x += w + 1
+                shelf = max(shelf, h)
+        height = y + shelf
+        atlas = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA)
+        atlas.fill((255, 255, 255, 0)) # white, so blended glyph edges keep their colour
+        self.glyphs = {}
+        for font, ch, surface, x, y, w, h, advance in rendered:
+            atlas.blit(surface, (x, y))
+            self.glyphs[(font, ch)] = (x / ATLAS_WIDTH, y / height, (x + w) / ATLAS_WIDTH, (y + h) / height,
+                                       w, h, advance)
+        self.atlas = (pygame.image.tostring(atlas, "RGBA"), ATLAS_WIDTH, height)
+        self.layouts = {}
+
+    def add_font(self, font):
+        if font not in self.fonts:
+            self.fonts.append(font)
+            self.build_atlas()
+
+    def layout(self, text, font):
+        key = (font, text)
+        layout = self.layouts.get(key)
+        if layout is None:
+            self.add_font(font)
+            if len(self.layouts) >= LAYOUT_CACHE_SIZE:
+                self.layouts.clear()
+            quads = []
+            x = 0
+            for ch in text:
+                u0, v0, u1, v1, w, h, advance = self.glyphs.get((font, ch)) or self.glyphs[(font, "?")]
+                quads.append(((x, 0, u0, v0), (x + w, 0, u1, v0), (x + w, h, u1, v1), (x, h, u0, v1)))
+                x += advance
+            layout = (np.array(quads, dtype=np.float32).reshape(-1, 4), x)
+            self.layouts[key] = layout
+        return layout
+
+    def width(self, text, font):
+        return self.layout(text, font)[1]
+
+    def draw(self, text, x, y, color, font):
+        self.layout(text, font) # adds the font to the atlas now, not in the middle of flush
+        self.queue.append((text, font, x, y, color))
+
+    def flush(self):
+        if not self.queue:
+            return
+        if self.atlas is not None:
+            data, w, h = self.atlas
+            if self.texture is None:
+                self.texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, w, h, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
+            self.atlas = None
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+        # Layouts cached before the atlas last grew are gone, so these are always current
+        queue = [(self.layout(text, font)[0], x, y, color) for text, font, x, y, color in self.queue]
+        batch = np.empty((sum(len(quads) for quads, _, _, _ in queue), 8), dtype=np.float32)
+        start = 0
+        for quads, x, y, color in queue:
+            end = start + len(quads)
+            batch[start:end, :4] = quads
+            batch[start:end, 0] += x
+            batch[start:end, 1] += y
+            batch[start:end, 4:7] = np.clip(color, 0, 1)
+            batch[start:end, 7] = 1
+            start = end
+        self.queue = []
+
+        gl_state.enable(GL_BLEND)
+        gl_state.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        gl_state.enable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, batch.nbytes, batch, GL_STREAM_DRAW)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, TEXT_STRIDE, ctypes.c_void_p(0))
+        glTexCoordPointer(2, GL_FLOAT, TEXT_STRIDE, ctypes.c_void_p(8))
+        glColorPointer(4, GL_FLOAT, TEXT_STRIDE, ctypes.c_void_p(16))
+        glDrawArrays(GL_QUADS, 0, len(batch))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        gl_state.disable(GL_TEXTURE_2D)
+
+# --- Menu Background ---
+MENU_BLUR_STEPS = 3   # halvings of the frozen frame; drawn stretched back up, that's the blur
+MENU_IDLE_WAIT = 100  # ms the menu loop sleeps waiting for input between music updates
+
+class FrozenFrame:
+    # The 3D scene rendered once into an offscreen texture, so menus can show it behind
+    # their text as one quad instead of re-rendering the maze every frame. With blur on,
+    # the frame is box-filtered down by repeated half-size linear blits.
+    def __init__(self):
+        self.size = None
+        self.levels = [] # [(fbo, texture, width, height)], full size first
+        self.depth = None
+
+    def allocate(self, width, height, steps):
+        self.delete()
+        self.size = (width, height, steps)
+        for i in range(steps + 1):
+            w, h = max(1, width >> i), max(1, height >> i)
+            texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, w, h, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+            fbo = glGenFramebuffers(1)
+            glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+            glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, texture, 0)
+            if i == 0: # only the full-size level is rendered into
+                self.depth = glGenRenderbuffers(1)
+                glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+                glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, w, h)
+                glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+                glBindRenderbuffer(GL_RENDERBUFFER, 0)
+            self.levels.append((fbo, texture, w, h))
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def capture(self, width, height, render, blur=True):
+        # render() draws the scene into the current framebuffer at width x height
+        steps = MENU_BLUR_STEPS if blur else 0
+        # Read before allocate(), which binds the new framebuffers
+        previous = glGetIntegerv(GL_FRAMEBUFFER_BINDING) # not always 0, e.g. offscreen benchmarks
+        if self.size != (width, height, steps):
+            self.allocate(width, height, steps)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.levels[0][0])
+        render()
+        for (src, _, sw, sh), (dst, _, dw, dh) in zip(self.levels, self.levels[1:]):
+            glBindFramebuffer(GL_READ_FRAMEBUFFER, src)
+            glBindFramebuffer(GL_DRAW_FRAMEBUFFER, dst)
+            glBlitFramebuffer(0, 0, sw, sh, 0, 0, dw, dh, GL_COLOR_BUFFER_BIT, GL_LINEAR)
+        glBindFramebuffer(GL_FRAMEBUFFER, previous)
+
+    def draw(self, width, height):
+        # Fullscreen quad under the current 2D ortho projection (y down)
+        gl_state.disable(GL_BLEND)
+        gl_state.enable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.levels[-1][1])
+        glColor3f(1, 1, 1)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 1); glVertex2f(0, 0)
+        glTexCoord2f(1, 1); glVertex2f(width, 0)
+        glTexCoord2f(1, 0); glVertex2f(width, height)
+        glTexCoord2f(0, 0); glVertex2f(0, height)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        gl_state.disable(GL_TEXTURE_2D)
+
+    def delete(self):
+        for fbo, texture, _, _ in self.levels:
+            glDeleteFramebuffers(1, [fbo])
+            glDeleteTextures([texture])
+        if self.depth is not None:
+            glDeleteRenderbuffers(1, [self.depth])
+        self.levels, self.depth, self.size = [], None, None
+
+# --- Minimap ---
+MINIMAP_SIZE = 200
+MINIMAP_PADDING = 20
+MINIMAP_COLORS = np.array([(0, 0, 0, 204), (77, 77, 77, 255)], dtype=np.uint8) # floor (80% black over the scene), wall
+MINIMAP_EXIT_COLOR = (0, 255, 255, 255)
+MINIMAP_HIDDEN_COLOR = (20, 20, 35, 255) # not explored yet (fog of war)
+MINIMAP_HINT_COLOR = (1.0, 0.8, 0.0)
+
+class Minimap:
+    # One texel per maze cell, built from the grid once per level. Visited cells are kept
+    # in a bitset; with fog on, only explored texels are shown and each newly explored
+    # patch goes up with glTexSubImage2D.
+    def __init__(self, maze, fog=False, show_exit=True):
+        h, w = maze.shape
+        self.colors = MINIMAP_COLORS[maze]
+        if show_exit:
+            self.colors[h - 2, w - 1] = MINIMAP_EXIT_COLOR
+        self.explored = np.zeros((h, (w + 7) // 8), dtype=np.uint8) # bit x & 7 of byte x >> 3
+        self.fog = fog
+        self.cell = None # last cell passed to explore()
+        self.texture = None
+
+    def texels(self, z0, z1, x0, x1):
+        block = self.colors[z0:z1, x0:x1]
+        if self.fog:
+            seen = np.unpackbits(self.explored[z0:z1], axis=1, bitorder="little")[:, x0:x1]
+            block = np.where(seen[:, :, None] == 1, block, np.array(MINIMAP_HIDDEN_COLOR, dtype=np.uint8))
+        return np.ascontiguousarray(block)
+
+    def explore(self, x, z, radius=1):
+        # Mark the cells around (x, z) as explored, updating the texture if it exists
+        if (x, z) == self.cell:
+            return
+        self.cell = (x, z)
+        h, w = self.colors.shape[:2]
+        z0, z1 = max(z - radius, 0), min(z + radius + 1, h)
+        x0, x1 = max(x - radius, 0), min(x + radius + 1, w)
+        changed = False
+        for cz in range(z0, z1):
+            for cx in range(x0, x1):
+                bit = 1 << (cx & 7)
+                if not self.explored[cz, cx >> 3] & bit:
+                    self.explored[cz, cx >> 3] |= bit
+                    changed = True
+        if changed and self.fog and self.texture is not None and z0 < z1 and x0 < x1:
+            glBindTexture(GL_TEXTURE_2D, self.texture)
+            glTexSubImage2D(GL_TEXTURE_2D, 0, x0, z0, x1 - x0, z1 - z0, GL_RGBA, GL_UNSIGNED_BYTE,
+                            self.texels(z0, z1, x0, x1))
+            glBindTexture(GL_TEXTURE_2D, 0)
+
+    def draw(self, mx, my, size, player_x, player_z, hint=None):
+        # Screen-space, under an ortho projection: one textured quad, the hint path
+        # ((N, 2) cells, if given) and the player dot
+        h, w = self.colors.shape[:2]
+        if self.texture is None:
+            self.texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, w, h, 0, GL_RGBA, GL_UNSIGNED_BYTE, self.texels(0, h, 0, w))
+        gl_state.enable(GL_BLEND) # floor texels are translucent
+        gl_state.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        gl_state.enable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glColor3f(1, 1, 1)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0); glVertex2f(mx, my)
+        glTexCoord2f(1, 0); glVertex2f(mx + size, my)
+        glTexCoord2f(1, 1); glVertex2f(mx + size, my + size)
+        glTexCoord2f(0, 1); glVertex2f(mx, my + size)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        gl_state.disable(GL_TEXTURE_2D)
+
+        if hint is not None and len(hint) > 1:
+            glColor3f(*MINIMAP_HINT_COLOR)
+            gl_state.line_width(2)
+            glBegin(GL_LINE_STRIP)
+            for x, z in hint:
+                glVertex2f(mx + (x + 0.5) * size / w, my + (z + 0.5) * size / h)
+            glEnd()
+
+        # Player dot, at the centre of the cell it stands in
+        glColor3f(1, 0, 0)
+        gl_state.point_size(5)
+        glBegin(GL_POINTS)
+        glVertex2f(mx + (player_x + 0.5) * size / w, my + (player_z + 0.5) * size / h)
+        glEnd()
+
+    def delete(self):
+        if self.texture is not None:
+            glDeleteTextures([self.texture])
+
+# --- Music ---
+# The library is scanned and probed on a worker thread, with the results cached in an
+# index keyed by each file's mtime and size. Track files are read into memory on the
+# worker too; the main thread only hands the bytes to the mixer, and the next track is
+# queued as soon as the current one starts so SDL_mixer switches to it without a gap.
+MUSIC_DIR = "music"
+MUSIC_EXTENSIONS = (".mp3", ".ogg", ".wav")
+MUSIC_INDEX_FILE = "music_index.json"
+MUSIC_END_EVENT = USEREVENT
+# MPEG audio frame header tables: bitrate (kbit/s) by [version is 1][layer][index],
+# sample rate by version, samples per frame by [version is 1][layer]
+_MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_MP3_SAMPLES = {(True, 1): 384, (True, 2): 1152, (True, 3): 1152,
+                (False, 1): 384, (False, 2): 1152, (False, 3): 576}
+
+def _mp3_duration(f, size):
+    head = f.read(65536)
+    start = 0
+    if head[:3] == b"ID3": # skip the ID3v2 tag, its size is stored 7 bits per byte
+        start = 10 + (head[6] << 21 | head[7] << 14 | head[8] << 7 | head[9])
+        f.seek(start)
+        head = f.read(65536)
+        if len(head) < 4:
+            return None
+    for i in range(len(head) - 4):
+        if head[i] != 0xFF or head[i + 1] & 0xE0 != 0xE0:
+            continue
+        version, layer = head[i + 1] >> 3 & 3, 4 - (head[i + 1] >> 1 & 3)
+        bitrate, rate = head[i + 2] >> 4, head[i + 2] >> 2 & 3
+        if version == 1 or layer == 4 or bitrate in (0, 15) or rate == 3:
+            continue
+        v1 = version == 3
+        rate = _MP3_RATES[version][rate]
+        # A Xing/Info (VBR) header in the first frame gives the exact frame count
+        for tag in (b"Xing", b"Info"):
+            x = head.find(tag, i, i + 64)
+            if x >= 0 and head[x + 7] & 1:
+                frames = int.from_bytes(head[x + 8:x + 12], "big")
+                return frames * _MP3_SAMPLES[(v1, layer)] / rate
+        # Otherwise assume constant bitrate
+        return (size - start - i) * 8 / (_MP3_BITRATES[(v1, layer)][bitrate] * 1000)
+    return None
+
+def _wav_duration(f, size):
+    # Data chunk size over the fmt chunk's byte rate; works for compressed formats too
+    head = f.read(65536)
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    i, byte_rate = 12, None
+    while i + 8 <= len(head):
+        chunk, length = head[i:i + 4], int.from_bytes(head[i + 4:i + 8], "little")
+        if chunk == b"fmt ":
+            byte_rate = int.from_bytes(head[i + 16:i + 20], "little")
+        elif chunk == b"data" and byte_rate:
+            return min(length, size - i - 8) / byte_rate
+        i += 8 + length + (length & 1)
+    return None
+
+def _ogg_duration(f, size):
+    head = f.read(4096)
+    if head.find(b"\x01vorbis") >= 0:
+        i = head.find(b"\x01vorbis")
+        rate = int.from_bytes(head[i + 12:i + 16], "little")
+    elif head.find(b"OpusHead") >= 0:
+        rate = 48000 # granule positions always count 48 kHz samples
+    else:
+        return None
+    # The last page's granule position is the total sample count
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    i = tail.rfind(b"OggS")
+    if i < 0 or rate == 0:
+        return None
+    return int.from_bytes(tail[i + 6:i + 14], "little") / rate
+
+def probe_track(path):
+    # Title, artist and duration in seconds (None where unknown). The duration is read
+    # from the mp3/ogg/wav headers; tags come from mutagen, if it is installed.
+    info = {"title": os.path.splitext(os.path.basename(path))[0], "artist": None, "duration": None}
+    try:
+        probe = {".mp3": _mp3_duration, ".ogg": _ogg_duration, ".wav": _wav_duration}
+        with open(path, "rb") as f:
+            info["duration"] = probe[os.path.splitext(path)[1].lower()](f, os.path.getsize(path))
+    except Exception as e:
+        print(f"Failed to probe {path}: {e}")
+    try:
+        import mutagen
+        audio = mutagen.File(path, easy=True)
+        if audio is not None:
+            info["title"] = (audio.get("title") or [info["title"]])[0]
+            info["artist"] = (audio.get("artist") or [None])[0]
+            if info["duration"] is None:
+                info["duration"] = audio.info.length
+    except ImportError:
+        pass
+    except Exception as e:
+        print(f"Failed to read tags of {path}: {e}")
+    return info
+
+def scan_music(directory=MUSIC_DIR, index_file=MUSIC_INDEX_FILE):
+    # [track dict] for the audio files in `directory`. Files whose mtime and size match
+    # the index aren't probed again; the index is rewritten only if something changed.
+    index = {}
+    try:
+        if os.path.exists(index_file):
+            with open(index_file, "r") as f:
+                index = json.load(f)
+    except Exception as e:
+        print(f"Failed to load music index: {e}")
+    tracks, changed = [], False
+    if os.path.isdir(directory):
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if not entry.name.lower().endswith(MUSIC_EXTENSIONS) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            track = index.get(entry.path)
+            if track is None or track["mtime"] != stat.st_mtime or track["size"] != stat.st_size:
+                track = {"path": entry.path, "mtime": stat.st_mtime, "size": stat.st_size, **probe_track(entry.path)}
+                changed = True
+            tracks.append(track)
+    if changed or len(tracks) != len(index):
+        try:
+            with open(index_file, "w") as f:
+                json.dump({t["path"]: t for t in tracks}, f)
+        except Exception as e:
+            print(f"Failed to save music index: {e}")
+    return tracks
+
+def _read_track(track):
+    try:
+        with open(track["path"], "rb") as f:
+            return track, f.read()
+    except Exception as e:
+        return track, e # raised again on the main thread, see MusicPlayer.update
+
+class MusicPlayer:
+    # Random playback over the library. Call update() once per frame and track_ended()
+    # on MUSIC_END_EVENT; neither ever touches the disk.
+    def __init__(self, volume):
+        self.volume = volume
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.scan = None    # Future[[track]]
+        self.tracks = []
+        self.current = None # track playing
+        self.queued = None  # track queued behind it
+        self.pending = None # Future[(track, bytes)] being read for the next play/queue
+        self.buffers = []   # BytesIO objects the mixer is reading from
+
+    def start(self):
+        # The audio device and the end event are set up here, on the main thread: SDL's
+        # audio and event setup isn't safe off it. Only the library scan goes to the worker.
+        try:
+            pygame.mixer.init()
+            pygame.mixer.music.set_endevent(MUSIC_END_EVENT)
+        except pygame.error as e:
+            # No audio device: no music, but not for lack of files
+            print(f"Audio init error: {e}")
+            return
+        self.scan = self.worker.submit(scan_music)
+
+    def prefetch(self):
+        # Read a random track other than the current one, unless it is the only one
+        choices = [t for t in self.tracks if t is not self.current] or self.tracks
+        self.pending = self.worker.submit(_read_track, random.choice(choices))
+
+    def update(self):
+        if self.scan is not None and self.scan.done():
+            scan, self.scan = self.scan, None
+            try:
+                self.tracks = scan.result()
+            except Exception as e:
+                print(f"Music scan error: {e}")
+            else:
+                if self.tracks:
+                    print(f"Music: {len(self.tracks)} tracks")
+                    self.prefetch()
+                else:
+                    print(f"No music files found in '{MUSIC_DIR}' folder.")
+        if self.pending is None or not self.pending.done():
+            return
+        track, data = self.pending.result()
+        self.pending = None
+        try:
+            if isinstance(data, Exception):
+                raise data
+            hint = os.path.splitext(track["path"])[1][1:] # tells SDL_mixer the format
+            if self.current is None:
+                self.buffers = [io.BytesIO(data)]
+                pygame.mixer.music.load(self.buffers[0], hint)
+                pygame.mixer.music.set_volume(self.volume)
+                pygame.mixer.music.play(0)
+                self.current = track
+                print(f"Playing: {track_label(track)}")
+                self.prefetch()
+            else:
+                self.buffers = self.buffers[-1:] + [io.BytesIO(data)]
+                pygame.mixer.music.queue(self.buffers[-1], hint)
+                self.queued = track
+        except Exception as e:
+            # Unplayable file: leave it out from now on and try another one
+            print(f"Error playing {track['path']}: {e}")
+            self.tracks = [t for t in self.tracks if t is not track]
+            if self.tracks:
+                self.prefetch()
+
+    def track_ended(self):
+        # SDL_mixer has already started the queued track, if there was one
+        self.current, self.queued = self.queued, None
+        if self.current is not None:
+            print(f"Playing: {track_label(self.current)}")
+        if self.pending is None and self.tracks:
+            self.prefetch()
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if pygame.mixer.get_init():
+            pygame.mixer.music.set_volume(volume)
+
+def track_label(track):
+    label = track["title"] if not track["artist"] else f"{track['artist']} - {track['title']}"
+    if track["duration"]:
+        minutes, seconds = divmod(int(track["duration"]), 60)
+        label += f" ({minutes}:{seconds:02d})"
+    return label
+
+# --- Profiling ---
+PROFILE_WINDOW = 240     # frames the HUD percentiles cover
+PROFILE_HUD_REFRESH = 15 # frames between HUD text updates
+PROFILE_GPU_LAG = 8      # frames before waiting on a GPU timer query instead of polling
+
+class _NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+class _Scope:
+    __slots__ = ("profiler", "name", "start", "query")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.gpu:
+            self.query = self.profiler.timestamp()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record = self.profiler.record
+        record["cpu"][self.name] = record["cpu"].get(self.name, 0.0) + time.perf_counter() - self.start
+        if self.profiler.gpu:
+            record["queries"].append((self.name, self.query, self.profiler.timestamp()))
+        return False
+
+class Profiler:
+    # Named per-frame timing scopes: `with profiler.scope("sky"): ...`, then end_frame()
+    # once per presented frame. While enabled, every gl* call made from this module is
+    # counted, GL_TIMESTAMP queries optionally time the GPU side of each scope, and frames
+    # are appended to a CSV (or, for a .json path, JSON) trace. Disabled, scope() hands
+    # back a shared no-op and nothing else runs. gl_budget: GL calls a frame may make
+    # before it is reported (and counted in budget_overruns).
+    def __init__(self, gpu=False, trace_path=None, gl_budget=None):
+        self.enabled = False
+        self.want_gpu = gpu
+        self.gpu = False
+        self.trace_path = trace_path
+        self.trace = None
+        self.json_frames = []
+        self.history = {} # scope -> deque of ms, per frame the scope ran in
+        self.pending = deque() # frame records waiting for GPU results
+        self.hud_lines = []
+        self.frame_index = 0
+        self.gl_originals = {}
+        self.gl_calls = 0
+        self.draw_calls = 0
+        self.gl_budget = gl_budget
+        self.budget_overruns = 0
+        self.free_queries = []
+        if trace_path:
+            atexit.register(self.close)
+        self.new_record()
+
+    def scope(self, name):
+        return _Scope(self, name) if self.enabled else _NULL_SCOPE
+
+    def new_record(self):
+        self.record = {"frame": self.frame_index, "cpu": {}, "gpu": {}, "queries": []}
+        self.frame_start = time.perf_counter()
+
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.install_gl_counter()
+            gl_state.skipped = 0
+            self.gpu = self.want_gpu and bool(self.gl("glQueryCounter"))
+            if self.trace_path and self.trace is None and not self.trace_path.endswith(".json"):
+                self.trace = open(self.trace_path, "w", newline="")
+                self.trace_writer = csv.writer(self.trace)
+                self.trace_writer.writerow(["frame", "scope", "cpu_ms", "gpu_ms", "gl_calls", "draw_calls",
+                                            "skipped_calls"])
+        else:
+            self.uninstall_gl_counter()
+            self.gpu = False
+        self.new_record()
+
+    def install_gl_counter(self):
+        namespace = globals()
+        for name, fn in list(namespace.items()):
+            if name.startswith("gl") and callable(fn):
+                self.gl_originals[name] = fn
+                namespace[name] = self.counted(name, fn)
+
+    def uninstall_gl_counter(self):
+        globals().update(self.gl_originals)
+        self.gl_originals = {}
+
+    def counted(self, name, fn):
+        draw = name.startswith(("glDraw", "glBegin", "glCallList"))
+        def call(*args, **kwargs):
+            self.gl_calls += 1
+            if draw:
+                self.draw_calls += 1
+            return fn(*args, **kwargs)
+        return call
+
+    def gl(self, name):
+        # The real GL function, bypassing the call counter
+        return self.gl_originals.get(name) or globals()[name]
+
+    def timestamp(self):
+        query = self.free_queries.pop() if self.free_queries else int(self.gl("glGenQueries")(1)[0])
+        self.gl("glQueryCounter")(query, GL_TIMESTAMP)
+        return query
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        record = self.record
+        record["cpu"]["frame"] = time.perf_counter() - self.frame_start
+        record["gl_calls"], record["draw_calls"] = self.gl_calls, self.draw_calls
+        record["skipped_calls"] = gl_state.skipped
+        if self.gl_budget is not None and self.gl_calls > self.gl_budget:
+            if self.budget_overruns % PROFILE_WINDOW == 0:
+                print(f"Frame {self.frame_index}: {self.gl_calls} GL calls, over the budget of {self.gl_budget} "
+                      f"({self.budget_overruns + 1} frames over so far)")
+            self.budget_overruns += 1
+        self.gl_calls = self.draw_calls = gl_state.skipped = 0
+        self.pending.append(record)
+        self.frame_index += 1
+        self.new_record()
+        # Records leave in order once their GPU timestamps are in (or right away without)
+        while self.pending and self.resolve(self.pending[0], self.frame_index - self.pending[0]["frame"] > PROFILE_GPU_LAG):
+            self.finish(self.pending.popleft())
+
+    def resolve(self, record, wait):
+        available, get = self.gl("glGetQueryObjectiv"), self.gl("glGetQueryObjectui64v")
+        for name, start, end in record["queries"]:
+            if not wait and not available(end, GL_QUERY_RESULT_AVAILABLE):
+                return False
+        t0, t1 = ctypes.c_uint64(), ctypes.c_uint64() # nanoseconds
+        for name, start, end in record["queries"]:
+            get(start, GL_QUERY_RESULT, ctypes.byref(t0))
+            get(end, GL_QUERY_RESULT, ctypes.byref(t1))
+            record["gpu"][name] = record["gpu"].get(name, 0.0) + (t1.value - t0.value) * 1e-9
+            self.free_queries += [start, end]
+        record["queries"] = []
+        return True
+
+    def finish(self, record):
+        for name, seconds in record["cpu"].items():
+            self.history.setdefault(name, deque(maxlen=PROFILE_WINDOW)).append(seconds * 1000.0)
+        for name, seconds in record["gpu"].items():
+            self.history.setdefault("gpu " + name, deque(maxlen=PROFILE_WINDOW)).append(seconds * 1000.0)
+        self.history.setdefault("gl calls", deque(maxlen=PROFILE_WINDOW)).append(record["gl_calls"])
+        self.history.setdefault("draw calls", deque(maxlen=PROFILE_WINDOW)).append(record["draw_calls"])
+        self.history.setdefault("skipped calls", deque(maxlen=PROFILE_WINDOW)).append(record["skipped_calls"])
+        if self.trace is not None:
+            for name, seconds in record["cpu"].items():
+                gpu = record["gpu"].get(name)
+                counts = (record["gl_calls"], record["draw_calls"], record["skipped_calls"]) if name == "frame" \
+                    else ("", "", "")
+                self.trace_writer.writerow([record["frame"], name, f"{seconds * 1000.0:.4f}",
+                                            "" if gpu is None else f"{gpu * 1000.0:.4f}", *counts])
+        elif self.trace_path:
+            self.json_frames.append({
+                "frame": record["frame"], "gl_calls": record["gl_calls"], "draw_calls": record["draw_calls"],
+                "skipped_calls": record["skipped_calls"],
+                "cpu_ms": {k: v * 1000.0 for k, v in record["cpu"].items()},
+                "gpu_ms": {k: v * 1000.0 for k, v in record["gpu"].items()}})
+        if record["frame"] % PROFILE_HUD_REFRESH == 0:
+            self.hud_lines = None # rebuilt on the next hud() call
+
+    def hud(self):
+        # Rows of (scope, p50, p95, p99) over the last PROFILE_WINDOW frames: per-frame GL
+        # call counts first, then scope times in ms, slowest first
+        if self.hud_lines is None:
+            self.hud_lines = []
+            rows = sorted(self.history.items(), key=lambda kv: (not kv[0].endswith("calls"), -np.median(kv[1])))
+            for name, values in rows:
+                fmt = "{:.0f}" if name.endswith("calls") else "{:.2f}"
+                self.hud_lines.append([name] + [fmt.format(p) for p in np.percentile(values, (50, 95, 99))])
+        return self.hud_lines
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+        elif self.trace_path and self.trace_path.endswith(".json") and self.json_frames:
+            with open(self.trace_path, "w") as f:
+                json.dump({"frames": self.json_frames}, f)
+            self.json_frames = []
+
+class StartupTimer:
+    # Wall time of each startup phase up to the first presented frame
+    def __init__(self, start=None):
+        self.start = self.last = start if start is not None else time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    @property
+    def total(self):
+        return self.last - self.start
+
+    def report(self):
+        print(f"{'phase':<14} {'ms':>8} {'total ms':>9}")
+        elapsed = 0.0
+        for name, seconds in self.phases:
+            elapsed += seconds
+            print(f"{name:<14} {seconds * 1000:>8.1f} {elapsed * 1000:>9.1f}")
+
+# --- Recording ---
+# A recording holds everything the simulation reads from the player, one record per
+# GAME frame: the clock.tick milliseconds, the mouse.get_rel deltas, the held keys and
+# the key presses that act on the game. Menus aren't recorded; leaving them writes a
+# RESUME record with what they can change. Levels come from the session seed, so
+# replaying the records into a Game with that seed steps exactly the same ticks, and a
+# long session can be re-run (headless too) to compare frame times between builds.
+RECORD_MAGIC = b"LAZEREC\0"
+RECORD_VERSION = 1
+_RECORD_HEADER = struct.Struct("<8sIQI") # magic, version, seed, SIM_RATE
+RECORD_FRAME, RECORD_RESUME, RECORD_END = 0, 1, 2
+# Each record is a kind byte and then one of these
+_RECORD_BODIES = {
+    RECORD_FRAME: struct.Struct("<BHhhH"), # key presses, frame ms, mouse dx, dy, held keys
+    RECORD_RESUME: struct.Struct("<Bd"),   # endless mode, mouse sensitivity
+    RECORD_END: struct.Struct("<Iddd"),    # level number and camera position, to check a replay
+}
+# Held keys, one bit each, and the key presses that act on the game
+RECORDED_KEYS = (K_w, K_a, K_s, K_d, K_LSHIFT, K_RSHIFT, K_TAB)
+EVENT_JUMP, EVENT_PAUSE, EVENT_HINT, EVENT_CULL_STATS, EVENT_PROFILER = 1, 2, 4, 8, 16
+EVENT_KEYS = {K_SPACE: EVENT_JUMP, K_ESCAPE: EVENT_PAUSE, K_h: EVENT_HINT,
+              K_F3: EVENT_CULL_STATS, K_F2: EVENT_PROFILER}
+
+def key_bits(keys):
+    return sum(1 << i for i, key in enumerate(RECORDED_KEYS) if keys[key])
+
+class RecordedKeys:
+    # Stands in for pygame.key.get_pressed() in a replay
+    def __init__(self, bits):
+        self.bits = bits
+
+    def __getitem__(self, key):
+        return key in RECORDED_KEYS and bool(self.bits >> RECORDED_KEYS.index(key) & 1)
+
+class Recorder:
+    def __init__(self, path, seed):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(_RECORD_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, seed, SIM_RATE))
+        self.frames = 0
+
+    def write(self, kind, *values):
+        self.file.write(bytes((kind,)) + _RECORD_BODIES[kind].pack(*values))
+
+    def frame(self, events, frame_ms, mx, my, keys):
+        mx, my = max(-32768, min(32767, mx)), max(-32768, min(32767, my))
+        self.write(RECORD_FRAME, events, min(frame_ms, 65535), mx, my, key_bits(keys))
+        self.frames += 1
+
+    def close(self, level_number, camera_pos):
+        self.write(RECORD_END, level_number, *camera_pos)
+        self.file.close()
+        print(f"Recorded {self.frames} frames to {self.path}")
+
+def read_recording(path):
+    # -> (header dict, [(kind, values)]); a log cut short by a crash replays up to the cut
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, seed, sim_rate = _RECORD_HEADER.unpack_from(data)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError(f"{path} is not a recording this version can replay")
+    records = []
+    pos = _RECORD_HEADER.size
+    while pos < len(data):
+        body = _RECORD_BODIES[data[pos]]
+        if pos + 1 + body.size > len(data):
+            break
+        records.append((data[pos], body.unpack_from(data, pos + 1)))
+        pos += 1 + body.size
+    return {"seed": seed, "sim_rate": sim_rate}, records
+
+# --- Visibility ---
+NEAR_PLANE = 0.1
+FAR_PLANE = 150.0
+
+def perspective_matrix(fov, aspect, near, far):
+    # Same matrix as gluPerspective
+    f = 1.0 / math.tan(math.radians(fov) / 2.0)
+    return np.array([[f / aspect, 0, 0, 0],
+                     [0, f, 0, 0],
+                     [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                     [0, 0, -1, 0]], dtype=np.float64)
+
+def view_matrix(camera_pos, camera_rot):
+    # Same transform as render_scene: pitch about x, yaw about y, then move to the camera
+    cp, sp = math.cos(math.radians(camera_rot[1])), math.sin(math.radians(camera_rot[1]))
+    cy, sy = math.cos(math.radians(camera_rot[0])), math.sin(math.radians(camera_rot[0]))
+    pitch = np.array([[1, 0, 0, 0], [0, cp, -sp, 0], [0, sp, cp, 0], [0, 0, 0, 1]])
+    yaw = np.array([[cy, 0, sy, 0], [0, 1, 0, 0], [-sy, 0, cy, 0], [0, 0, 0, 1]])
+    translate = np.identity(4)
+    translate[:3, 3] = [-camera_pos[0], -camera_pos[1], -camera_pos[2]]
+    return pitch @ yaw @ translate
+
+def frustum_planes(clip):
+    # Gribb/Hartmann: the six planes (a, b, c, d) of a clip matrix, normals pointing inwards
+    planes = np.array([clip[3] + clip[0], clip[3] - clip[0], clip[3] + clip[1],
+                       clip[3] - clip[1], clip[3] + clip[2], clip[3] - clip[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+def boxes_in_frustum(planes, bounds):
+    # bounds (K, 2, 3) min/max corners -> bool mask of boxes at least partly inside
+    if len(bounds) == 0:
+        return np.zeros(0, dtype=bool)
+    normals, d = planes[:, :3], planes[:, 3]
+    # Corner of each box furthest along each plane normal
+    far_corner = np.where(normals[None, :, :] > 0, bounds[:, None, 1, :], bounds[:, None, 0, :])
+    return ((far_corner * normals[None]).sum(axis=2) + d[None] >= 0).all(axis=1)
+
+# Maze walls hide almost everything, so on top of the frustum test the camera casts rays
+# across the grid and only chunks a ray reaches (or passes next to) are drawn
+RAYS_PER_DEGREE = 2
+CONE_MARGIN = 1.0 # degrees added on each side of the view cone
+
+def view_cone(fov, aspect, camera_rot):
+    # Horizontal (yaw) range the frustum covers, as angles in the movement convention
+    # forward = (sin a, -cos a); None when it wraps all the way around (looking down)
+    cp, sp = math.cos(math.radians(camera_rot[1])), math.sin(math.radians(camera_rot[1]))
+    ty = math.tan(math.radians(fov) / 2)
+    tx = ty * aspect
+    yaw = math.radians(camera_rot[0])
+    angles = []
+    for sx, sy in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+        # Undo the pitch, then read off the heading relative to the yaw
+        x, y, z = sx * tx, sy * ty, -1.0
+        z = -sy * ty * sp + z * cp
+        angle = math.atan2(x, -z)
+        if abs(angle) >= math.pi / 2:
+            return None
+        angles.append(angle)
+    margin = math.radians(CONE_MARGIN)
+    return yaw + min(angles) - margin, yaw + max(angles) + margin
+
+def cast_rays(solid, x, z, angles, max_dist):
+    # 2D DDA through the padded solid grid (cell k of the maze is index k + 1 and spans
+    # world [k - 0.5, k + 0.5)). Returns the flat indices of every cell a ray enters,
+    # including the solid cell where it stops.
+    h, w = solid.shape
+    flat_solid = solid.ravel()
+    px, pz = x + 1.5, z + 1.5
+    dx, dz = np.sin(angles), -np.cos(angles)
+    cx = np.full(len(angles), int(math.floor(px)), dtype=np.int64)
+    cz = np.full(len(angles), int(math.floor(pz)), dtype=np.int64)
+    step_x = np.where(dx > 0, 1, -1)
+    step_z = np.where(dz > 0, 1, -1)
+    with np.errstate(divide="ignore"):
+        delta_x = np.abs(1.0 / dx)
+        delta_z = np.abs(1.0 / dz)
+    # Ray distance to the first x / z cell boundary
+    t_x = np.where(dx == 0, np.inf, np.where(dx > 0, cx + 1 - px, px - cx) * delta_x)
+    t_z = np.where(dz == 0, np.inf, np.where(dz > 0, cz + 1 - pz, pz - cz) * delta_z)
+    seen = []
+    while len(cx):
+        flat = cz * w + cx
+        seen.append(flat)
+        go_x = t_x < t_z
+        t = np.where(go_x, t_x, t_z)
+        keep = ~flat_solid[flat] & (t <= max_dist)
+        cx, cz, t_x, t_z, go_x = cx[keep], cz[keep], t_x[keep], t_z[keep], go_x[keep]
+        step_x, step_z, delta_x, delta_z = step_x[keep], step_z[keep], delta_x[keep], delta_z[keep]
+        cx = cx + np.where(go_x, step_x, 0)
+        cz = cz + np.where(go_x, 0, step_z)
+        t_x = t_x + np.where(go_x, delta_x, 0)
+        t_z = t_z + np.where(go_x, 0, delta_z)
+        inside = (cx >= 0) & (cx < w) & (cz >= 0) & (cz < h)
+        if not inside.all():
+            cx, cz, t_x, t_z = cx[inside], cz[inside], t_x[inside], t_z[inside]
+            step_x, step_z, delta_x, delta_z = step_x[inside], step_z[inside], delta_x[inside], delta_z[inside]
+    return np.unique(np.concatenate(seen))
+
+def chunks_seen(cells, shape, chunk_index, chunk=CHUNK_SIZE):
+    # Chunks holding a seen cell or one of its neighbours, so walls a ray only grazes
+    # between two samples still count. chunk_index maps chunk (row, col) -> chunk or -1.
+    h, w = shape
+    rows, cols = cells // w, cells % w
+    count = int(chunk_index.max()) + 1
+    mask = np.zeros(count + 1, dtype=bool) # -1 lands in the spare last slot
+    for oz in (-1, 0, 1):
+        for ox in (-1, 0, 1):
+            r = np.clip(rows + oz, 0, h - 1) // chunk
+            c = np.clip(cols + ox, 0, w - 1) // chunk
+            mask[chunk_index[r, c]] = True
+    return mask[:count]
+
+# --- Quality Governor ---
+# When frames run over budget the governor steps down a ladder of quality levels, and
+# back up once there is headroom again. Each level sets the fraction of the window the
+# 3D scene is rendered at (upscaled with a linear blit), the far plane with a fog dense
+# enough to hide it, the share of the stars drawn and whether walls get their neon edges.
+FOG_DENSITY = 0.05
+QUALITY_LEVELS = [
+    # render scale, far plane, star fraction, edges
+    (1.0, 150.0, 1.0, True),
+    (1.0, 100.0, 1.0, True),
+    (0.85, 100.0, 0.5, True),
+    (0.7, 70.0, 0.5, True),
+    (0.6, 50.0, 0.25, False),
+    (0.5, 40.0, 0.0, False),
+]
+QUALITY_WINDOW = 45      # frames judged together; cleared after every change
+QUALITY_OVER = 1.05      # step down when the window's p90 is over this share of the budget
+QUALITY_UNDER = 0.6      # step up when it is under this share...
+QUALITY_CALM_WINDOWS = 3 # ...for this many windows in a row, doubled after each step back down
+
+def fog_density(far):
+    # Dense enough that walls are down to 5% of their colour by the far plane
+    return max(FOG_DENSITY, 3.0 / far)
+
+class QualityGovernor:
+    def __init__(self, budget_ms, level=0, adaptive=True):
+        self.budget_ms = budget_ms
+        self.level = level
+        self.adaptive = adaptive
+        self.window = []
+        self.calm = 0 # calm windows in a row
+        self.calm_needed = QUALITY_CALM_WINDOWS
+        self.last_change = None # "up" / "down"
+        self.decisions = [] # (frame, old level, new level, p90 ms), for tuning
+        self.frames = 0
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def update(self, frame_ms):
+        # Feed the CPU time of one frame (without the fps cap's sleep); True if the level changed
+        self.frames += 1
+        if not self.adaptive:
+            return False
+        self.window.append(frame_ms)
+        if len(self.window) < QUALITY_WINDOW:
+            return False
+        p90 = float(np.percentile(self.window, 90))
+        self.window = []
+        if p90 > self.budget_ms * QUALITY_OVER and self.level < len(QUALITY_LEVELS) - 1:
+            if self.last_change == "up":
+                self.calm_needed *= 2 # it didn't hold; wait longer before trying again
+            return self.set_level(self.level + 1, p90, "down")
+        if p90 < self.budget_ms * QUALITY_UNDER and self.level > 0:
+            self.calm += 1
+            if self.calm >= self.calm_needed:
+                return self.set_level(self.level - 1, p90, "up")
+        else:
+            self.calm = 0
+        return False
+
+    def set_level(self, level, p90, direction):
+        scale, far, stars, edges = QUALITY_LEVELS[level]
+        print(f"Quality {self.level} -> {level} at frame {self.frames} (p90 {p90:.1f} ms, budget {self.budget_ms:.1f} ms): "
+              f"scale {scale:.2f}, far {far:.0f}, stars {stars:.0%}, edges {'on' if edges else 'off'}")
+        self.decisions.append((self.frames, self.level, level, p90))
+        self.level = level
+        self.calm = 0
+        self.last_change = direction
+        return True
+
+class SceneTarget:
+    # Offscreen colour + depth target the 3D scene is drawn into below full resolution,
+    # then stretched over the framebuffer that was bound before
     def __init__(self):
-        pygame.init()
+        self.size = None
+        self.fbo = None
+        self.buffers = None
+        self.previous = 0
+
+    def begin(self, width, height):
+        self.previous = glGetIntegerv(GL_FRAMEBUFFER_BINDING) # not always 0, see FrozenFrame
+        if self.size != (width, height):
+            self.delete()
+            self.size = (width, height)
+            self.fbo = glGenFramebuffers(1)
+            self.buffers = glGenRenderbuffers(2)
+            glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+            for rb, fmt, attachment in ((self.buffers[0], GL_RGBA8, GL_COLOR_ATTACHMENT0),
+                                        (self.buffers[1], GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)):
+                glBindRenderbuffer(GL_RENDERBUFFER, rb)
+                glRenderbufferStorage(GL_RENDERBUFFER, fmt, width, height)
+                glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, rb)
+            glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+
+    def end(self, width, height):
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.previous)
+        glBlitFramebuffer(0, 0, self.size[0], self.size[1], 0, 0, width, height, GL_COLOR_BUFFER_BIT, GL_LINEAR)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.previous)
+
+    def delete(self):
+        if self.fbo is not None:
+            glDeleteFramebuffers(1, [self.fbo])
+            glDeleteRenderbuffers(2, self.buffers)
+        self.size, self.fbo, self.buffers = None, None, None
+
+# --- Endless Mode ---
+# An unbounded maze made of CHUNK_SIZE x CHUNK_SIZE chunks, each generated from
+# (seed, cx, cz) alone. Rooms sit on odd world coordinates everywhere; a chunk carves its
+# own rooms as a perfect maze and owns the border row and column on its north and west
+# side, with ENDLESS_DOORS openings in each. Its south and east borders belong to the
+# neighbours, so every border is decided once and both sides agree. Each chunk is joined
+# to its north and west neighbours, which makes the whole world one connected maze.
+ENDLESS_RADIUS = 4           # chunks kept around the player's chunk in each direction
+ENDLESS_CACHE = 128          # meshed chunks kept on the GPU; least recently used evicted first
+ENDLESS_CELL_CACHE = 1024    # generated wall grids kept, CHUNK_SIZE ** 2 bytes each
+ENDLESS_DOORS = 2            # openings in each chunk's north and west border
+ENDLESS_BUILDS_IN_FLIGHT = 4 # chunk meshes queued on the builder at once, nearest first
+
+def endless_chunk_cells(seed, cx, cz, chunk=CHUNK_SIZE):
+    # (chunk, chunk) uint8 walls of world cells [cz * chunk, +chunk) x [cx * chunk, +chunk)
+    rng = np.random.default_rng((seed, cx % 2**32, cz % 2**32))
+    rooms = chunk // 2
+    cells = np.ascontiguousarray(carve_maze(rooms, rooms, rng)[:chunk, :chunk])
+    cells[0, 1 + 2 * rng.choice(rooms, ENDLESS_DOORS, replace=False)] = 0 # north
+    cells[1 + 2 * rng.choice(rooms, ENDLESS_DOORS, replace=False), 0] = 0 # west
+    return cells
+
+# Pure CPU work, safe to run on the level builder thread or the mesh pool
+def build_endless_chunk(block, cx, cz, chunk=CHUNK_SIZE):
+    # block: (3 * chunk, 3 * chunk) walls of chunk (cx, cz) and its eight neighbours.
+    # Returns the chunk's mesh packed as by pack_meshes, and its wall instances (for the
+    # shader path).
+    region = block[chunk - 1:2 * chunk + 1, chunk - 1:2 * chunk + 1] * np.uint8(WALL)
+    x0, z0 = cx * chunk, cz * chunk
+    meshes = build_chunk_meshes(region, x0, z0, chunk) # never empty: the corner pillar is a wall
+    rows, cols = np.nonzero(region[1:-1, 1:-1])
+    return pack_meshes(meshes), wall_instances(region, rows, cols, x0 + cols, z0 + rows)
+
+class EndlessWorld:
+    # The endless maze around the player. Wall grids are generated on demand; chunk meshes
+    # are built on the builder thread, nearest first, and uploaded a slice per frame. Both
+    # caches are LRU with a fixed size, so memory stays bounded however far the player
+    # walks. The collision, visibility and minimap grids cover a window of chunks around
+    # the player and are rebuilt when the player crosses into another chunk.
+    def __init__(self, seed, builder, instanced=False, radius=ENDLESS_RADIUS, capacity=ENDLESS_CACHE):
+        self.seed = seed
+        self.builder = builder # executor for build_endless_chunk: builder thread or mesh pool
+        self.instanced = instanced
+        self.radius = radius
+        # Everything in range has to fit, or chunks on screen would be evicted
+        self.capacity = max(capacity, (2 * radius + 1) ** 2)
+        self.cells = OrderedDict()  # (cx, cz) -> wall grid, most recently used last
+        self.chunks = OrderedDict() # (cx, cz) -> (MeshBuffers or WallBuffers, wall cells)
+        self.building = {}          # (cx, cz) -> Future of build_endless_chunk
+        self.center = None          # chunk the windows are built around
+        self.wanted = []            # chunks in range, nearest first
+        self.drawn = []             # uploaded chunks in range, in draw order
+        self.bounds = np.zeros((0, 2, 3), dtype=np.float32) # per drawn chunk
+        self.cell_counts = np.zeros(0, dtype=np.int64)
+        self.version = 0            # bumped whenever the drawn list changes
+        self.minimap = None
+        self.minimap_center = None
+        self.stats = {"generated": 0, "built": 0, "evicted": 0}
+        side = (2 * radius + 1) * CHUNK_SIZE
+        self.floor = MeshBuffers(build_floor_mesh(side, side)) # moved along with the window
+        self.floor.upload()
+
+    def chunk_of(self, x, z):
+        return math.floor(x + 0.5) // CHUNK_SIZE, math.floor(z + 0.5) // CHUNK_SIZE
+
+    def chunk_cells(self, cx, cz):
+        key = (cx, cz)
+        cells = self.cells.get(key)
+        if cells is None:
+            cells = self.cells[key] = endless_chunk_cells(self.seed, cx, cz)
+            self.stats["generated"] += 1
+            if len(self.cells) > ENDLESS_CELL_CACHE:
+                self.cells.popitem(last=False)
+        else:
+            self.cells.move_to_end(key)
+        return cells
+
+    def walls(self, cx0, cz0, cx1, cz1):
+        # Wall grid of chunks [cx0, cx1) x [cz0, cz1), indexed [z, x] from the first one's corner
+        return np.block([[self.chunk_cells(cx, cz) for cx in range(cx0, cx1)] for cz in range(cz0, cz1)])
+
+    def recenter(self, x, z):
+        # Rebuild the windows if (x, z) is in another chunk than last time
+        center = self.chunk_of(x, z)
+        if center == self.center:
+            return
+        self.center = cx, cz = center
+        r = self.radius
+        self.origin = ((cx - r) * CHUNK_SIZE, (cz - r) * CHUNK_SIZE) # world cell of maze[0, 0]
+        self.maze = self.walls(cx - r, cz - r, cx + r + 1, cz + r + 1)
+        self.occluders = self.maze != 0
+        # A move never leaves the chunks next to the player's, and re-centres first
+        self.collision = CollisionGrid(self.maze[(r - 1) * CHUNK_SIZE:(r + 2) * CHUNK_SIZE,
+                                                 (r - 1) * CHUNK_SIZE:(r + 2) * CHUNK_SIZE])
+        self.collision_origin = ((cx - 1) * CHUNK_SIZE, (cz - 1) * CHUNK_SIZE)
+        self.wanted = sorted(((i, j) for j in range(cz - r, cz + r + 1) for i in range(cx - r, cx + r + 1)),
+                             key=lambda key: (key[0] - cx) ** 2 + (key[1] - cz) ** 2)
+        in_range = set(self.wanted)
+        for key in [key for key in self.building if key not in in_range]:
+            if self.building[key].cancel():
+                del self.building[key]
+        self.refresh()
+
+    def refresh(self):
+        cx, cz = self.center
+        r = self.radius
+        self.drawn = [key for key in self.wanted if key in self.chunks and self.chunks[key][0].complete]
+        self.chunk_index = np.full((2 * r + 1, 2 * r + 1), -1, dtype=np.int32) # window chunk -> drawn
+        for i, (x, z) in enumerate(self.drawn):
+            self.chunk_index[z - cz + r, x - cx + r] = i
+        self.bounds = np.array([((x * CHUNK_SIZE - 0.5, WALL_BOTTOM, z * CHUNK_SIZE - 0.5),
+                                 ((x + 1) * CHUNK_SIZE - 0.5, WALL_TOP, (z + 1) * CHUNK_SIZE - 0.5))
+                                for x, z in self.drawn], dtype=np.float32).reshape(-1, 2, 3)
+        self.cell_counts = np.array([self.chunks[key][1] for key in self.drawn], dtype=np.int64)
+        self.version += 1
+
+    def move(self, x, z, dx, dz):
+        # CollisionGrid.move in world coordinates
+        self.recenter(x, z)
+        ox, oz = self.collision_origin
+        x, z = self.collision.move(x - ox, z - oz, dx, dz)
+        return x + ox, z + oz
+
+    def block(self, cx, cz):
+        return self.walls(cx - 1, cz - 1, cx + 2, cz + 2)
+
+    def update(self, x, z, budget=UPLOAD_BYTES_PER_FRAME):
+        # Once per frame on the main thread: collect finished builds, queue the nearest
+        # missing chunks, upload within the budget and evict what no longer fits
+        self.recenter(x, z)
+        for key, future in list(self.building.items()):
+            if future.done():
+                del self.building[key]
+                packed, instances = future.result()
+                if self.instanced:
+                    buffers = WallBuffers(instances, np.array([[0, len(instances)]]))
+                else:
+                    buffers = MeshBuffers(unpack_meshes(*packed)[0][2])
+                self.chunks[key] = (buffers, len(instances))
+                self.stats["built"] += 1
+        changed = False
+        for key in self.wanted:
+            entry = self.chunks.get(key)
+            if entry is None:
+                if key not in self.building and len(self.building) < ENDLESS_BUILDS_IN_FLIGHT:
+                    self.building[key] = self.builder.submit(build_endless_chunk, self.block(*key), *key)
+                continue
+            self.chunks.move_to_end(key) # in range: most recently used
+            buffers = entry[0]
+            if not buffers.complete and budget > 0:
+                budget -= buffers.upload(budget)
+                changed |= buffers.complete
+        # Chunks in range were just touched, so the oldest ones are out of range
+        while len(self.chunks) > self.capacity:
+            _, (buffers, _) = self.chunks.popitem(last=False)
+            buffers.delete()
+            self.stats["evicted"] += 1
+        if changed:
+            self.refresh()
+
+    def draw(self, visible, shader=None, edges=True):
+        # visible: bool mask over self.drawn; shader: the WallShader, for instanced chunks
+        drawn = [self.chunks[key][0] for key in itertools.compress(self.drawn, visible.tolist())]
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        gl_state.line_width(2)
+        glPushMatrix()
+        glTranslatef(self.origin[0], 0, self.origin[1])
+        self.floor.draw()
+        glPopMatrix()
+        if not self.instanced:
+            for buffers in drawn:
+                buffers.draw(edges)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        if self.instanced:
+            everything = np.ones(1, dtype=bool)
+            for walls in drawn:
+                shader.draw(walls, everything, edges)
+
+    def draw_minimap(self, mx, my, size, x, z):
+        # The window around the player, rebuilt when it moves on
+        if self.minimap_center != self.center:
+            if self.minimap is not None:
+                self.minimap.delete()
+            self.minimap = Minimap(self.maze, show_exit=False)
+            self.minimap_center = self.center
+        self.minimap.draw(mx, my, size, x - self.origin[0], z - self.origin[1])
+
+    def delete(self):
+        for future in self.building.values():
+            future.cancel()
+        for buffers, _ in self.chunks.values():
+            buffers.delete()
+        self.floor.delete()
+        if self.minimap is not None:
+            self.minimap.delete()
+
+class Game:
+    def __init__(self, headless=False, profiler=None, seed=None, startup=None, shaders=False, mesh_workers=None,
+                 quality=None):
+        # headless: the caller already made a GL context current (e.g. offscreen for the
+        # benchmarks); no window, no audio and default settings
+        # seed: session seed every level is derived from, random if None
+        # startup: StartupTimer to mark the phases on, up to the first presented frame.
+        # Only what that frame needs happens here; audio and the next level start after it.
+        # shaders: draw the walls with WallShader when the driver supports it. Off by default:
+        # on llvmpipe it measures slower than the fixed-function path (benchmarks.py --shaders)
+        # mesh_workers: processes big levels are meshed on, see create_mesh_pool
+        # quality: pin a QUALITY_LEVELS index; None lets the QualityGovernor pick
+        self.startup = startup if startup is not None else StartupTimer()
+        # Just the modules the game uses; the mixer comes up after the first frame (init_audio)
+        pygame.display.init()
+        pygame.font.init()
+        self.startup.mark("pygame init")
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.show_profiler = False # F2
         # Initialize display with OpenGL and RESIZABLE
         self.width = SCREEN_WIDTH
         self.height = SCREEN_HEIGHT
-        self.screen = pygame.display.set_mode((self.width, self.height), DOUBLEBUF | OPENGL | RESIZABLE)
-        pygame.display.set_caption("Laze - OpenGL Edition")
+        if not headless:
+            self.screen = pygame.display.set_mode((self.width, self.height), DOUBLEBUF | OPENGL | RESIZABLE)
+            pygame.display.set_caption("Laze - OpenGL Edition")
+        gl_state.invalidate() # a new context starts from the GL defaults, not what was cached
+        self.startup.mark("window")
         self.clock = pygame.time.Clock()
         
-        self.camera_pos = [1.5, 0.5, 1.5]
+        self.player = PlayerBody() # position, and jumping; see the camera_pos property
         self.camera_rot = [0, 0] # [Yaw, Pitch]
+        # Rendering interpolates between the last two simulation ticks
+        self.view_pos = list(self.camera_pos)
+        self.sim_time = 0.0 # simulation time not yet stepped
         self.previous_state = "MENU"
         
         # --- Settings Variables ---
@@ -88,93 +2383,135 @@ class Game:
         self.volume = 0.3
         self.sensitivity = 0.1
         self.fov = 60
-        self.load_settings()
-        
-        # --- Physics / Jumping ---
-        self.velocity_y = 0.0
-        self.gravity = 0.005
-        self.jump_force = 0.12
-        self.is_jumping = False
-        self.ground_level = 0.5 # Camera eye level when standing
+        self.star_count = STAR_COUNT
+        self.minimap_fog = False
+        self.menu_blur = True
+        self.max_fps = 60 # 0 = uncapped
+        if not headless:
+            self.load_settings()
+        self.startup.mark("settings")
+        # Keeps frames within the fps cap's budget (60 fps when uncapped)
+        self.quality = QualityGovernor(1000.0 / (self.max_fps or TUNING_RATE), quality or 0, quality is None)
+        self.scene_target = SceneTarget() # used below full render scale
         
         # --- Audio Initialization ---
-        self.music_files = []
-        self.current_track = None
-        self.init_audio()
+        # Started by start_deferred() once the first frame is up
+        self.headless = headless
+        self.music = MusicPlayer(self.volume)
+        self.deferred_started = False
+        self.measure_startup = False # print the startup phases and exit after the first frame
             
-        self.maze_size = 11
-        self.maze_data = []
-        self.maze_list = None 
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        print(f"Session seed: {self.seed}")
+        self.level_pack = None
+        if os.path.exists(level_pack_path(self.seed)):
+            try:
+                self.level_pack = LevelPack(level_pack_path(self.seed))
+                atexit.register(self.level_pack.close)
+                print(f"Level pack loaded: {len(self.level_pack)} levels")
+            except Exception as e:
+                print(f"Failed to open level pack: {e}")
+        self.level_number = 1
+        self.maze_size = level_size(self.level_number)
+        self.maze_data = None # uint8 grid from generate_maze
+        self.level = None
+        self.level_buffers = None
+        self.minimap = None
+        # Double buffer: the next level is built on a worker thread while this one is
+        # played, then streamed to the GPU a slice per frame and swapped in at the exit
+        self.level_builder = ThreadPoolExecutor(max_workers=1)
+        self.next_level = None # Future[Level]
+        self.next_buffers = None
+        # Started with the audio, after the first frame; the first level is always small
+        self.mesh_workers = mesh_workers
+        self.mesh_pool = None
+        self.endless = None # EndlessWorld while playing the endless maze
+        self.recorder = None # Recorder while recording the session
+        # Visibility rays are cached until the camera moves (see occlusion_mask)
+        self.occlusion_key = None
+        # Instanced GLSL walls, or None for the fixed-function chunk meshes
+        self.wall_shader = create_wall_shader() if shaders else None
+        self.occlusion = None
+        self.cull_stats = (0, 0, 0, 0)
+        self.show_cull_stats = False # F3
+        self.show_hint = False # H: way to the exit on the minimap, steps left on the HUD
+        self.pending_solution = None # (level, Future) while its ExitField is built for the hint
         
         self.state = "MENU"
-        self.menu_options = ["Start Game", "Settings", "Exit"]
+        self.menu_options = ["Start Game", "Endless Maze", "Settings", "Exit"]
+        self.pause_options = ["Resume", "Settings", "Main Menu"]
         self.selected_option = 0
         
         # Settings Menu options
         self.settings_options = ["Volume", "Sensitivity", "Back"]
         self.selected_setting = 0
         
-        self.font = pygame.font.SysFont('Arial', 32)
-        self.small_font = pygame.font.SysFont('Arial', 24)
+        # The menu only needs the big font; the small one is loaded on first use
+        self.font = load_font('Arial', 32)
+        self._small_font = None
+        self.text = TextRenderer([self.font])
+        self.startup.mark("fonts")
         
-        self.stars = []
-        self.init_stars()
+        self.sky = None
+        self.init_sky()
+        self.menu_background = FrozenFrame()
+        self.startup.mark("sky")
         
-        # Initial Level Generation for Menu Background
+        # Initial Level Generation for Menu Background: level 1 is the smallest there is
         self.generate_level()
+        self.startup.mark("level")
+
+    # The camera sits at the player's eye; previous_pos is where it was a tick ago
+    @property
+    def camera_pos(self):
+        return self.player.pos
+
+    @camera_pos.setter
+    def camera_pos(self, pos):
+        self.player.pos = pos
+
+    @property
+    def previous_pos(self):
+        return self.player.previous
+
+    @previous_pos.setter
+    def previous_pos(self, pos):
+        self.player.previous = pos
+
+    @property
+    def small_font(self):
+        if self._small_font is None:
+            self._small_font = load_font('Arial', 24)
+        return self._small_font
+
+    def start_deferred(self):
+        # Everything the first frame didn't need: audio and building the next level
+        self.deferred_started = True
+        if not self.headless:
+            self.init_audio()
+        self.mesh_pool = create_mesh_pool(self.mesh_workers)
+        if self.next_level is None:
+            self.prefetch_next_level()
 
     def draw_text_opengl(self, text, x, y, color=(1.0, 1.0, 1.0), font=None):
         if font is None: font = self.font
-        # Render text in WHITE onto texture
-        text_surface = font.render(text, True, (255, 255, 255, 255))
-        text_data = pygame.image.tostring(text_surface, "RGBA", True)
-        width, height = text_surface.get_width(), text_surface.get_height()
-        
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        
-        tex_id = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, tex_id)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, text_data)
-        
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, tex_id)
-        
-        # Tint the white text with the desired color
-        glColor3f(color[0], color[1], color[2])
-        
-        glBegin(GL_QUADS)
-        # Flip texture vertically by swapping V coordinates
-        glTexCoord2f(0, 1); glVertex2f(x, y)
-        glTexCoord2f(1, 1); glVertex2f(x + width, y)
-        glTexCoord2f(1, 0); glVertex2f(x + width, y + height)
-        glTexCoord2f(0, 0); glVertex2f(x, y + height)
-        glEnd()
-        
-        glDisable(GL_TEXTURE_2D)
-        glDeleteTextures([tex_id])
-        glDisable(GL_BLEND)
+        # Queued; drawn together with the rest of the frame's text in restore_3d_projection
+        self.text.draw(text, x, y, color, font)
 
     def setup_2d_ortho(self):
-        glMatrixMode(GL_PROJECTION)
+        gl_state.projection(("2d",), lambda: ortho_matrix(0, SCREEN_WIDTH, SCREEN_HEIGHT, 0))
         glLoadIdentity()
-        gluOrtho2D(0, SCREEN_WIDTH, SCREEN_HEIGHT, 0) 
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
-        glDisable(GL_DEPTH_TEST)
-        glDisable(GL_FOG)
-        glDisable(GL_LIGHTING)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA) 
+        gl_state.disable(GL_DEPTH_TEST)
+        gl_state.disable(GL_FOG)
+        gl_state.disable(GL_LIGHTING)
+        gl_state.enable(GL_BLEND)
+        gl_state.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
     def restore_3d_projection(self):
-        # We don't need to pop matrices because we rebuild them every frame in setup_3d
-        # Just re-enable 3D states
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_FOG)
-        glDisable(GL_BLEND)
+        with self.profiler.scope("text"):
+            self.text.flush()
+        # Nothing to undo: setup_3d sets the projection and the 3D states it needs, and
+        # gl_state skips them when they're already set
 
     def draw_text_centered(self, text, y_pos, color=(0.0, 1.0, 0.0), selected=False, font=None):
         if selected:
@@ -182,474 +2519,456 @@ class Game:
         
         if font is None: font = self.font
         
-        # Calculate X based on size, but we need the surface size.
-        # We render a dummy surface just to get width (or cache it, but this is fine for menu)
-        # Actually render logic is inside draw_text_opengl but we need x position.
-        # Optimization: Don't render twice.
-        # But draw_text_opengl generates texture.
-        # Let's verify width here.
-        sz = font.size(text)
-        x_pos = SCREEN_WIDTH//2 - sz[0]//2
+        # Width comes from the cached layout, so this costs nothing after the first frame
+        x_pos = SCREEN_WIDTH//2 - self.text.width(text, font)//2
         
         self.draw_text_opengl(text, x_pos, y_pos, color, font)
 
-    def render_scene(self):
-        # Setup 3D Projection
-        self.setup_3d()
-        
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glLoadIdentity()
-        
-        glRotatef(self.camera_rot[1], 1, 0, 0)
-        glRotatef(self.camera_rot[0], 0, 1, 0)
-        
-        self.draw_retro_sky()
-        
-        glTranslatef(-self.camera_pos[0], -self.camera_pos[1], -self.camera_pos[2])
-        glCallList(self.maze_list)
-        
-        # Exit Cube
-        glColor3f(0, 1, 1)
-        draw_cube(self.maze_size-1, 0.5, self.maze_size-2, 0.6, wall_color=(0, 1, 1), edge_color=(1, 1, 1))
-
-    def init_stars(self):
-        for _ in range(200):
-            # Stars in the upper hemisphere
-            theta = random.uniform(0, 2 * math.pi)
-            phi = random.uniform(0, math.pi / 2.2) # Closer to horizon
-            r = 100.0 # Further away
-            
-            x = r * math.sin(phi) * math.cos(theta)
-            y = r * math.cos(phi)
-            z = r * math.sin(phi) * math.sin(theta)
-            self.stars.append((x, y, z))
+    def init_sky(self):
+        if self.sky is not None:
+            self.sky.delete()
+        self.sky = SkyBuffers(self.star_count)
         
     def init_audio(self):
-        try:
-            pygame.mixer.init()
-            # Find all audio files in 'music' folder
-            music_dir = 'music'
-            if os.path.exists(music_dir) and os.path.isdir(music_dir):
-                exts = ('.mp3', '.ogg', '.wav')
-                for file in os.listdir(music_dir):
-                    if file.lower().endswith(exts):
-                        self.music_files.append(os.path.join(music_dir, file))
-            
-            if self.music_files:
-                self.play_random_music()
-            else:
-                print("No music files found in 'music' folder.")
-        except Exception as e:
-            print(f"Audio init error: {e}")
-
-    def play_random_music(self):
-        if not self.music_files: return
-        track = random.choice(self.music_files)
-        print(f"Playing: {track}")
-        try:
-            pygame.mixer.music.load(track)
-            pygame.mixer.music.set_volume(self.volume)
-            pygame.mixer.music.set_endevent(USEREVENT)
-            pygame.mixer.music.play(0) 
-        except Exception as e:
-            print(f"Error playing {track}: {e}")
+        # Opens the mixer; the library scan runs in the background and music begins once the first track is read
+        self.music.start()
 
-    def setup_3d(self):
-        # Update Viewport
-        glViewport(0, 0, self.width, self.height)
+    def setup_3d(self, width=None, height=None, far=FAR_PLANE):
+        # Viewport of the 3D scene: the window, or the smaller SceneTarget
+        gl_state.viewport(0, 0, width or self.width, height or self.height)
         
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_FOG)
+        gl_state.enable(GL_DEPTH_TEST)
+        gl_state.enable(GL_FOG)
+        gl_state.disable(GL_BLEND)
         # Retro Synthwave Background and Fog
         bg_color = (0.1, 0.0, 0.2, 1.0) # Dark Purple
-        glClearColor(*bg_color)
-        glFogfv(GL_FOG_COLOR, bg_color)
-        glFogf(GL_FOG_DENSITY, 0.05) # Less dense to see the sky
-        glHint(GL_FOG_HINT, GL_NICEST)
+        gl_state.clear_color(*bg_color)
+        gl_state.fog_color(bg_color)
+        gl_state.fog_density(fog_density(far)) # Less dense to see the sky
+        gl_state.hint(GL_FOG_HINT, GL_NICEST)
         
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
         if self.height == 0: self.height = 1 # Prevent div by zero
-        gluPerspective(self.fov, (self.width / self.height), 0.1, 150.0) # Increase draw distance
-        glMatrixMode(GL_MODELVIEW)
+        # Rebuilt only when the window, fov or draw distance change
+        aspect = self.width / self.height
+        gl_state.projection(("3d", self.fov, aspect, far),
+                            lambda: perspective_matrix(self.fov, aspect, NEAR_PLANE, far))
 
     def draw_retro_sky(self):
-        # Save state
-        glPushAttrib(GL_ENABLE_BIT)
-        glDisable(GL_DEPTH_TEST)
-        glDisable(GL_FOG)
-        glDisable(GL_LIGHTING)
+        gl_state.disable(GL_DEPTH_TEST)
+        gl_state.disable(GL_FOG)
+        gl_state.disable(GL_LIGHTING)
         
         glPushMatrix()
-        glTranslatef(self.camera_pos[0], self.camera_pos[1], self.camera_pos[2])
-        
-        size = 80.0
-        height = 60.0 # Higher Sky
-        
-        # --- Gradient Sky Background ---
-        glBegin(GL_QUADS)
-        
-        # Colors - Deep Space (Almost Black) to Retro Purple/Pink at Horizon
-        top_color = (0.02, 0.0, 0.05)     # Deep Void
-        mid_color = (0.2, 0.0, 0.3)      # Mid Purple
-        horizon_color = (0.6, 0.1, 0.4)  # Magenta Horizon
-        
-        # We'll draw sides with vertical gradient
-        # Front
-        glColor3fv(horizon_color); glVertex3f(-size, -20, -size)
-        glColor3fv(horizon_color); glVertex3f(size, -20, -size)
-        glColor3fv(top_color);     glVertex3f(size, height, -size)
-        glColor3fv(top_color);     glVertex3f(-size, height, -size)
-        
-        # Back
-        glColor3fv(horizon_color); glVertex3f(size, -20, size)
-        glColor3fv(horizon_color); glVertex3f(-size, -20, size)
-        glColor3fv(top_color);     glVertex3f(-size, height, size)
-        glColor3fv(top_color);     glVertex3f(size, height, size)
-        
-        # Left
-        glColor3fv(horizon_color); glVertex3f(-size, -20, size)
-        glColor3fv(horizon_color); glVertex3f(-size, -20, -size)
-        glColor3fv(top_color);     glVertex3f(-size, height, -size)
-        glColor3fv(top_color);     glVertex3f(-size, height, size)
-        
-        # Right
-        glColor3fv(horizon_color); glVertex3f(size, -20, -size)
-        glColor3fv(horizon_color); glVertex3f(size, -20, size)
-        glColor3fv(top_color);     glVertex3f(size, height, size)
-        glColor3fv(top_color);     glVertex3f(size, height, -size)
-        
-        # Top Lid
-        glColor3fv(top_color)
-        glVertex3f(-size, height, -size); glVertex3f(size, height, -size)
-        glVertex3f(size, height, size); glVertex3f(-size, height, size)
-        
-        glEnd()
-        
-        # --- Stars ---
-        glPointSize(2)
-        glBegin(GL_POINTS)
-        glColor3f(1, 1, 1)
-        for s in self.stars:
-            glVertex3f(s[0], s[1], s[2])
-        glEnd()
-        
-        # --- Retro Sun ---
-        # Draw a sun on the horizon (North / -Z direction)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE) 
-        
-        glPushMatrix()
-        glTranslatef(0, 0, -30) # Distance
-        
-        # Sun Body (Circle)
-        segments = 32
-        radius = 8.0
-        glBegin(GL_TRIANGLE_FAN)
-        glColor4f(1.0, 0.9, 0.2, 0.9) # Center Bright Yellow
-        glVertex3f(0, 3, 0)
-        
-        glColor4f(1.0, 0.1, 0.6, 0.4) # Rim Pink/Red
-        for i in range(segments + 1):
-            theta = 2.0 * math.pi * i / segments
-            dx = radius * math.cos(theta)
-            dy = radius * math.sin(theta) + 3 # Shift up slightly
-            glVertex3f(dx, dy, 0)
-        glEnd()
-        
+        glTranslatef(self.view_pos[0], self.view_pos[1], self.view_pos[2])
+        # Camera-relative, so shrinking it looks the same and keeps it inside a nearer far plane
+        scale, far, stars, _ = self.quality.settings
+        glScalef(far / FAR_PLANE, far / FAR_PLANE, far / FAR_PLANE)
+        self.sky.draw(stars)
         glPopMatrix()
-        
-        glDisable(GL_BLEND)
-        glPopMatrix()
-        glPopAttrib()
+        gl_state.enable(GL_DEPTH_TEST)
+        gl_state.enable(GL_FOG)
 
     def generate_level(self):
-        self.maze_data = generate_maze(self.maze_size, self.maze_size)
-        if self.maze_list:
-            glDeleteLists(self.maze_list, 1)
-        self.maze_list = glGenLists(1)
-        glNewList(self.maze_list, GL_COMPILE)
-        
-        # Floor
-        glBegin(GL_QUADS)
-        glColor3f(0.05, 0.05, 0.1)
-        glVertex3f(-1, -0.5, -1); glVertex3f(self.maze_size, -0.5, -1)
-        glVertex3f(self.maze_size, -0.5, self.maze_size); glVertex3f(-1, -0.5, self.maze_size)
-        glEnd()
-        
-        # Floor Grid
-        glBegin(GL_LINES)
-        glColor3f(0, 0.3, 0.5)
-        for i in range(-1, self.maze_size + 1):
-            glVertex3f(i, -0.49, -1); glVertex3f(i, -0.49, self.maze_size)
-            glVertex3f(-1, -0.49, i); glVertex3f(self.maze_size, -0.49, i)
-        glEnd()
-        
-        # Ceiling - REMOVED for open sky
-        # glColor3f(0, 0, 0)
-        # glBegin(GL_QUADS)
-        # glVertex3f(-1, 2.0, -1); glVertex3f(self.maze_size, 2.0, -1)
-        # glVertex3f(self.maze_size, 2.0, self.maze_size); glVertex3f(-1, 2.0, self.maze_size)
-        # glEnd()
-
-        # Walls
-        for y, row in enumerate(self.maze_data):
-            for x, cell in enumerate(row):
-                if cell == 1:
-                    draw_cube(x, 0.5, y, 1.0, wall_color=(0, 0.05, 0.15), edge_color=(0, 0.8, 1))
-        
-        # Perimeter
-        for x in range(-1, self.maze_size + 1):
-            draw_cube(x, 0.5, -1, wall_color=(0.1, 0.1, 0.2), edge_color=(0.4, 0.4, 0.8))
-            draw_cube(x, 0.5, self.maze_size, wall_color=(0.1, 0.1, 0.2), edge_color=(0.4, 0.4, 0.8))
-        for y in range(-1, self.maze_size + 1):
-            draw_cube(-1, 0.5, y, wall_color=(0.1, 0.1, 0.2), edge_color=(0.4, 0.4, 0.8))
-            draw_cube(self.maze_size, 0.5, y, wall_color=(0.1, 0.1, 0.2), edge_color=(0.4, 0.4, 0.8))
-            
-        glEndList()
-        self.camera_pos = [1.5, 0.5, 1.5]
+        # Blocking build of the current level (startup); later levels go through advance_level
+        level = build_seeded_level(self.seed, self.level_number, self.level_pack)
+        buffers = LevelBuffers(level.mesh, self.wall_shader is not None)
+        buffers.upload()
+        self.set_level(level, buffers)
+
+    def prefetch_next_level(self):
+        self.next_level = self.level_builder.submit(build_seeded_level, self.seed, self.level_number + 1,
+                                                    self.level_pack, self.mesh_pool)
+        self.next_buffers = None
+
+    def stream_next_level(self, budget=UPLOAD_BYTES_PER_FRAME):
+        # Called once per frame: upload a slice of the pre-built level, if it is ready
+        if self.next_level is None or not self.next_level.done():
+            return
+        if self.next_buffers is None:
+            self.next_buffers = LevelBuffers(self.next_level.result().mesh, self.wall_shader is not None)
+        if not self.next_buffers.complete:
+            self.next_buffers.upload(budget)
+
+    def advance_level(self):
+        # Only blocks if the player reached the exit before the worker/upload finished
+        if self.next_level is None:
+            self.prefetch_next_level()
+        level = self.next_level.result()
+        if self.next_buffers is None:
+            self.next_buffers = LevelBuffers(level.mesh, self.wall_shader is not None)
+        self.next_buffers.upload()
+        old_buffers = self.level_buffers
+        self.set_level(level, self.next_buffers)
+        old_buffers.delete()
+        self.prefetch_next_level()
 
+    def set_level(self, level, buffers):
+        self.level = level
+        self.level_buffers = buffers
+        if level.number is not None:
+            self.level_number = level.number
+        self.maze_size = level.size
+        self.maze_data = level.maze
+        if self.minimap is not None:
+            self.minimap.delete()
+        self.minimap = Minimap(level.maze, self.minimap_fog)
+        self.player.place(1.0, 1.0)
+        if not self.headless: # benchmarks report their own levels
+            stats = level.mesh.stats
+            print(f"Level {level.number} ({level.size}x{level.size}): {stats['chunks']} chunks, {stats['triangles']} triangles, "
+                  f"{stats['vertices']} vertices (per-cube: {stats['cube_triangles']} triangles, "
+                  f"{stats['cube_vertices']} vertices)")
 
+    def start_endless(self):
+        # Leaves the level sequence for the endless maze of this session's seed
+        self.endless = EndlessWorld(self.seed, self.mesh_pool or self.level_builder, self.wall_shader is not None)
+        self.player.place(1.0, 1.0)
+        self.endless.recenter(self.camera_pos[0], self.camera_pos[2])
+        print(f"Endless maze (seed {self.seed})")
 
-    def render_scene(self):
-        self.setup_3d() # Restore 3D projection
+    def stop_endless(self):
+        # Back to the start of the current level
+        self.endless.delete()
+        self.endless = None
+        self.player.place(1.0, 1.0)
+
+    def render_scene(self, alpha=1.0):
+        # alpha: how far the render falls between the last two simulation ticks
+        self.view_pos = [p + (c - p) * alpha for p, c in zip(self.previous_pos, self.camera_pos)]
+        with self.profiler.scope("stream"):
+            self.stream_next_level()
+            if self.endless is not None:
+                self.endless.update(self.view_pos[0], self.view_pos[2])
+        scale, far, _, edges = self.quality.settings
+        width, height = max(1, int(self.width * scale)), max(1, int(self.height * scale))
+        if scale < 1.0:
+            self.scene_target.begin(width, height)
+        self.setup_3d(width, height, far) # Restore 3D projection
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
         
         glRotatef(self.camera_rot[1], 1, 0, 0)
         glRotatef(self.camera_rot[0], 0, 1, 0)
-        glTranslatef(-self.camera_pos[0], -self.camera_pos[1], -self.camera_pos[2])
+        glTranslatef(-self.view_pos[0], -self.view_pos[1], -self.view_pos[2])
         
-        self.draw_retro_sky()
-        glCallList(self.maze_list)
+        with self.profiler.scope("sky"):
+            self.draw_retro_sky()
+        with self.profiler.scope("cull"):
+            visible = self.visible_chunks(far)
+        with self.profiler.scope("maze"):
+            if self.endless is not None:
+                self.endless.draw(visible, self.wall_shader, edges)
+            else:
+                self.level_buffers.draw(visible, self.wall_shader, edges)
         
-        # Exit Cube
-        glColor3f(0, 1, 1)
-        draw_cube(self.maze_size-1, 0.5, self.maze_size-2, 0.6, wall_color=(0, 1, 1), edge_color=(1, 1, 1))
-
-    def handle_menu(self):
-        # Don't switch set_mode, keep OpenGL
-        running = True
-        while running:
-            # Render Background
-            self.render_scene()
-            
-            # Overlay 2D Menu
-            self.setup_2d_ortho()
-            
-            title_text = "LAZE - OPENGL"
-            self.draw_text_centered(title_text, 100, (0.0, 1.0, 1.0))
-            
-            start_y = 300
-            for i, option in enumerate(self.menu_options):
-                self.draw_text_centered(option, start_y + i * 60, selected=(i == self.selected_option))
-            
-            self.restore_3d_projection() # Restore 3D projection before flipping
-            pygame.display.flip()
-            
-            self.clock.tick(60)
+        # Exit Cube (the endless maze has none)
+        if self.endless is None:
+            with self.profiler.scope("exit_cube"):
+                glColor3f(0, 1, 1)
+                draw_cube(self.maze_size-1, 0.5, self.maze_size-2, 0.6, wall_color=(0, 1, 1), edge_color=(1, 1, 1))
 
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == VIDEORESIZE:
-                    self.width, self.height = event.w, event.h
-                    glViewport(0, 0, self.width, self.height)
-                if event.type == USEREVENT:
-                    self.play_random_music()
-                if event.type == KEYDOWN:
-                    if event.key == K_UP:
-                        self.selected_option = (self.selected_option - 1) % len(self.menu_options)
-                    elif event.key == K_DOWN:
-                        self.selected_option = (self.selected_option + 1) % len(self.menu_options)
-                    elif event.key == K_RETURN or event.key == K_SPACE:
-                        if self.selected_option == 0: # Start
-                            self.state = "GAME"
-                            # If coming from fresh start, maybe regen? 
-                            # But user said "walls don't disappear", implying continuity.
-                            # So we keep current state unless we want a NEW game.
-                            # Usually "Start Game" means New Game if from main menu?
-                            # Let's check if we have moved. If camera is at default, fine.
-                            # Let's just enter GAME state. If player wants new game, they might need a function for that.
-                            # For now, let's just Resume/Enter.
-                            pygame.mouse.set_visible(False)
-                            pygame.event.set_grab(True)
-                            return
-                        elif self.selected_option == 1: # Settings
-                            self.previous_state = "MENU"
-                            self.state = "SETTINGS"
-                            return
-                        elif self.selected_option == 2: # Exit
-                            pygame.quit()
-                            sys.exit()
-
-    def handle_settings(self):
-        running = True
-        while running:
-            self.render_scene()
+        if scale < 1.0:
+            with self.profiler.scope("upscale"):
+                self.scene_target.end(self.width, self.height)
+            gl_state.viewport(0, 0, self.width, self.height) # the 2D overlays are drawn at full size
+
+    def visible_chunks(self, far=FAR_PLANE):
+        # Frustum cull the level chunks against the same camera render_scene sets up
+        aspect = self.width / self.height
+        clip = perspective_matrix(self.fov, aspect, NEAR_PLANE, far) @ \
+            view_matrix(self.view_pos, self.camera_rot)
+        scene = self.endless if self.endless is not None else self.level_buffers
+        visible = boxes_in_frustum(frustum_planes(clip), scene.bounds)
+        # Then drop chunks hidden behind walls; not when the camera is above them mid-jump
+        if self.view_pos[1] < WALL_TOP:
+            visible &= self.occlusion_mask(aspect, far)
+        counts = self.endless.cell_counts if self.endless is not None else self.level.mesh.cell_counts
+        self.cull_stats = (int(counts[visible].sum()), int(counts.sum()),
+                           int(np.count_nonzero(visible)), len(visible))
+        return visible
+
+    def occlusion_mask(self, aspect, far=FAR_PLANE):
+        # Rays are recast only when the camera moves a quarter cell or turns a degree
+        x, z = self.view_pos[0], self.view_pos[2]
+        if self.endless is not None:
+            # The window grid starts at the world cell endless.origin instead of at -1
+            occluders, chunk_index = self.endless.occluders, self.endless.chunk_index
+            ox, oz = self.endless.origin
+            x, z = x - ox - 1, z - oz - 1
+        else:
+            occluders, chunk_index = self.level.occluders, self.level.mesh.chunk_index
+        key = (self.level, self.endless.version if self.endless is not None else None,
+               round(x * 4), round(z * 4), round(self.camera_rot[0]), round(self.camera_rot[1]), self.fov, aspect, far)
+        if key != self.occlusion_key:
+            cone = view_cone(self.fov, aspect, self.camera_rot)
+            if cone is None:
+                angles = np.linspace(-math.pi, math.pi, 360 * RAYS_PER_DEGREE, endpoint=False)
+            else:
+                count = int(math.degrees(cone[1] - cone[0]) * RAYS_PER_DEGREE) + 2
+                angles = np.linspace(cone[0], cone[1], count)
+            cells = cast_rays(occluders, x, z, angles, far)
+            self.occlusion = chunks_seen(cells, occluders.shape, chunk_index)
+            self.occlusion_key = key
+        return self.occlusion
+
+    def present(self):
+        with self.profiler.scope("flip"):
+            if self.headless:
+                glFinish() # no window to swap; wait for the frame instead
+            else:
+                pygame.display.flip()
+        self.profiler.end_frame()
+        if not self.deferred_started:
+            glFinish() # the frame is really on screen
+            self.startup.mark("first frame")
+            print(f"First frame after {self.startup.total * 1000:.0f} ms")
+            if self.measure_startup:
+                self.startup.report()
+                pygame.quit()
+                sys.exit()
+            self.start_deferred()
+
+    def draw_profiler_hud(self):
+        with self.profiler.scope("hud"):
             self.setup_2d_ortho()
-            
-            self.draw_text_centered("SETTINGS", 100, (0.0, 1.0, 1.0))
-            
-            vol_str = f"Volume: {int(self.volume * 100)}%"
-            self.draw_text_centered(vol_str, 300, selected=(self.selected_setting == 0))
-            
-            sens_str = f"Sensitivity: {self.sensitivity:.2f}"
-            self.draw_text_centered(sens_str, 360, selected=(self.selected_setting == 1))
-            
-            self.draw_text_centered("Back", 420, selected=(self.selected_setting == 2))
-            
-            self.draw_text_centered("Use LEFT/RIGHT to adjust, ENTER to select", 600, (0.4, 0.4, 0.4), font=self.small_font)
-            
-            self.restore_3d_projection() # Restore 3D projection before flipping
-            pygame.display.flip()
-            self.clock.tick(60)
-            
-            for event in pygame.event.get():
-                if event.type == QUIT:
+            rows = [["ms", "p50", "p95", "p99"]] + self.profiler.hud()
+            for i, row in enumerate(rows):
+                for j, cell in enumerate(row):
+                    self.draw_text_opengl(cell, 10 + j * 80 + (60 if j else 0), 130 + i * 22,
+                                          color=(1, 1, 0), font=self.small_font)
+            self.restore_3d_projection()
+
+    def draw_cull_stats(self):
+        drawn, total, chunks, all_chunks = self.cull_stats
+        sky_draws, sky_vertices = self.sky.stats
+        scale, far, stars, edges = self.quality.settings
+        self.setup_2d_ortho()
+        self.draw_text_opengl(f"Cells {drawn}/{total}  Chunks {chunks}/{all_chunks}", 10, 10,
+                              color=(1, 1, 0), font=self.small_font)
+        self.draw_text_opengl(f"Sky {sky_draws} draws, {sky_vertices} vertices", 10, 40,
+                              color=(1, 1, 0), font=self.small_font)
+        self.draw_text_opengl(f"Quality {self.quality.level}{'' if self.quality.adaptive else ' (fixed)'}: "
+                              f"scale {scale:.2f}, far {far:.0f}, stars {stars:.0%}, edges {'on' if edges else 'off'}",
+                              10, 70, color=(1, 1, 0), font=self.small_font)
+        if self.endless is not None:
+            world = self.endless
+            self.draw_text_opengl(f"Chunk {world.center}  Loaded {len(world.chunks)}/{world.capacity}  "
+                                  f"Grids {len(world.cells)}  Evicted {world.stats['evicted']}", 10, 100,
+                                  color=(1, 1, 0), font=self.small_font)
+        self.restore_3d_projection()
+
+    def hint_solution(self):
+        # The level's ExitField for the hint, or None while the level builder is still
+        # working it out (asked for the first time the hint is on)
+        level = self.level
+        if "solution" in level.__dict__:
+            return level.solution
+        if self.pending_solution is None or self.pending_solution[0] is not level:
+            self.pending_solution = (level, self.level_builder.submit(lambda: level.solution))
+        return level.solution if self.pending_solution[1].done() else None
+
+    def draw_hint(self):
+        solution = self.hint_solution()
+        if solution is None:
+            text = "Exit: finding the way..."
+        else:
+            steps = solution.steps(int(round(self.view_pos[0])), int(round(self.view_pos[2])))
+            text = f"Exit: {steps} steps (shortest {solution.solution_length})"
+        self.setup_2d_ortho()
+        self.draw_text_opengl(text, 10, SCREEN_HEIGHT - 40, color=MINIMAP_HINT_COLOR, font=self.small_font)
+        self.restore_3d_projection()
+
+    def menu_screen(self):
+        # (title, option labels, selected option, footer) of the current menu state
+        if self.state == "SETTINGS":
+            options = [f"Volume: {int(self.volume * 100)}%", f"Sensitivity: {self.sensitivity:.2f}", "Back"]
+            return "SETTINGS", options, self.selected_setting, "Use LEFT/RIGHT to adjust, ENTER to select"
+        if self.state == "PAUSED":
+            return "PAUSED", self.pause_options, self.selected_option, None
+        return "LAZE - OPENGL", self.menu_options, self.selected_option, None
+
+    def draw_menu(self):
+        self.setup_2d_ortho()
+        self.menu_background.draw(SCREEN_WIDTH, SCREEN_HEIGHT)
+        title, options, selected, footer = self.menu_screen()
+        self.draw_text_centered(title, 100, (0.0, 1.0, 1.0))
+        start_y = 300
+        for i, option in enumerate(options):
+            self.draw_text_centered(option, start_y + i * 60, selected=(i == selected))
+        if footer:
+            self.draw_text_centered(footer, 600, (0.4, 0.4, 0.4), font=self.small_font)
+        self.restore_3d_projection() # Restore 3D projection before flipping
+        self.present()
+
+    def menu_key(self, key):
+        if self.state == "MENU":
+            if key == K_UP:
+                self.selected_option = (self.selected_option - 1) % len(self.menu_options)
+            elif key == K_DOWN:
+                self.selected_option = (self.selected_option + 1) % len(self.menu_options)
+            elif key == K_RETURN or key == K_SPACE:
+                if self.selected_option == 0: # Start
+                    # Enters the current level; the walls stay as they are
+                    if self.endless is not None:
+                        self.stop_endless()
+                    self.resume_game()
+                elif self.selected_option == 1: # Endless
+                    if self.endless is None:
+                        self.start_endless()
+                    self.resume_game()
+                elif self.selected_option == 2: # Settings
+                    self.previous_state = "MENU"
+                    self.state = "SETTINGS"
+                elif self.selected_option == 3: # Exit
                     pygame.quit()
                     sys.exit()
-                if event.type == VIDEORESIZE:
-                    self.width, self.height = event.w, event.h
-                    glViewport(0, 0, self.width, self.height)
-                if event.type == USEREVENT:
-                    self.play_random_music()
-                if event.type == KEYDOWN:
-                    if event.key == K_UP:
-                        self.selected_setting = (self.selected_setting - 1) % len(self.settings_options)
-                    elif event.key == K_DOWN:
-                        self.selected_setting = (self.selected_setting + 1) % len(self.settings_options)
-                    elif event.key == K_LEFT:
-                        if self.selected_setting == 0: # Volume
-                            self.volume = max(0.0, self.volume - 0.1)
-                            pygame.mixer.music.set_volume(self.volume)
-                        elif self.selected_setting == 1: # Sensitivity
-                            self.sensitivity = max(0.01, self.sensitivity - 0.01)
-                    elif event.key == K_RIGHT:
-                        if self.selected_setting == 0: # Volume
-                            self.volume = min(1.0, self.volume + 0.1)
-                            pygame.mixer.music.set_volume(self.volume)
-                        elif self.selected_setting == 1: # Sensitivity
-                            self.sensitivity = min(0.5, self.sensitivity + 0.01)
-                    elif event.key == K_RETURN or event.key == K_SPACE or event.key == K_ESCAPE:
-                        if self.selected_setting == 2 or event.key == K_ESCAPE: # Back
-                            self.save_settings()
-                            self.state = self.previous_state
-                            return
-
-    def handle_pause(self):
-        running = True
-        while running:
-            self.render_scene()
-            self.setup_2d_ortho()
-            
-            self.draw_text_centered("PAUSED", 100, (0, 255, 255))
-            
-            options = ["Resume", "Settings", "Main Menu"]
-            start_y = 300
-            for i, option in enumerate(options):
-                self.draw_text_centered(option, start_y + i * 60, selected=(i == self.selected_option))
-            
-            self.restore_3d_projection()
-            pygame.display.flip()
-            self.clock.tick(60)
-            
-            for event in pygame.event.get():
+        elif self.state == "SETTINGS":
+            if key == K_UP:
+                self.selected_setting = (self.selected_setting - 1) % len(self.settings_options)
+            elif key == K_DOWN:
+                self.selected_setting = (self.selected_setting + 1) % len(self.settings_options)
+            elif key == K_LEFT:
+                if self.selected_setting == 0: # Volume
+                    self.volume = max(0.0, self.volume - 0.1)
+                    self.music.set_volume(self.volume)
+                elif self.selected_setting == 1: # Sensitivity
+                    self.sensitivity = max(0.01, self.sensitivity - 0.01)
+            elif key == K_RIGHT:
+                if self.selected_setting == 0: # Volume
+                    self.volume = min(1.0, self.volume + 0.1)
+                    self.music.set_volume(self.volume)
+                elif self.selected_setting == 1: # Sensitivity
+                    self.sensitivity = min(0.5, self.sensitivity + 0.01)
+            elif key == K_RETURN or key == K_SPACE or key == K_ESCAPE:
+                if self.selected_setting == 2 or key == K_ESCAPE: # Back
+                    self.save_settings()
+                    self.state = self.previous_state
+        elif self.state == "PAUSED":
+            if key == K_UP:
+                self.selected_option = (self.selected_option - 1) % len(self.pause_options)
+            elif key == K_DOWN:
+                self.selected_option = (self.selected_option + 1) % len(self.pause_options)
+            elif key == K_RETURN or key == K_SPACE:
+                if self.selected_option == 0: # Resume
+                    self.resume_game()
+                elif self.selected_option == 1: # Settings
+                    self.previous_state = "PAUSED"
+                    self.state = "SETTINGS"
+                elif self.selected_option == 2: # Main Menu
+                    self.state = "MENU"
+                    self.save_settings()
+            elif key == K_ESCAPE:
+                self.resume_game()
+
+    def resume_game(self):
+        self.state = "GAME"
+        pygame.mouse.set_visible(False)
+        pygame.event.set_grab(True)
+        # Don't let the time and mouse motion spent in the menus reach the game
+        self.clock.tick()
+        pygame.mouse.get_rel()
+        if self.recorder is not None:
+            self.recorder.write(RECORD_RESUME, self.endless is not None, self.sensitivity)
+
+    def pause_game(self):
+        self.state = "PAUSED"
+        self.selected_option = 0
+        pygame.mouse.set_visible(True)
+        pygame.event.set_grab(False)
+
+    def start_recording(self, path):
+        # Records from here until the game exits; see Recorder
+        self.recorder = Recorder(path, self.seed)
+        atexit.register(self.stop_recording)
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close(self.level_number, self.camera_pos)
+            self.recorder = None
+
+    def replay(self, records, realtime=False):
+        # Feed a recording (see read_recording) to the game in place of the player: as
+        # fast as frames render, or with realtime at the recorded pace. Returns the time
+        # each frame took and whether the end state matched (None without an END record).
+        frame_times = []
+        matches = None
+        start = time.perf_counter()
+        due = 0.0
+        for kind, values in records:
+            if kind == RECORD_RESUME:
+                endless, self.sensitivity = values
+                if endless and self.endless is None:
+                    self.start_endless()
+                elif not endless and self.endless is not None:
+                    self.stop_endless()
+                self.state = "GAME"
+            elif kind == RECORD_FRAME:
+                events, frame_ms, mx, my, bits = values
+                if not self.headless and pygame.event.get(QUIT):
+                    break
+                if realtime:
+                    due += frame_ms / 1000.0
+                    with self.profiler.scope("tick"):
+                        time.sleep(max(0.0, start + due - time.perf_counter()))
+                frame_start = time.perf_counter()
+                self.game_frame(frame_ms, events, mx, my, RecordedKeys(bits))
+                frame_times.append(time.perf_counter() - frame_start)
+            elif kind == RECORD_END:
+                level_number, *camera_pos = values
+                matches = level_number == self.level_number and camera_pos == self.camera_pos
+                if not matches:
+                    print(f"Replay diverged: ended on level {self.level_number} at {self.camera_pos}, "
+                          f"recorded level {level_number} at {camera_pos}")
+        return frame_times, matches
+
+    def handle_menus(self):
+        # One loop for the main menu, settings and pause screens. The camera doesn't move
+        # in them, so the scene is frozen into a texture on entry; the screen is redrawn
+        # only when input changes it and otherwise the loop sleeps in event.wait.
+        self.menu_background.capture(self.width, self.height, self.render_scene, self.menu_blur)
+        dirty = True
+        while self.state != "GAME":
+            if dirty:
+                self.draw_menu()
+                dirty = False
+            with self.profiler.scope("music"):
+                self.music.update()
+            with self.profiler.scope("events"):
+                events = [pygame.event.wait(MENU_IDLE_WAIT)] + pygame.event.get()
+            for event in events:
                 if event.type == QUIT:
                     pygame.quit()
                     sys.exit()
                 if event.type == VIDEORESIZE:
                     self.width, self.height = event.w, event.h
-                    glViewport(0, 0, self.width, self.height)
-                if event.type == USEREVENT:
-                    self.play_random_music()
+                    self.menu_background.capture(self.width, self.height, self.render_scene, self.menu_blur)
+                    dirty = True
+                if event.type == VIDEOEXPOSE:
+                    dirty = True
+                if event.type == MUSIC_END_EVENT:
+                    self.music.track_ended()
                 if event.type == KEYDOWN:
-                    if event.key == K_UP:
-                        self.selected_option = (self.selected_option - 1) % len(options)
-                    elif event.key == K_DOWN:
-                        self.selected_option = (self.selected_option + 1) % len(options)
-                    elif event.key == K_RETURN or event.key == K_SPACE:
-                        if self.selected_option == 0: # Resume
-                            self.state = "GAME"
-                            pygame.mouse.set_visible(False)
-                            pygame.event.set_grab(True)
-                            return
-                        elif self.selected_option == 1: # Settings
-                            self.previous_state = "PAUSED"
-                            self.state = "SETTINGS"
-                            return
-                        elif self.selected_option == 2: # Main Menu
-                            self.state = "MENU"
-                            self.save_settings()
-                            return
-                    elif event.key == K_ESCAPE:
-                        self.state = "GAME"
-                        pygame.mouse.set_visible(False)
-                        pygame.event.set_grab(True)
-                        return
+                    self.menu_key(event.key)
+                    dirty = True
 
     def draw_minimap(self):
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        glOrtho(0, self.width, self.height, 0, -1, 1)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
+        # In window pixels; what comes next sets its own projection and states
+        gl_state.projection(("window", self.width, self.height), lambda: ortho_matrix(0, self.width, self.height, 0))
         glLoadIdentity()
+        gl_state.disable(GL_DEPTH_TEST)
+        gl_state.disable(GL_FOG)
         
-        glDisable(GL_DEPTH_TEST)
-        glDisable(GL_FOG)
-        
-        # Draw background
-        size = 200
-        padding = 20
-        mx, my = self.width - size - padding, padding
-        
-        glColor4f(0, 0, 0, 0.8)
-        glBegin(GL_QUADS)
-        glVertex2f(mx, my); glVertex2f(mx+size, my)
-        glVertex2f(mx+size, my+size); glVertex2f(mx, my+size)
-        glEnd()
-        
-        # Draw maze cells
-        cell_size = size / self.maze_size
-        for y in range(self.maze_size):
-            for x in range(self.maze_size):
-                if self.maze_data[y][x] == 1:
-                    glColor3f(0.3, 0.3, 0.3)
-                    glBegin(GL_QUADS)
-                    glVertex2f(mx + x*cell_size, my + y*cell_size)
-                    glVertex2f(mx + (x+1)*cell_size, my + y*cell_size)
-                    glVertex2f(mx + (x+1)*cell_size, my + (y+1)*cell_size)
-                    glVertex2f(mx + x*cell_size, my + (y+1)*cell_size)
-                    glEnd()
-        
-        # Exit dot
-        glColor3f(0, 1, 1)
-        ex, ey = self.maze_size-1, self.maze_size-2
-        glBegin(GL_QUADS)
-        glVertex2f(mx + ex*cell_size, my + ey*cell_size)
-        glVertex2f(mx + (ex+1)*cell_size, my + ey*cell_size)
-        glVertex2f(mx + (ex+1)*cell_size, my + (ey+1)*cell_size)
-        glVertex2f(mx + ex*cell_size, my + (ey+1)*cell_size)
-        glEnd()
-
-        # Player dot
-        glColor3f(1, 0, 0)
-        px, pz = self.camera_pos[0], self.camera_pos[2]
-        glPointSize(5)
-        glBegin(GL_POINTS)
-        glVertex2f(mx + px*cell_size, my + pz*cell_size)
-        glEnd()
-        
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_FOG)
-        
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
-        glPopMatrix()
+        # The maze itself is a texture built once per level; only the player dot moves
+        mx, my = self.width - MINIMAP_SIZE - MINIMAP_PADDING, MINIMAP_PADDING
+        if self.endless is not None:
+            self.endless.draw_minimap(mx, my, MINIMAP_SIZE, self.view_pos[0], self.view_pos[2])
+        else:
+            hint = None
+            solution = self.hint_solution() if self.show_hint else None
+            if solution is not None:
+                hint = solution.path(int(round(self.view_pos[0])), int(round(self.view_pos[2])), HINT_CELLS)
+            self.minimap.draw(mx, my, MINIMAP_SIZE, self.view_pos[0], self.view_pos[2], hint)
 
     def load_settings(self):
         try:
@@ -658,6 +2977,10 @@ class Game:
                     data = json.load(f)
                     self.volume = data.get("volume", 0.3)
                     self.sensitivity = data.get("sensitivity", 0.1)
+                    self.star_count = data.get("star_count", STAR_COUNT)
+                    self.minimap_fog = data.get("minimap_fog", False)
+                    self.menu_blur = data.get("menu_blur", True)
+                    self.max_fps = data.get("max_fps", 60)
                     print("Settings loaded.")
         except Exception as e:
             print(f"Failed to load settings: {e}")
@@ -666,7 +2989,11 @@ class Game:
         try:
             data = {
                 "volume": self.volume,
-                "sensitivity": self.sensitivity
+                "sensitivity": self.sensitivity,
+                "star_count": self.star_count,
+                "minimap_fog": self.minimap_fog,
+                "menu_blur": self.menu_blur,
+                "max_fps": self.max_fps
             }
             with open(self.settings_file, 'w') as f:
                 json.dump(data, f)
@@ -674,99 +3001,170 @@ class Game:
         except Exception as e:
             print(f"Failed to save settings: {e}")
 
+    def update(self, keys):
+        # One fixed SIM_DT simulation tick with the keys held
+        collision = self.endless if self.endless is not None else self.level.collision
+        self.player.tick(keys[K_w] - keys[K_s], keys[K_d] - keys[K_a], keys[K_LSHIFT] or keys[K_RSHIFT],
+                         self.camera_rot[0], collision)
+        if self.endless is not None:
+            return # no exit, and the minimap is rebuilt with its window
+        if at_exit(self.camera_pos[0], self.camera_pos[2], self.maze_size):
+            self.advance_level()
+        self.minimap.explore(int(round(self.camera_pos[0])), int(round(self.camera_pos[2])))
+
     def run(self):
         while True:
-            if self.state == "MENU":
-                self.handle_menu()
-            elif self.state == "SETTINGS":
-                self.handle_settings()
-            elif self.state == "PAUSED":
-                self.handle_pause()
+            if self.state in ("MENU", "SETTINGS", "PAUSED"):
+                self.handle_menus()
             elif self.state == "GAME":
-                dt = self.clock.tick(60) / 1000.0
+                with self.profiler.scope("tick"):
+                    frame_ms = self.clock.tick(self.max_fps)
                 
-                for event in pygame.event.get():
+                with self.profiler.scope("music"):
+                    self.music.update()
+                with self.profiler.scope("events"):
+                    events = pygame.event.get()
+                pressed = 0 # EVENT_* bits of the game keys pressed this frame
+                for event in events:
                     if event.type == QUIT:
                         pygame.quit()
                         sys.exit()
                     if event.type == VIDEORESIZE:
                         self.width, self.height = event.w, event.h
-                        glViewport(0, 0, self.width, self.height)
-                    if event.type == USEREVENT:
-                        self.play_random_music()
+                        gl_state.viewport(0, 0, self.width, self.height)
+                    if event.type == MUSIC_END_EVENT:
+                        self.music.track_ended()
                     if event.type == KEYDOWN:
+                        pressed |= EVENT_KEYS.get(event.key, 0)
                         if event.key == K_ESCAPE:
-                            self.state = "PAUSED"
-                            self.selected_option = 0
-                            pygame.mouse.set_visible(True)
-                            pygame.event.set_grab(False)
-                        if event.key == K_SPACE and not self.is_jumping:
-                            self.velocity_y = self.jump_force
-                            self.is_jumping = True
-
-                self.velocity_y -= self.gravity
-                self.camera_pos[1] += self.velocity_y
-                
-                if self.camera_pos[1] <= self.ground_level:
-                    self.camera_pos[1] = self.ground_level
-                    self.velocity_y = 0
-                    self.is_jumping = False
+                            self.pause_game()
 
                 mx, my = pygame.mouse.get_rel()
-                self.camera_rot[0] += mx * self.sensitivity
-                self.camera_rot[1] += my * self.sensitivity
-                self.camera_rot[1] = max(-80, min(80, self.camera_rot[1]))
-                
                 keys = pygame.key.get_pressed()
-                current_speed = RUN_SPEED if keys[K_LSHIFT] or keys[K_RSHIFT] else NORMAL_SPEED
-                
-                move_vec = [0, 0]
-                if keys[K_w]: move_vec[1] += 1
-                if keys[K_s]: move_vec[1] -= 1
-                if keys[K_a]: move_vec[0] -= 1
-                if keys[K_d]: move_vec[0] += 1
-                
-                if move_vec != [0, 0]:
-                    yaw_rad = math.radians(self.camera_rot[0])
-                    forward_x = math.sin(yaw_rad)
-                    forward_z = -math.cos(yaw_rad)
-                    side_x = math.cos(yaw_rad)
-                    side_z = math.sin(yaw_rad)
-                    
-                    dx = (move_vec[1] * forward_x + move_vec[0] * side_x) * current_speed
-                    dz = (move_vec[1] * forward_z + move_vec[0] * side_z) * current_speed
-                    
-                    # --- Collision ---
-                    buff = 0.3 
-                    def is_walkable(nx, nz):
-                        if nx < -0.5 or nz < -0.5 or nx > self.maze_size - 0.5 or nz > self.maze_size - 0.5:
-                            return False
-                        grid_x = int(round(nx))
-                        grid_z = int(round(nz))
-                        if 0 <= grid_x < self.maze_size and 0 <= grid_z < self.maze_size:
-                            if self.maze_data[grid_z][grid_x] == 1:
-                                return False
-                        return True
-
-                    if is_walkable(self.camera_pos[0] + dx + (buff if dx > 0 else -buff), self.camera_pos[2]):
-                        self.camera_pos[0] += dx
-                    
-                    if is_walkable(self.camera_pos[0], self.camera_pos[2] + dz + (buff if dz > 0 else -buff)):
-                        self.camera_pos[2] += dz
-
-                dist_to_exit = math.sqrt((self.camera_pos[0] - (self.maze_size-1))**2 + (self.camera_pos[2] - (self.maze_size-2))**2)
-                if dist_to_exit < 1.0:
-                    self.maze_size += 4
-                    self.generate_level()
-
-                self.render_scene()
-                
-                # Mini-map
-                if keys[K_TAB]:
-                    self.draw_minimap()
-                    
-                pygame.display.flip()
+                if self.recorder is not None:
+                    self.recorder.frame(pressed, frame_ms, mx, my, keys)
+                self.game_frame(frame_ms, pressed, mx, my, keys)
+
+    def game_frame(self, frame_ms, pressed, mx, my, keys):
+        # Everything a GAME frame does with its input, live or replayed
+        start = time.perf_counter()
+        if pressed & EVENT_JUMP:
+            self.player.jump()
+        if pressed & EVENT_CULL_STATS:
+            self.show_cull_stats = not self.show_cull_stats
+        if pressed & EVENT_HINT:
+            self.show_hint = not self.show_hint
+        if pressed & EVENT_PROFILER:
+            self.show_profiler = not self.show_profiler
+            # Keep profiling while a trace is being written or GL calls are budgeted
+            self.profiler.set_enabled(self.show_profiler or bool(self.profiler.trace_path)
+                                      or self.profiler.gl_budget is not None)
+
+        self.camera_rot[0] += mx * self.sensitivity
+        self.camera_rot[1] += my * self.sensitivity
+        self.camera_rot[1] = max(-80, min(80, self.camera_rot[1]))
+        
+        # Fixed-step simulation: as many SIM_DT ticks as real time has passed
+        self.sim_time += min(frame_ms / 1000.0, MAX_FRAME_TIME)
+        with self.profiler.scope("simulate"):
+            while self.sim_time >= SIM_DT:
+                self.sim_time -= SIM_DT
+                self.update(keys)
+
+        self.render_scene(self.sim_time / SIM_DT)
+        
+        # Mini-map
+        if keys[K_TAB]:
+            with self.profiler.scope("minimap"):
+                self.draw_minimap()
+        if self.show_cull_stats:
+            self.draw_cull_stats()
+        if self.show_hint and self.endless is None:
+            self.draw_hint()
+        if self.show_profiler:
+            self.draw_profiler_hud()
+            
+        self.present()
+        # The frame's own time, not the fps cap's sleep in clock.tick
+        self.quality.update((time.perf_counter() - start) * 1000.0)
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="Laze - OpenGL Edition")
+    parser.add_argument("--profile", action="store_true", help="start with the frame profiler HUD (F2) on")
+    parser.add_argument("--gpu-timers", action="store_true", help="also time each stage on the GPU")
+    parser.add_argument("--trace", metavar="PATH", help="write per-frame stage timings to a .csv or .json file")
+    parser.add_argument("--gl-budget", type=int, metavar="N", help="report frames making more than N GL calls")
+    parser.add_argument("--release", action="store_true",
+                        help="skip PyOpenGL's error checking and logging on every GL call (also LAZE_RELEASE=1)")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="print the time to the first frame by phase, then exit")
+    parser.add_argument("--seed", type=int, help="session seed; the same seed plays the same levels")
+    parser.add_argument("--bake-levels", type=int, metavar="N",
+                        help="write levels 1..N of the seed to a level pack in levels/ and exit")
+    parser.add_argument("--playtest", type=int, metavar="N",
+                        help="play levels 1..N with bots and print time-to-exit per level size, then exit")
+    parser.add_argument("--bots", type=int, default=1000, help="random walkers per maze in --playtest")
+    parser.add_argument("--mazes", type=int, default=8, help="mazes (sessions) per level in --playtest")
+    parser.add_argument("--shaders", action="store_true",
+                        help="draw the walls with the instanced GLSL shader (compare with benchmarks.py --shaders)")
+    parser.add_argument("--mesh-workers", type=int, metavar="N",
+                        help="processes to mesh big levels on (default: one per core, 0: none)")
+    parser.add_argument("--quality", type=int, choices=range(len(QUALITY_LEVELS)), metavar="LEVEL",
+                        help=f"pin the render quality (0 best .. {len(QUALITY_LEVELS) - 1}) instead of adapting it")
+    parser.add_argument("--record", metavar="PATH", help="record the session's input to a file")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recorded session, then exit")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded pace, not flat out")
+    args = parser.parse_args()
+    if args.playtest:
+        seed = args.seed if args.seed is not None else random.getrandbits(32)
+        start = time.perf_counter()
+        rows = playtest(seed, args.playtest, args.mazes, args.bots, create_mesh_pool(args.mesh_workers))
+        print(f"Seconds to the exit at {BOT_SPEED:.1f} cells/s, {args.mazes} mazes from seed {seed}, "
+              f"{args.bots} walkers each ({time.perf_counter() - start:.1f} s):")
+        print(f"{'level':>5} {'size':>5} {'shortest':>9} {'right hand':>11} {'left hand':>10} "
+              f"{'walker p10':>11} {'p50':>8} {'p90':>8} {'done':>5} {'growth':>7} "
+              f"{'dead ends':>9} {'branching':>9} {'decisions':>9}")
+        previous = None
+        for row in rows:
+            walker = row["walker"]
+            p50 = walker.get("p50_s", float("nan"))
+            growth = f"{p50 / previous:.2f}x" if previous else ""
+            print(f"{row['number']:>5} {row['size']:>5} {row['shortest_s']:>9.1f} {row['right hand']['p50_s']:>11.1f} "
+                  f"{row['left hand']['p50_s']:>10.1f} {walker.get('p10_s', float('nan')):>11.1f} {p50:>8.1f} "
+                  f"{walker.get('p90_s', float('nan')):>8.1f} {walker['finished']:>5.0%} {growth:>7} "
+                  f"{row['dead_ends']:>9.1f} {row['branching']:>9.2f} {row['decisions']:>9.1f}")
+            previous = p50
+        sys.exit()
+    if args.bake_levels:
+        seed = args.seed if args.seed is not None else random.getrandbits(32)
+        write_level_pack(level_pack_path(seed), seed, args.bake_levels, pool=create_mesh_pool(args.mesh_workers))
+        print(f"Wrote {level_pack_path(seed)} (seed {seed})")
+        sys.exit()
+    startup = StartupTimer(IMPORT_START)
+    startup.mark("imports")
+    profiler = Profiler(gpu=args.gpu_timers, trace_path=args.trace, gl_budget=args.gl_budget)
+    recording = read_recording(args.replay) if args.replay else None
+    seed = recording[0]["seed"] if recording else args.seed
+    game = Game(profiler=profiler, seed=seed, startup=startup, shaders=args.shaders,
+                mesh_workers=args.mesh_workers, quality=args.quality)
+    game.measure_startup = args.measure_startup
+    if args.profile or args.trace or args.gl_budget is not None:
+        game.show_profiler = args.profile
+        profiler.set_enabled(True)
+    if recording:
+        header, records = recording
+        if header["sim_rate"] != SIM_RATE:
+            print(f"Recorded at {header['sim_rate']} ticks/s, replaying at {SIM_RATE}: it will diverge")
+        start = time.perf_counter()
+        frame_times, matches = game.replay(records, args.realtime)
+        p50, p95, p99 = np.percentile(np.array(frame_times) * 1000.0, (50, 95, 99)) if frame_times else (0, 0, 0)
+        recorded = sum(values[1] for kind, values in records if kind == RECORD_FRAME) / 1000.0
+        print(f"Replayed {len(frame_times)} frames ({recorded:.1f} s recorded) in {time.perf_counter() - start:.1f} s; "
+              f"frame ms p50 {p50:.2f}, p95 {p95:.2f}, p99 {p99:.2f}; "
+              f"end state {'matches' if matches else 'unchecked' if matches is None else 'differs'}")
+        profiler.close()
+        pygame.quit()
+        sys.exit()
+    if args.record:
+        game.start_recording(args.record)
     game.run()
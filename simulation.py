@@ -0,0 +1,837 @@
+# Laze's simulation core: maze generation, collision, the way to the exit and the
+# movement/bot simulation. No pygame or OpenGL here, so play-testing and process pool
+# workers only need numpy.
+import heapq
+import itertools
+import math
+import random
+from functools import cached_property
+
+import numpy as np
+
+# What main_opengl takes with `from simulation import *`: the public API, not numpy & co.
+__all__ = [
+    "NORMAL_SPEED", "RUN_SPEED", "TUNING_RATE", "SIM_RATE", "SIM_DT",
+    "BACKTRACKER_MAX_CELLS", "TILE", "TILE_LIBRARY", "generate_maze", "carve_maze", "generate_maze_backtracker",
+    "FIRST_LEVEL_SIZE", "LEVEL_SIZE_STEP", "level_size", "level_rng",
+    "PLAYER_RADIUS", "MAX_SUBSTEP", "WALL_LEFT", "WALL_RIGHT", "WALL_UP", "WALL_DOWN", "CollisionGrid",
+    "HINT_CELLS", "ExitField", "exit_distances", "CorridorGraph",
+    "GRAVITY", "JUMP_FORCE", "EYE_LEVEL", "EXIT_RADIUS", "exit_cell", "at_exit", "PlayerBody",
+    "BOT_RIGHT_HAND", "BOT_LEFT_HAND", "BOT_WALKER", "BOT_NAMES", "BOT_SPEED", "BotSwarm",
+    "PLAYTEST_MAX_STEPS", "playtest_level", "playtest",
+]
+
+# --- Settings ---
+NORMAL_SPEED = 0.07 # units per 60 Hz frame, like the gravity/jump tuning in PlayerBody
+RUN_SPEED = 0.15
+TUNING_RATE = 60    # the per-frame values above were tuned at this frame rate
+SIM_RATE = 120      # fixed simulation ticks per second, independent of the render rate
+SIM_DT = 1.0 / SIM_RATE
+
+# --- Maze Generation (Procedural/Random) ---
+# Mazes are numpy uint8 grids indexed [y, x]: 1 = wall, 0 = floor. Cells sit on odd
+# coordinates, the even rows/columns between them are the walls that get carved.
+BACKTRACKER_MAX_CELLS = 128 * 128  # above this the tiled generator takes over
+TILE = 16                          # cells per tile side for the tiled generator
+TILE_LIBRARY = 256                 # distinct tiles carved per maze (x8 symmetries)
+_DIR_ORDERS = np.array(list(itertools.permutations(range(4))), dtype=np.intp)
+
+def generate_maze(width, height, rng=None):
+    if width % 2 == 0: width += 1
+    if height % 2 == 0: height += 1
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    maze = carve_maze((width - 1) // 2, (height - 1) // 2, rng)
+    maze[1, 0] = 0
+    maze[height-2, width-1] = 0
+    return maze
+
+def carve_maze(cells_w, cells_h, rng):
+    if cells_w * cells_h <= BACKTRACKER_MAX_CELLS:
+        return _carve_backtracker(cells_w, cells_h, rng)
+    return _carve_tiled(cells_w, cells_h, rng)
+
+def _carve_backtracker(cells_w, cells_h, rng):
+    # Same recursive backtracker as always, on a flat bytearray with a zero (visited)
+    # border column and rows so neighbour lookups need no bounds checks
+    w, h = 2 * cells_w + 1, 2 * cells_h + 1
+    stride = w + 1
+    maze = bytearray(stride) + (b'\x01' * w + b'\x00') * h + bytearray(stride)
+    shuffle = random.Random(int(rng.integers(1 << 62))).shuffle
+    steps = [2, -2, 2 * stride, -2 * stride]
+    start = 2 * stride + 1
+    maze[start] = 0
+    stack = [start]
+    while stack:
+        c = stack[-1]
+        shuffle(steps)
+        for s in steps:
+            n = c + s
+            if maze[n]:
+                maze[c + s // 2] = 0
+                maze[n] = 0
+                stack.append(n)
+                break
+        else:
+            stack.pop()
+    return np.frombuffer(maze, dtype=np.uint8).reshape(h + 2, stride)[1:-1, :w].copy()
+
+def _carve_tiles(blocked, rng):
+    # Batched backtracker: one independent DFS per TILE x TILE block, all blocks
+    # stepped together. Cells set in `blocked` count as visited from the start.
+    nb, k = blocked.shape[0], TILE * TILE
+    idx = np.arange(k)
+    lx, ly = idx % TILE, idx // TILE
+    # Neighbour table, index k is a sentinel "outside the tile" slot that is always visited
+    nbr = np.stack([np.where(ly > 0, idx - TILE, k), np.where(lx < TILE - 1, idx + 1, k),
+                    np.where(ly < TILE - 1, idx + TILE, k), np.where(lx > 0, idx - 1, k)], axis=1)
+    visited = np.ones((nb, k + 1), dtype=bool)
+    visited[:, :k] = blocked.reshape(nb, k)
+    visited[:, 0] = True
+    # A fixed random direction order per cell picks uniformly among the unvisited neighbours
+    order = _DIR_ORDERS[rng.integers(0, len(_DIR_ORDERS), size=(nb, k))]
+    candidates = np.take_along_axis(np.broadcast_to(nbr, (nb, k, 4)), order, axis=2)
+    flat_visited = visited.ravel()
+    parent = np.full((nb, k), -1, dtype=np.intp)
+    stack = np.zeros((nb, k), dtype=np.intp)
+    sp = np.ones(nb, dtype=np.intp)
+    live = np.arange(nb)
+    while live.size:
+        top = stack[live, sp[live] - 1]
+        cand = candidates[live, top]
+        free = ~flat_visited[cand + live[:, None] * (k + 1)]
+        has = free.any(axis=1)
+        first = free.argmax(axis=1)
+        adv = live[has]
+        cell = cand[has, first[has]]
+        flat_visited[adv * (k + 1) + cell] = True
+        parent[adv, cell] = top[has]
+        stack[adv, sp[adv]] = cell
+        sp[adv] += 1
+        sp[live[~has]] -= 1
+        live = live[sp[live] > 0]
+
+    # Parent links -> (2*TILE-1)^2 wall tiles
+    tiles = np.ones((nb, 2 * TILE - 1, 2 * TILE - 1), dtype=np.uint8)
+    b, c = np.nonzero(~blocked.reshape(nb, k))
+    tiles[b, 2 * ly[c], 2 * lx[c]] = 0
+    b, c = np.nonzero(parent >= 0)
+    p = parent[b, c]
+    tiles[b, ly[c] + ly[p], lx[c] + lx[p]] = 0
+    return tiles
+
+def _carve_tiled(cells_w, cells_h, rng):
+    # Large mazes: a coarse maze over TILE x TILE blocks (carved recursively), each block
+    # filled with a backtracker tile from a small batched library, and one doorway cut
+    # through the shared wall for every coarse passage. Still a perfect maze.
+    bw, bh = -(-cells_w // TILE), -(-cells_h // TILE)
+    coarse = carve_maze(bw, bh, rng)
+
+    # Tiles that stick out past the right/bottom edge get their own carve with those cells blocked
+    outside = (np.arange(bw * TILE)[None, :] >= cells_w) | (np.arange(bh * TILE)[:, None] >= cells_h)
+    blocks = outside.reshape(bh, TILE, bw, TILE).swapaxes(1, 2).reshape(bh * bw, TILE, TILE)
+    partial = np.flatnonzero(blocks.reshape(bh * bw, -1).any(axis=1))
+
+    library = _carve_tiles(np.zeros((TILE_LIBRARY, TILE, TILE), dtype=bool), rng)
+    library = np.concatenate([np.rot90(library, r, axes=(1, 2)) for r in range(4)])
+    library = np.concatenate([library, library[:, :, ::-1]])
+
+    grid = np.ones((bh * bw, 2 * TILE, 2 * TILE), dtype=np.uint8)
+    grid[:, :-1, :-1] = library[rng.integers(0, len(library), size=bh * bw)]
+    if partial.size:
+        grid[partial, :-1, :-1] = _carve_tiles(blocks[partial], rng)
+
+    maze = np.ones((2 * bh * TILE + 1, 2 * bw * TILE + 1), dtype=np.uint8)
+    maze[1:, 1:] = grid.reshape(bh, bw, 2 * TILE, 2 * TILE).swapaxes(1, 2).reshape(2 * bh * TILE, 2 * bw * TILE)
+
+    # Doorways: horizontal coarse passages open a random row of the shared wall column,
+    # vertical ones a random column of the shared wall row
+    by, bx = np.nonzero(coarse[1:-1:2, 2:-1:2] == 0)
+    rows = np.minimum(TILE, cells_h - by * TILE)
+    r = (rng.random(by.size) * rows).astype(np.intp)
+    maze[2 * (by * TILE + r) + 1, 2 * TILE * (bx + 1)] = 0
+    by, bx = np.nonzero(coarse[2:-1:2, 1:-1:2] == 0)
+    cols = np.minimum(TILE, cells_w - bx * TILE)
+    r = (rng.random(bx.size) * cols).astype(np.intp)
+    maze[2 * TILE * (by + 1), 2 * (bx * TILE + r) + 1] = 0
+    return np.ascontiguousarray(maze[:2 * cells_h + 1, :2 * cells_w + 1])
+
+# Original list-of-lists generator, kept as the reference for benchmarks.py
+def generate_maze_backtracker(width, height):
+    if width % 2 == 0: width += 1
+    if height % 2 == 0: height += 1
+    maze = [[1 for _ in range(width)] for _ in range(height)]
+    stack = [(1, 1)]
+    maze[1][1] = 0
+    while stack:
+        x, y = stack[-1]
+        dirs = [(0, 2), (0, -2), (2, 0), (-2, 0)]
+        random.shuffle(dirs)
+        found = False
+        for dx, dy in dirs:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and maze[ny][nx] == 1:
+                maze[y + dy // 2][x + dx // 2] = 0
+                maze[ny][nx] = 0
+                stack.append((nx, ny))
+                found = True
+                break
+        if not found: stack.pop()
+    maze[1][0] = 0 
+    maze[height-2][width-1] = 0 
+    return maze
+
+# --- Seeded Levels ---
+# Level N of a session is fully determined by the session seed.
+FIRST_LEVEL_SIZE = 11
+LEVEL_SIZE_STEP = 4
+
+def level_size(number):
+    return FIRST_LEVEL_SIZE + LEVEL_SIZE_STEP * (number - 1)
+
+def level_rng(seed, number):
+    return np.random.default_rng((seed, number))
+
+# --- Collision ---
+# The player is a circle of PLAYER_RADIUS on the floor plane; wall cell (x, z) is the
+# square [x - 0.5, x + 0.5] x [z - 0.5, z + 0.5]. Since the radius is under half a cell,
+# a circle centred in a floor cell can only touch that cell's 8 neighbours.
+PLAYER_RADIUS = 0.3
+MAX_SUBSTEP = 0.25 # < PLAYER_RADIUS, so one substep can never carry the centre into a wall
+# Neighbour bits of CollisionGrid.masks
+WALL_LEFT, WALL_RIGHT, WALL_UP, WALL_DOWN = 1, 2, 4, 8
+# Diagonal walls, only flagged when both walls sharing the corner are open (otherwise the
+# edge clamp already keeps the circle away): (bit, dx, dz) of the corner point
+_CORNERS = ((16, -0.5, -0.5), (32, 0.5, -0.5), (64, -0.5, 0.5), (128, 0.5, 0.5))
+
+class CollisionGrid:
+    # Per-level collision data: one byte per cell saying which neighbours are walls, which
+    # gives the free-space bounds of a circle in that cell. Pure Python/numpy, no GL.
+    def __init__(self, maze, radius=PLAYER_RADIUS):
+        h, w = maze.shape
+        solid = np.pad(maze != 0, 1, constant_values=True) # outside the grid is wall
+        left, right = solid[1:-1, :-2], solid[1:-1, 2:]
+        up, down = solid[:-2, 1:-1], solid[2:, 1:-1]
+        masks = (left * WALL_LEFT | right * WALL_RIGHT | up * WALL_UP | down * WALL_DOWN |
+                 (solid[:-2, :-2] & ~left & ~up) * 16 | (solid[:-2, 2:] & ~right & ~up) * 32 |
+                 (solid[2:, :-2] & ~left & ~down) * 64 | (solid[2:, 2:] & ~right & ~down) * 128)
+        self.masks = np.ascontiguousarray(masks, dtype=np.uint8)
+        self.solid = np.ascontiguousarray(maze != 0)
+        # memoryviews index straight to Python ints, far cheaper than numpy scalars
+        self.mask_view = memoryview(self.masks.reshape(-1))
+        self.solid_view = memoryview(self.solid.view(np.uint8).reshape(-1))
+        self.width, self.height = w, h
+        self.radius = radius
+
+    def cell(self, x, z):
+        # Flat index of the cell containing (x, z), or -1 outside the grid
+        ix, iz = math.floor(x + 0.5), math.floor(z + 0.5)
+        if 0 <= ix < self.width and 0 <= iz < self.height:
+            return iz * self.width + ix
+        return -1
+
+    def resolve(self, x, z):
+        # Push a circle centred in a floor cell out of the walls around it. Only the
+        # penetrating component is removed, so movement into a wall turns into sliding.
+        index = self.cell(x, z)
+        mask = self.mask_view[index]
+        if not mask:
+            return x, z
+        r = self.radius
+        cx, cz = index % self.width, index // self.width
+        if mask & WALL_LEFT: x = max(x, cx - 0.5 + r)
+        if mask & WALL_RIGHT: x = min(x, cx + 0.5 - r)
+        if mask & WALL_UP: z = max(z, cz - 0.5 + r)
+        if mask & WALL_DOWN: z = min(z, cz + 0.5 - r)
+        for bit, ox, oz in _CORNERS:
+            if mask & bit:
+                vx, vz = x - (cx + ox), z - (cz + oz)
+                d2 = vx * vx + vz * vz
+                if d2 < r * r:
+                    d = math.sqrt(d2)
+                    if d == 0: # exactly on the corner: back off diagonally
+                        vx, vz, d = -ox, -oz, math.hypot(ox, oz)
+                    x = cx + ox + vx / d * r
+                    z = cz + oz + vz / d * r
+        return x, z
+
+    def move(self, x, z, dx, dz):
+        # Swept move of a circle from a valid position: substeps short enough that it
+        # can't tunnel, each resolved against the walls. Returns the new (x, z).
+        steps = max(1, math.ceil(math.hypot(dx, dz) / MAX_SUBSTEP))
+        sx, sz = dx / steps, dz / steps
+        for _ in range(steps):
+            nx, nz = x + sx, z + sz
+            index = self.cell(nx, nz)
+            if index < 0 or self.solid_view[index]:
+                break # only possible from an invalid start; stay put
+            x, z = self.resolve(nx, nz)
+        return x, z
+
+    def is_free(self, x, z):
+        # True if a circle centred at (x, z) touches no wall
+        index = self.cell(x, z)
+        return index >= 0 and not self.solid_view[index] and self.resolve(x, z) == (x, z)
+
+# --- Solution ---
+# Steps from every floor cell to the exit, for the hint. Generated mazes are perfect,
+# so the way from the entrance to the exit is up to O(cells) long and neither a
+# level-synchronous BFS nor a Python one over the cells is cheap on big levels; the
+# distances come from the level's CorridorGraph instead (see exit_distances), all in
+# numpy passes that release the GIL while the render thread runs.
+_STEPS = ((1, 0), (0, 1), (-1, 0), (0, -1)) # (dx, dz) per hint direction
+HINT_CELLS = 40 # how much of the way to the exit the minimap hint shows
+
+class ExitField:
+    def __init__(self, maze, graph=None):
+        h, w = maze.shape
+        self.exit = (w - 1, h - 2)
+        self.distance = exit_distances(maze, self.exit, graph)
+        self.width, self.height = w, h
+        self.view = memoryview(self.distance.reshape(-1))
+        self.solution_length = self.steps(1, 1) # from the spawn cell
+
+    def steps(self, x, z):
+        # Steps from cell (x, z) to the exit, -1 for walls and cells outside the grid
+        if 0 <= x < self.width and 0 <= z < self.height:
+            return self.view[z * self.width + x]
+        return -1
+
+    def hint(self, x, z):
+        # (dx, dz) of the neighbour one step closer to the exit, None at the exit or off the path
+        d = self.steps(x, z)
+        if d <= 0:
+            return None
+        for dx, dz in _STEPS:
+            if self.steps(x + dx, z + dz) == d - 1:
+                return dx, dz
+        return None
+
+    def path(self, x, z, limit=None):
+        # Cells from (x, z) towards the exit as an (N, 2) int32 array of (x, z), at most
+        # limit + 1 of them; empty if (x, z) can't reach the exit
+        d = self.steps(x, z)
+        if d < 0:
+            return np.zeros((0, 2), dtype=np.int32)
+        count = d if limit is None else min(d, limit)
+        w, view = self.width, self.view
+        c = z * w + x
+        cells = [c]
+        # Flat neighbours can wrap a row, but only the exit and the entrance touch the
+        # left/right edge and the wrapped cells next to them are walls
+        for want in range(d - 1, d - 1 - count, -1):
+            for n in (c + 1, c + w, c - 1, c - w):
+                if 0 <= n < len(view) and view[n] == want:
+                    break
+            cells.append(n)
+            c = n
+        cells = np.array(cells, dtype=np.int32)
+        return np.column_stack((cells % w, cells // w))
+
+def exit_distances(maze, goal, graph=None):
+    # (h, w) int32 steps to the goal cell (x, z) along floor cells, -1 where unreachable.
+    # Node steps come from the corridor graph, corridor cells take the nearer end of theirs.
+    if graph is None:
+        graph = CorridorGraph(maze)
+    h, w = maze.shape
+    far = np.iinfo(np.int32).max
+    distance = np.full(h * w, far, dtype=np.int64)
+    node_steps = np.full(graph.node_count, far, dtype=np.int64)
+    starts = graph.locate(*goal)
+    for node, d in starts:
+        if graph.edge_count == graph.node_count - 1: # a tree, as generated mazes are
+            depth = graph.depths(node)
+        else:
+            depth = np.full(graph.node_count, -1, dtype=np.int64)
+            for other, steps in graph._search([(node, 0)])[0].items():
+                depth[other] = steps
+        node_steps = np.where(depth >= 0, np.minimum(node_steps, depth + d), node_steps)
+    distance[graph.node_cells] = node_steps
+    corridor = np.flatnonzero(graph.cell_edge >= 0)
+    edge = graph.cell_edge[corridor]
+    offset = graph.cell_offset[corridor].astype(np.int64)
+    a, b = node_steps[graph.edge_nodes[edge, 0]], node_steps[graph.edge_nodes[edge, 1]]
+    distance[corridor] = np.minimum(a + offset, b + graph.edge_length[edge] - offset)
+    gx, gz = goal
+    goal_edge = graph.cell_edge[gz * w + gx] if starts else -1
+    if goal_edge >= 0: # the rest of the goal's own corridor is reached along it
+        same = edge == goal_edge
+        distance[corridor[same]] = np.abs(offset[same] - graph.cell_offset[gz * w + gx])
+    return np.where(distance >= far, -1, distance).astype(np.int32).reshape(h, w)
+
+# --- Corridor Graph ---
+# A perfect maze is mostly corridors, so each level also gets a graph of its junctions
+# and dead ends (nodes: floor cells without exactly two open neighbours) joined by the
+# corridors between them (edges, weighted by length in steps). cell_edge/cell_offset
+# place every corridor cell on its edge, so path and proximity queries from any cell
+# search the graph instead of the grid. Built with numpy pointer jumping: log2 of the
+# longest corridor passes, not one per cell.
+_GRAPH_DIRS = ((1, 0), (0, 1), (-1, 0), (0, -1)) # (dx, dz): right, down, left, up, as in exit_distances
+_GRAPH_OPEN = np.array([[mask >> d & 1 for d in range(4)] for mask in range(16)], dtype=bool)
+_GRAPH_DEGREE = _GRAPH_OPEN.sum(axis=1).astype(np.int8)
+_GRAPH_WAYS = np.array([([d for d in range(4) if mask >> d & 1] + [0, 0])[:2] for mask in range(16)],
+                       dtype=np.int8) # first two open directions
+
+_RULER_SPACING = 32 # every so many states also cuts its chain in _pointer_jump
+
+def _pointer_double(last, hops):
+    # Follows every chain of last (state -> next state, ends are fixed points) to its end,
+    # adding up hops on the way (the end's own not included), in place. Each pass every
+    # state still walking jumps to where its next state points: log2(longest chain)
+    # passes, each over the states not at an end yet. Cheap for short chains (corridors).
+    at_end = last == np.arange(len(last))
+    todo = np.flatnonzero(~at_end[last])
+    for _ in range(len(last).bit_length() + 1): # closed loops never settle
+        if not len(todo):
+            break
+        following = last[todo]
+        hops[todo] += hops[following]
+        following = last[following]
+        last[todo] = following
+        todo = todo[~at_end[following]]
+
+def _pointer_jump(last, hops):
+    # Same as _pointer_double, for long chains (an Euler tour), which doubling would pass
+    # over log2(length) times in full. Chains are cut at rulers - chain heads, ends and
+    # every _RULER_SPACING-th state - and all rulers walk to the next ruler in lock step;
+    # then only the rulers are doubled, and each state adds up its ruler's result.
+    n = len(last)
+    following = last.copy()
+    ends = following == np.arange(n)
+    is_ruler = ends | (np.bincount(following[~ends], minlength=n) == 0)
+    is_ruler[::_RULER_SPACING] = True
+    rulers = np.flatnonzero(is_ruler)
+    ruler_index = np.full(n, -1, dtype=np.int64)
+    ruler_index[rulers] = np.arange(len(rulers))
+    # Walk from every ruler to the next one, noting each state's ruler and the hops so far
+    next_ruler = np.arange(len(rulers))
+    gap = np.zeros(len(rulers), dtype=hops.dtype)
+    owner = np.full(n, -1, dtype=np.int64)
+    before = np.zeros(n, dtype=hops.dtype)
+    walker = np.flatnonzero(~ends[rulers])
+    cell, total = following[rulers[walker]], hops[rulers[walker]]
+    while len(walker):
+        arrived = is_ruler[cell]
+        next_ruler[walker[arrived]] = ruler_index[cell[arrived]]
+        gap[walker[arrived]] = total[arrived]
+        walker, cell, total = walker[~arrived], cell[~arrived], total[~arrived]
+        owner[cell], before[cell] = walker, total
+        total = total + hops[cell]
+        cell = following[cell]
+    _pointer_double(next_ruler, gap)
+    last[rulers], hops[rulers] = rulers[next_ruler], gap
+    walked = np.flatnonzero(owner >= 0) # states on a loop without a ruler stay as they were
+    last[walked] = rulers[next_ruler[owner[walked]]]
+    hops[walked] = gap[owner[walked]] - before[walked]
+
+class CorridorGraph:
+    def __init__(self, maze):
+        h, w = maze.shape
+        self.width, self.height = w, h
+        floor = np.pad(maze == 0, 1) # outside the grid is wall
+        open_bits = np.zeros((h, w), dtype=np.uint8)
+        for d, (dx, dz) in enumerate(_GRAPH_DIRS):
+            open_bits |= floor[1 + dz:h + 1 + dz, 1 + dx:w + 1 + dx].astype(np.uint8) << d
+        open_bits = np.where(maze == 0, open_bits, 0).reshape(-1)
+        degree = _GRAPH_DEGREE[open_bits]
+        offsets = np.array([dz * w + dx for dx, dz in _GRAPH_DIRS], dtype=np.int32)
+        # Connected mazes with an opening always have a node; cells of a closed loop of
+        # corridor elsewhere are left off the graph
+        node_cells = np.flatnonzero((open_bits != 0) & (degree != 2)).astype(np.int32)
+        corridor_cells = np.flatnonzero(degree == 2).astype(np.int32)
+        self.node_cells = node_cells
+        self.cell_node = np.full(h * w, -1, dtype=np.int32)
+        self.cell_node[node_cells] = np.arange(len(node_cells), dtype=np.int32)
+        corridor_index = np.full(h * w, -1, dtype=np.int32)
+        corridor_index[corridor_cells] = np.arange(len(corridor_cells), dtype=np.int32)
+
+        # Corridor states: 2k + j leaves corridor cell k by the j-th of its two open directions
+        first_way = _GRAPH_WAYS[:, 0][open_bits] # per cell
+        state_dir = _GRAPH_WAYS[open_bits[corridor_cells]].reshape(-1)
+        state_cell = np.repeat(corridor_cells, 2)
+        target = state_cell + offsets[state_dir]
+        k = corridor_index[target]
+        ends = k < 0 # steps onto a node
+        # Entering a corridor cell, leave by the way that doesn't lead back
+        back = (state_dir + 2) % 4
+        last = np.where(ends, np.arange(len(state_dir), dtype=np.int32),
+                        2 * k + (first_way[target] == back)).astype(np.int32)
+        hops = (~ends).astype(np.int32)
+        _pointer_double(last, hops)
+
+        # Edges, keyed by the smaller of the two node-side ways out (cell * 4 + direction);
+        # the keys come out of nonzero already sorted
+        out_node, out_dir = np.nonzero(_GRAPH_OPEN[open_bits[node_cells]])
+        out_cell = node_cells[out_node]
+        out_key = out_cell.astype(np.int64) * 4 + out_dir
+        first = out_cell + offsets[out_dir]
+        via = corridor_index[first]
+        direct = via < 0 # two nodes side by side
+        via = np.maximum(via, 0)
+        state = 2 * via + (first_way[first] == (out_dir + 2) % 4) # the corridor state heading away from the node
+        end = last[state] # and where it stops, next to the far node
+        far_cell = np.where(direct, first, state_cell[end] + offsets[state_dir[end]])
+        far_dir = np.where(direct, out_dir, state_dir[end])
+        keep = out_key < far_cell.astype(np.int64) * 4 + (far_dir + 2) % 4
+        self.edge_nodes = np.column_stack((out_node[keep], self.cell_node[far_cell[keep]])).astype(np.int32)
+        self.edge_length = np.where(direct, 1, hops[state] + 2)[keep].astype(np.int32)
+        self.edge_dir = out_dir[keep].astype(np.int8) # way out of the first node
+
+        # Every corridor cell's edge and its steps from the edge's first node, through the
+        # states its two walks stop at
+        edge_ids = np.arange(len(self.edge_length), dtype=np.int32)
+        corridor = keep & ~direct
+        stop_edge = np.zeros(len(state_dir), dtype=np.int32)
+        stop_first = np.zeros(len(state_dir), dtype=bool)
+        stop_edge[end[corridor]] = edge_ids[~direct[keep]]
+        stop_edge[state[corridor] ^ 1] = edge_ids[~direct[keep]]
+        stop_first[state[corridor] ^ 1] = True
+        stop = last[0::2]
+        reach = hops[0::2] + 1
+        edge = stop_edge[stop]
+        self.cell_edge = np.full(h * w, -1, dtype=np.int32)
+        self.cell_offset = np.full(h * w, -1, dtype=np.int32)
+        self.cell_edge[corridor_cells] = np.where(ends[stop], edge, -1)
+        self.cell_offset[corridor_cells] = np.where(stop_first[stop], reach, self.edge_length[edge] - reach)
+
+        # Adjacency in CSR form: both directions of every edge
+        n, e = len(node_cells), len(self.edge_length)
+        a, b = self.edge_nodes[:, 0], self.edge_nodes[:, 1]
+        src = np.concatenate((a, b))
+        order = np.argsort(src, kind="stable")
+        self.slot_start = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n))))
+        self.slot_node = np.concatenate((b, a))[order]
+        self.slot_edge = np.concatenate((np.arange(e), np.arange(e)))[order]
+        self.degree = degree[node_cells].astype(np.int8)
+
+    @cached_property
+    def _lists(self):
+        # Plain lists for the searches, which index them one item at a time
+        return (self.slot_start.tolist(), self.slot_node.tolist(), self.slot_edge.tolist(),
+                self.edge_length.tolist(), (self.node_cells % self.width).tolist(),
+                (self.node_cells // self.width).tolist())
+
+    @property
+    def node_count(self):
+        return len(self.node_cells)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_length)
+
+    def node_xz(self, node):
+        c = int(self.node_cells[node])
+        return c % self.width, c // self.width
+
+    def locate(self, x, z):
+        # Where cell (x, z) sits in the graph: [(node, steps to it), ...] - the node itself,
+        # or both ends of its corridor - and an empty list for walls and cells off the grid
+        if not (0 <= x < self.width and 0 <= z < self.height):
+            return []
+        c = z * self.width + x
+        node = self.cell_node[c]
+        if node >= 0:
+            return [(int(node), 0)]
+        edge = self.cell_edge[c]
+        if edge < 0:
+            return []
+        offset = int(self.cell_offset[c])
+        a, b = self.edge_nodes[edge].tolist()
+        return [(a, offset), (b, int(self.edge_length[edge]) - offset)]
+
+    def depths(self, root):
+        # Steps from node root to every node (-1 where unreachable) when the graph is a tree.
+        # An Euler tour walks every edge down and back up; ranking it by pointer jumping
+        # tells which way is down, and a node's depth is the tour's running sum of +length
+        # down and -length up where it is entered.
+        depth = np.full(self.node_count, -1, dtype=np.int64)
+        depth[root] = 0
+        start, slot_node, slot_edge = self.slot_start, self.slot_node, self.slot_edge
+        if start[root] == start[root + 1]:
+            return depth
+        # A slot is one way along an edge (out of its node's list); reverse: the other way
+        pairs = np.argsort(slot_edge, kind="stable").reshape(-1, 2)
+        reverse = np.empty(len(slot_edge), dtype=np.int64)
+        reverse[pairs[:, 0]], reverse[pairs[:, 1]] = pairs[:, 1], pairs[:, 0]
+        # After arriving at a node, leave by the next way out after the one just used
+        following = reverse + 1
+        wrap = following == start[slot_node + 1]
+        following[wrap] = start[slot_node[wrap]]
+        end = reverse[start[root + 1] - 1] # the tour is back at the root after this one
+        following[end] = end
+        last, rank = following.copy(), np.ones(len(following), dtype=np.int64)
+        rank[end] = 0
+        _pointer_jump(last, rank) # ways left to go in the tour
+        toured = last == end
+        down = toured & (rank > rank[reverse])
+        steps = np.where(down, 1, -1) * self.edge_length[slot_edge]
+        last, total = following.copy(), steps.copy()
+        _pointer_jump(last, total) # sum from each way to the end, without the last one
+        entered = steps - total - steps[end]
+        depth[slot_node[down]] = entered[down]
+        return depth
+
+    def _search(self, starts, goals=None, radius=None, toward=None):
+        # Dijkstra from [(node, steps)], or A* when `toward` is the (x, z) cell the goals lead
+        # to (a step moves one cell, so the Manhattan distance never overestimates). goals
+        # is {node: steps from it on to the goal}; the search ends once nothing left can beat
+        # the best goal, or past radius steps. Returns (steps to every settled node, the node
+        # each was reached from, (steps, node) of the best goal or None)
+        steps, parent, best = {}, {}, None
+        start, adjacency, adjacency_edge, lengths, node_x, node_z = self._lists
+        tx, tz = toward if toward else (0, 0)
+        heap = [(d + (abs(node_x[node] - tx) + abs(node_z[node] - tz) if toward else 0), d, node, -1)
+                for node, d in starts]
+        heapq.heapify(heap)
+        while heap:
+            estimate, d, node, came = heapq.heappop(heap)
+            if best is not None and estimate >= best[0]:
+                break
+            if node in steps:
+                continue
+            if radius is not None and d > radius:
+                break
+            steps[node], parent[node] = d, came
+            if goals and node in goals and (best is None or d + goals[node] < best[0]):
+                best = (d + goals[node], node)
+            for i in range(start[node], start[node + 1]):
+                other = adjacency[i]
+                if other not in steps:
+                    e = d + lengths[adjacency_edge[i]]
+                    if toward:
+                        heapq.heappush(heap, (e + abs(node_x[other] - tx) + abs(node_z[other] - tz), e, other, node))
+                    else:
+                        heapq.heappush(heap, (e, e, other, node))
+        return steps, parent, best
+
+    def distance(self, x0, z0, x1, z1):
+        # Steps along the maze from (x0, z0) to (x1, z1), -1 if either is a wall
+        route = self.route(x0, z0, x1, z1)
+        return route[0] if route else -1
+
+    def route(self, x0, z0, x1, z1):
+        # (steps, [node, ...]) from (x0, z0) to (x1, z1): the junctions and dead ends passed
+        # on the way; None if either cell is a wall or they aren't connected
+        starts, goals = self.locate(x0, z0), self.locate(x1, z1)
+        if not starts or not goals:
+            return None
+        c0, c1 = z0 * self.width + x0, z1 * self.width + x1
+        edge = self.cell_edge[c0]
+        if edge >= 0 and edge == self.cell_edge[c1]: # same corridor, the only way in a perfect maze
+            return abs(int(self.cell_offset[c0]) - int(self.cell_offset[c1])), []
+        _, parent, best = self._search(starts, dict(goals), toward=(x1, z1))
+        if best is None:
+            return None
+        nodes = [best[1]]
+        while parent[nodes[-1]] >= 0:
+            nodes.append(parent[nodes[-1]])
+        return best[0], nodes[::-1]
+
+    def nearby(self, x, z, radius):
+        # {node: steps} of the junctions and dead ends within radius steps of (x, z)
+        return self._search(self.locate(x, z), radius=radius)[0]
+
+    def corridor(self, edge):
+        # Cells of an edge from its first node to its second, as an (N, 2) int32 array of (x, z)
+        w = self.width
+        offsets = [dz * w + dx for dx, dz in _GRAPH_DIRS]
+        a, b = self.edge_nodes[edge].tolist()
+        c, d = int(self.node_cells[a]), int(self.edge_dir[edge])
+        cells = [c]
+        for _ in range(int(self.edge_length[edge])):
+            c += offsets[d]
+            cells.append(c)
+            if self.cell_node[c] >= 0:
+                break
+            # Turn to whichever way on stays on this edge and doesn't lead back
+            for turn in (d, (d + 1) % 4, (d + 3) % 4):
+                n = c + offsets[turn]
+                if 0 <= n < len(self.cell_node) and (self.cell_edge[n] == edge or self.cell_node[n] == b):
+                    d = turn
+                    break
+        cells = np.array(cells, dtype=np.int32)
+        return np.column_stack((cells % w, cells // w))
+
+    def metrics(self):
+        # Difficulty figures for the level: dead ends and junctions (openings in the outer
+        # wall aren't dead ends), average ways on at a junction, junctions on the way from
+        # the spawn to the exit (choices to get right) and corridor lengths
+        x, z = self.node_cells % self.width, self.node_cells // self.width
+        inside = (x > 0) & (x < self.width - 1) & (z > 0) & (z < self.height - 1)
+        junctions = self.degree[self.degree >= 3]
+        route = self.route(1, 1, *exit_cell(self.width))
+        return {"nodes": self.node_count, "edges": self.edge_count,
+                "dead_ends": int(np.count_nonzero((self.degree == 1) & inside)),
+                "junctions": len(junctions),
+                "branching": float(junctions.mean() - 1) if len(junctions) else 0.0,
+                "decisions": int(np.count_nonzero(self.degree[route[1]] >= 3)) if route else 0,
+                "corridor_mean": float(self.edge_length.mean()) if self.edge_count else 0.0,
+                "corridor_max": int(self.edge_length.max()) if self.edge_count else 0}
+
+# --- Simulation ---
+# Everything a level needs to be played, without pygame or GL: PlayerBody is the
+# player's movement that Game steps once per tick, and BotSwarm plays a maze with
+# thousands of bots at once for play-testing level sizes (see playtest).
+GRAVITY = 0.005   # per 60 Hz frame, like NORMAL_SPEED
+JUMP_FORCE = 0.12
+EYE_LEVEL = 0.5   # camera height when standing
+EXIT_RADIUS = 1.0 # the level ends closer than this to the exit cell
+
+def exit_cell(size):
+    return size - 1, size - 2 # (x, z) of the opening in the right wall
+
+def at_exit(x, z, size):
+    ex, ez = exit_cell(size)
+    return math.sqrt((x - ex) ** 2 + (z - ez) ** 2) < EXIT_RADIUS
+
+class PlayerBody:
+    def __init__(self, x=1.0, z=1.0):
+        self.velocity_y = 0.0 # units per second
+        self.jumping = False
+        self.place(x, z)
+
+    def place(self, x, z):
+        # Teleport to floor level; previous too, so nothing interpolates across the jump
+        self.pos = [x, EYE_LEVEL, z]
+        self.previous = list(self.pos)
+
+    def jump(self):
+        if not self.jumping:
+            # Launch speed for which the exact parabola passes through the
+            # heights the old once-per-frame update reached
+            self.velocity_y = (JUMP_FORCE - GRAVITY / 2) * TUNING_RATE
+            self.jumping = True
+
+    def tick(self, forward, side, running, yaw, collision):
+        # One fixed SIM_DT tick. forward/side are -1, 0 or 1 (W/S, D/A); yaw in degrees;
+        # collision is anything with move(x, z, dx, dz), e.g. a CollisionGrid.
+        # Speeds, gravity and jump force are tuned per 60 Hz frame and scaled to the
+        # tick so behaviour doesn't depend on SIM_RATE.
+        # Gravity: exact constant-acceleration step, in units per second
+        accel = GRAVITY * TUNING_RATE ** 2
+        self.previous = list(self.pos)
+        self.pos[1] += self.velocity_y * SIM_DT - 0.5 * accel * SIM_DT ** 2
+        self.velocity_y -= accel * SIM_DT
+        if self.pos[1] <= EYE_LEVEL:
+            self.pos[1] = EYE_LEVEL
+            self.velocity_y = 0
+            self.jumping = False
+
+        if forward or side:
+            speed = (RUN_SPEED if running else NORMAL_SPEED) * (TUNING_RATE * SIM_DT)
+            yaw_rad = math.radians(yaw)
+            forward_x, forward_z = math.sin(yaw_rad), -math.cos(yaw_rad)
+            side_x, side_z = math.cos(yaw_rad), math.sin(yaw_rad)
+            dx = (forward * forward_x + side * side_x) * speed
+            dz = (forward * forward_z + side * side_z) * speed
+            self.pos[0], self.pos[2] = collision.move(self.pos[0], self.pos[2], dx, dz)
+
+# Bots move a cell per step. Directions are numbered clockwise from north (-z).
+BOT_RIGHT_HAND, BOT_LEFT_HAND, BOT_WALKER = 0, 1, 2
+BOT_NAMES = ("right hand", "left hand", "walker")
+_BOT_DIRECTIONS = ((0, -1), (1, 0), (0, 1), (-1, 0)) # (dx, dz)
+# Turns a wall follower tries in order, relative to its heading
+_FOLLOW_TURNS = {BOT_RIGHT_HAND: (1, 0, 3, 2), BOT_LEFT_HAND: (3, 0, 1, 2)}
+# _NTH_OPEN[mask, k]: direction of the k-th set bit of a 4-bit open-direction mask
+_NTH_OPEN = np.array([[d for d in range(4) if mask >> d & 1] + [0] * (4 - bin(mask).count("1"))
+                      for mask in range(16)], dtype=np.int8)
+_OPEN_COUNT = np.array([bin(mask).count("1") for mask in range(16)], dtype=np.int8)
+BOT_SPEED = NORMAL_SPEED * TUNING_RATE # cells per second, for turning steps into play time
+
+class BotSwarm:
+    # Any number of bots in one maze, all stepped together with numpy. Wall followers
+    # keep a hand on the wall (always finishes a perfect maze); walkers pick a random
+    # open way at every cell but only turn back at dead ends.
+    def __init__(self, maze, kinds, rng=None, start=(1, 1)):
+        h, w = maze.shape
+        floor = np.pad(maze == 0, 1) # outside the grid is wall
+        self.open = np.zeros((h, w), dtype=np.uint8)
+        for d, (dx, dz) in enumerate(_BOT_DIRECTIONS):
+            self.open |= floor[1 + dz:h + 1 + dz, 1 + dx:w + 1 + dx].astype(np.uint8) << d
+        self.open = self.open.reshape(-1)
+        self.offsets = np.array([dz * w + dx for dx, dz in _BOT_DIRECTIONS], dtype=np.int64)
+        self.exit = exit_cell(w)[1] * w + exit_cell(w)[0]
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        n = len(self.kinds)
+        self.cell = np.full(n, start[1] * w + start[0], dtype=np.int64)
+        self.heading = np.full(n, 1, dtype=np.int8) # east, into the maze
+        self.steps = np.full(n, -1, dtype=np.int64) # steps to the exit, -1 until there
+        self.active = np.arange(n) # bots still walking
+        self.step_count = 0
+
+    def step(self):
+        idx = self.active
+        cell, heading, kinds = self.cell[idx], self.heading[idx], self.kinds[idx]
+        open_bits = self.open[cell]
+        direction = np.empty(len(idx), dtype=np.int8)
+        for kind, turns in _FOLLOW_TURNS.items():
+            sel = kinds == kind
+            if not sel.any():
+                continue
+            # First of the turns that is open
+            candidates = (heading[sel, None] + np.array(turns, dtype=np.int8)) % 4
+            is_open = (open_bits[sel, None] >> candidates) & 1
+            direction[sel] = candidates[np.arange(len(candidates)), is_open.argmax(axis=1)]
+        sel = kinds == BOT_WALKER
+        if sel.any():
+            bits = open_bits[sel]
+            back = (heading[sel].astype(np.int64) + 2) % 4
+            ahead = bits & (15 ^ (1 << back))
+            bits = np.where(ahead != 0, ahead, bits) # dead end: back is the only way
+            pick = (self.rng.random(len(bits)) * _OPEN_COUNT[bits]).astype(np.int64)
+            direction[sel] = _NTH_OPEN[bits, pick]
+        cell += self.offsets[direction]
+        self.cell[idx], self.heading[idx] = cell, direction
+        self.step_count += 1
+        done = cell == self.exit
+        if done.any():
+            self.steps[idx[done]] = self.step_count
+            self.active = idx[~done]
+
+    def run(self, max_steps):
+        # Steps until every bot is out or max_steps; returns the steps array
+        while len(self.active) and self.step_count < max_steps:
+            self.step()
+        return self.steps
+
+PLAYTEST_MAX_STEPS = 200 # per floor cell; walkers still in the maze after that give up
+
+def playtest_level(seed, number, walkers, max_steps=None):
+    # Level `number` of session `seed`: steps to the exit of both wall followers and
+    # `walkers` walkers (-1 for those that gave up). Module-level so a pool can run it.
+    size = level_size(number)
+    maze = generate_maze(size, size, level_rng(seed, number))
+    kinds = np.array([BOT_RIGHT_HAND, BOT_LEFT_HAND] + [BOT_WALKER] * walkers, dtype=np.int8)
+    swarm = BotSwarm(maze, kinds, np.random.default_rng((seed, number, 1)))
+    if max_steps is None:
+        max_steps = PLAYTEST_MAX_STEPS * int(np.count_nonzero(maze == 0))
+    steps = swarm.run(max_steps)
+    graph = CorridorGraph(maze)
+    return {"seed": seed, "number": number, "size": size, "shortest": ExitField(maze, graph).solution_length,
+            "graph": graph.metrics(), "kinds": kinds, "steps": steps}
+
+def playtest(seed, levels, mazes=8, walkers=1000, pool=None):
+    # Time-to-exit statistics and corridor graph metrics (averaged) for levels 1..levels,
+    # over `mazes` sessions (seed, seed + 1, ...) each; on the pool (see create_mesh_pool)
+    # when given. Returns one row per level.
+    jobs = [(seed + i, number, walkers) for number in range(1, levels + 1) for i in range(mazes)]
+    if pool is not None:
+        results = [f.result() for f in [pool.submit(playtest_level, *job) for job in jobs]]
+    else:
+        results = [playtest_level(*job) for job in jobs]
+    rows = []
+    for number in range(1, levels + 1):
+        level = [r for r in results if r["number"] == number]
+        row = {"number": number, "size": level_size(number),
+               "shortest_s": float(np.mean([r["shortest"] for r in level])) / BOT_SPEED,
+               **{key: float(np.mean([r["graph"][key] for r in level]))
+                  for key in ("dead_ends", "branching", "decisions")}}
+        for kind, name in enumerate(BOT_NAMES):
+            steps = np.concatenate([r["steps"][r["kinds"] == kind] for r in level])
+            finished = steps[steps >= 0] / BOT_SPEED
+            row[name] = {"bots": len(steps), "finished": len(finished) / len(steps),
+                         **({"p10_s": float(np.percentile(finished, 10)), "p50_s": float(np.median(finished)),
+                             "p90_s": float(np.percentile(finished, 90))} if len(finished) else {})}
+        rows.append(row)
+    return rows